@@ -0,0 +1,158 @@
+import hashlib
+import mimetypes
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from database.streaming import iter_batches
+
+CHUNK_SIZE = 1024 * 1024   # Rozmiar fragmentu pliku czytanego z dysku i zapisywanego w bazie
+FETCH_CHUNKS = 8           # Liczba fragmentów pobieranych z bazy w jednej paczce
+# Lokalna kopia treści załączników (wg skrótu - raz pobrany plik nigdy się nie zmienia)
+ATTACHMENT_DIR = os.path.join(os.path.expanduser("~"), ".vetbase", "attachments")
+
+
+def describe_file(path):
+    """
+    Czyta plik fragmentami i liczy skrót SHA-256 treści (bez wczytywania całego pliku do pamięci).
+    Wywoływane przed otwarciem transakcji - liczenie skrótu dużego pliku nie blokuje połączenia.
+    :return: Słownik z kluczami path, sha256, size, file_name, content_type.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return {
+        "path": path,
+        "sha256": digest.hexdigest(),
+        "size": size,
+        "file_name": os.path.basename(path),
+        "content_type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+    }
+
+
+def local_path(sha256):
+    """Ścieżka lokalnej kopii treści: katalogi z dwóch pierwszych par znaków skrótu."""
+    return os.path.join(ATTACHMENT_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def _write_local(sha256, chunks):
+    """
+    Zapisuje treść do lokalnego magazynu (plik tymczasowy + zamiana, więc nigdy nie jest widoczna w połowie).
+    :raises ValueError: Skrót zapisanej treści nie zgadza się z oczekiwanym.
+    """
+    target = local_path(sha256)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    digest = hashlib.sha256()
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            for chunk in chunks:
+                digest.update(chunk)
+                file.write(chunk)
+        if digest.hexdigest() != sha256:
+            raise ValueError(f"Treść załącznika {sha256} nie zgadza się ze skrótem.")
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return target
+
+
+def store_attachment(cursor, attachment):
+    """
+    Zapisuje treść pliku w bazie, jeśli nie ma jej tam jeszcze pod tym skrótem (w transakcji wywołującego).
+    Przy okazji kopia trafia do lokalnego magazynu, z którego czytane są podglądy.
+    :param attachment: Wynik describe_file().
+    :return: True, jeśli zapisano nową treść; False, jeśli była już w bazie.
+    """
+    sha256, size = attachment["sha256"], attachment["size"]
+    chunk_count = (size + CHUNK_SIZE - 1) // CHUNK_SIZE
+    # Równoległy zapis tej samej treści czeka tu na zatwierdzenie pierwszego
+    cursor.execute("""
+        INSERT INTO attachment_blobs (sha256, size, chunk_count)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (sha256) DO NOTHING
+        RETURNING sha256
+    """, (sha256, size, chunk_count))
+    if cursor.fetchone() is None:
+        return False
+
+    def upload():
+        with open(attachment["path"], "rb") as file:
+            for seq, chunk in enumerate(iter(lambda: file.read(CHUNK_SIZE), b"")):
+                cursor.execute(
+                    "INSERT INTO attachment_chunks (sha256, seq, data) VALUES (%s, %s, %s)",
+                    (sha256, seq, chunk)
+                )
+                yield chunk
+
+    # Plik zmieniony od policzenia skrótu nie przejdzie weryfikacji - transakcja zostanie wycofana
+    _write_local(sha256, upload())
+    return True
+
+
+def fetch_attachment(sha256):
+    """
+    Zwraca ścieżkę lokalnej kopii treści, pobierając ją z bazy paczkami fragmentów, jeśli jej brak.
+    :raises FileNotFoundError: Treści o tym skrócie nie ma w bazie.
+    """
+    path = local_path(sha256)
+    if os.path.exists(path):
+        return path
+    fetched = []
+
+    def download():
+        for rows in iter_batches(
+            "SELECT data FROM attachment_chunks WHERE sha256 = %s ORDER BY seq", (sha256,), FETCH_CHUNKS
+        ):
+            fetched.append(len(rows))
+            for (data,) in rows:
+                yield bytes(data)
+
+    try:
+        return _write_local(sha256, download())
+    except ValueError:
+        if not fetched:
+            raise FileNotFoundError(f"Brak załącznika {sha256} w bazie danych.") from None
+        raise
+
+
+def export_attachment(sha256, file_name):
+    """
+    Kopiuje załącznik do katalogu tymczasowego pod oryginalną nazwą (np. do otwarcia w programie systemowym).
+    :return: Ścieżka kopii.
+    """
+    directory = os.path.join(tempfile.gettempdir(), "vetbase", sha256[:16])
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, os.path.basename(file_name) or sha256)
+    if not os.path.exists(target):
+        shutil.copyfile(fetch_attachment(sha256), target)
+    return target
+
+
+def iter_attachment(sha256, chunk_size=CHUNK_SIZE):
+    """Zwraca treść załącznika fragmentami (np. do zapisu w innym miejscu)."""
+    with open(fetch_attachment(sha256), "rb") as file:
+        yield from iter(lambda: file.read(chunk_size), b"")
+
+
+@contextmanager
+def map_attachment(sha256):
+    """
+    Udostępnia treść załącznika jako plik zmapowany w pamięci (tylko do odczytu) -
+    system wczytuje strony pliku na żądanie, więc duże skany nie trafiają w całości do RAM.
+    """
+    with open(fetch_attachment(sha256), "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b""  # Pustego pliku nie da się zmapować
+            return
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
@@ -0,0 +1,40 @@
+from database.connection import pooled_connection
+from database.prepared import execute_prepared
+
+
+def build_batch_query(queries):
+    """
+    Łączy kilka zapytań SELECT w jedno zapytanie zwracające jeden wiersz,
+    w którym każda kolumna to tablica JSON z wynikami kolejnego zapytania.
+    :param queries: Lista par (zapytanie, parametry).
+    :return: Krotka (zapytanie zbiorcze, parametry).
+    """
+    parts = []
+    params = []
+    for index, (query, query_params) in enumerate(queries):
+        alias = f"batch_{index}"
+        parts.append(
+            f"(SELECT COALESCE(json_agg({alias}), '[]'::json) FROM ({query}) AS {alias})"
+        )
+        params.extend(query_params or ())
+    return "SELECT " + ",\n       ".join(parts), tuple(params)
+
+
+def fetch_batch(queries):
+    """
+    Wykonuje kilka niezależnych zapytań SELECT w jednej wymianie z serwerem.
+    Kolumny każdego zapytania muszą mieć unikalne nazwy; wartości wracają
+    w postaci JSON (daty jako tekst ISO 8601).
+    :param queries: Lista par (zapytanie, parametry).
+    :return: Lista wyników (list krotek) w kolejności zapytań.
+    """
+    if not queries:
+        return []
+
+    query, params = build_batch_query(queries)
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            execute_prepared(cursor, query, params)
+            row = cursor.fetchone()
+
+    return [[tuple(record.values()) for record in result] for result in row]
@@ -0,0 +1,438 @@
+"""
+Masowy import zwierząt i historii leczenia (np. przy przenoszeniu danych z innego systemu).
+
+Uruchomienie:
+    python -m database.bulk_import animals zwierzeta.csv
+    python -m database.bulk_import history historia.jsonl --rejects odrzucone.csv
+
+Plik CSV musi mieć wiersz nagłówka z nazwami kolumn tabeli, plik JSON Lines - jeden
+obiekt na wiersz. Rekordy są czytane, sprawdzane i normalizowane strumieniowo, a następnie
+partiami ładowane poleceniem COPY do tymczasowej tabeli i scalane jednym zapytaniem na partię -
+w pamięci jest naraz najwyżej jedna partia. Każda partia to osobna transakcja.
+
+Kolumna `external_id` (identyfikator z poprzedniego systemu) jest opcjonalna; rekordy z nią
+są przy ponownym imporcie aktualizowane zamiast dodawane drugi raz. Wpis historii wskazuje
+zwierzę przez `animal_id` (id w VetBase) albo `animal_external_id`.
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import psycopg2
+
+from database.connection import pooled_connection, close_pool, DatabaseUnavailableError
+
+IMPORT_BATCH_SIZE = 5000     # Liczba rekordów ładowanych jednym COPY
+REJECTS_PRINT_LIMIT = 20     # Ile odrzuconych rekordów wypisać, gdy nie podano pliku --rejects
+
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%d.%m.%Y %H:%M", "%d.%m.%Y")
+
+
+class RejectedRecord(ValueError):
+    """Rekord, którego nie da się zaimportować (powód w treści wyjątku)."""
+
+
+# --- Odczyt plików -----------------------------------------------------------
+
+def iter_csv_records(stream, delimiter=","):
+    """Zwraca pary (numer wiersza, słownik pól) z pliku CSV z nagłówkiem."""
+    reader = csv.DictReader(stream, delimiter=delimiter)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def iter_json_records(stream):
+    """Zwraca pary (numer wiersza, słownik pól) z pliku JSON Lines (pomija puste wiersze)."""
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = {"_error": f"niepoprawny JSON: {e.msg}"}
+        if not isinstance(record, dict):
+            record = {"_error": "wiersz nie jest obiektem JSON"}
+        yield line_number, record
+
+
+# --- Walidacja i normalizacja ------------------------------------------------
+
+def _text(record, field, max_length, required=False):
+    value = record.get(field)
+    if value is not None and not isinstance(value, str):
+        value = str(value)
+    value = value.strip() if value else None
+    if not value:
+        if required:
+            raise RejectedRecord(f"brak pola {field}")
+        return None
+    if len(value) > max_length:
+        raise RejectedRecord(f"pole {field} dłuższe niż {max_length} znaków")
+    return value
+
+
+def _integer(record, field):
+    value = record.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise RejectedRecord(f"pole {field} nie jest liczbą całkowitą: {value!r}") from None
+
+
+def _timestamp(record, field):
+    value = _text(record, field, 50, required=True)
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise RejectedRecord(f"nierozpoznana data w polu {field}: {value!r}") from None
+
+
+def _amount(record, field):
+    value = _text(record, field, 50)
+    if value is None:
+        return None
+    try:
+        amount = Decimal(value.replace(" ", "").replace(",", "."))
+    except InvalidOperation:
+        raise RejectedRecord(f"pole {field} nie jest kwotą: {value!r}") from None
+    if not amount.is_finite() or amount < 0 or amount >= Decimal("1e8"):
+        raise RejectedRecord(f"kwota poza zakresem w polu {field}: {value!r}")
+    return amount.quantize(Decimal("0.01"))
+
+
+def normalize_animal(record):
+    """Sprawdza rekord zwierzęcia i zwraca wartości kolumn tabeli tymczasowej."""
+    owner_email = _text(record, "owner_email", 200)
+    if owner_email and "@" not in owner_email:
+        raise RejectedRecord(f"niepoprawny adres e-mail: {owner_email!r}")
+    return (
+        _text(record, "external_id", 100),
+        _text(record, "name", 100, required=True),
+        _text(record, "species", 100),
+        _text(record, "breed", 100),
+        _text(record, "age", 50),
+        _text(record, "owner_name", 200),
+        _text(record, "owner_contact", 100),
+        owner_email,
+        _text(record, "info", 100_000),
+    )
+
+
+def normalize_history(record):
+    """Sprawdza wpis historii leczenia i zwraca wartości kolumn tabeli tymczasowej."""
+    animal_id = _integer(record, "animal_id")
+    animal_external_id = _text(record, "animal_external_id", 100)
+    if animal_id is None and animal_external_id is None:
+        raise RejectedRecord("brak pola animal_id lub animal_external_id")
+    return (
+        _text(record, "external_id", 100),
+        animal_id,
+        animal_external_id,
+        _timestamp(record, "visit_date"),
+        _text(record, "registered_by", 100),
+        _text(record, "description_reason", 100_000),
+        _text(record, "medication", 100_000),
+        _text(record, "indications", 100_000),
+        _amount(record, "payment"),
+        _integer(record, "location_id"),
+    )
+
+
+def validate(records, normalize, rejects):
+    """
+    Zwraca trójki (numer wiersza, rekord, wartości) dla poprawnych rekordów;
+    odrzucone przekazuje do `rejects(numer wiersza, powód, rekord)`.
+    """
+    for line_number, record in records:
+        try:
+            if "_error" in record:
+                raise RejectedRecord(record["_error"])
+            yield line_number, record, normalize(record)
+        except RejectedRecord as e:
+            rejects(line_number, str(e), record)
+
+
+def batched(items, size):
+    """Dzieli strumień na listy o długości najwyżej `size`."""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+# --- Ładowanie do bazy -------------------------------------------------------
+
+class ImportTarget:
+    """Opis importowanej tabeli: tabela tymczasowa, normalizacja i zapytanie scalające."""
+
+    def __init__(self, name, normalize, staging_columns, merge, checks=()):
+        """
+        :param staging_columns: Definicje kolumn tabeli tymczasowej (bez numeru wiersza).
+        :param merge: Zapytanie scalające; zwraca (liczba dodanych, liczba zaktualizowanych).
+        :param checks: Pary (zapytanie, powód) - zapytania usuwają z tabeli tymczasowej
+                       niepasujące wiersze i zwracają ich numery.
+        """
+        self.name = name
+        self.normalize = normalize
+        self.staging_columns = staging_columns
+        self.merge = merge
+        self.checks = checks
+
+    @property
+    def staging_table(self):
+        return f"import_{self.name}"
+
+    @property
+    def column_names(self):
+        return [definition.split()[0] for definition in self.staging_columns]
+
+
+# Duplikaty external_id w jednej partii: wygrywa ostatni wiersz pliku
+_LATEST_PER_EXTERNAL_ID = """
+    SELECT * FROM (
+        SELECT s.*, row_number() OVER (PARTITION BY external_id ORDER BY line DESC) AS position
+        FROM {staging} s
+    ) s
+    WHERE external_id IS NULL OR position = 1
+"""
+
+ANIMALS = ImportTarget(
+    "animals", normalize_animal,
+    staging_columns=(
+        "external_id TEXT", "name TEXT", "species TEXT", "breed TEXT", "age TEXT",
+        "owner_name TEXT", "owner_contact TEXT", "owner_email TEXT", "info TEXT",
+    ),
+    merge=f"""
+        WITH merged AS (
+            INSERT INTO animals AS a (external_id, name, species, breed, age, owner_name, owner_contact, owner_email, info)
+            SELECT external_id, name, species, breed, age, owner_name, owner_contact, owner_email, info
+            FROM ({_LATEST_PER_EXTERNAL_ID.format(staging="import_animals")}) s
+            ON CONFLICT (external_id) DO UPDATE
+                SET name = EXCLUDED.name, species = EXCLUDED.species, breed = EXCLUDED.breed,
+                    age = EXCLUDED.age, owner_name = EXCLUDED.owner_name,
+                    owner_contact = EXCLUDED.owner_contact, owner_email = EXCLUDED.owner_email,
+                    info = EXCLUDED.info
+            RETURNING xmax = 0 AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged
+    """,
+)
+
+HISTORY = ImportTarget(
+    "history", normalize_history,
+    staging_columns=(
+        "external_id TEXT", "animal_id INTEGER", "animal_external_id TEXT", "visit_date TIMESTAMP",
+        "registered_by TEXT", "description_reason TEXT", "medication TEXT", "indications TEXT",
+        "payment NUMERIC(10, 2)", "location_id INTEGER",
+    ),
+    checks=(
+        ("""
+            UPDATE import_history s SET animal_id = a.id
+            FROM animals a
+            WHERE s.animal_id IS NULL AND a.external_id = s.animal_external_id
+        """, None),
+        ("""
+            DELETE FROM import_history s
+            WHERE NOT EXISTS (SELECT 1 FROM animals a WHERE a.id = s.animal_id)
+            RETURNING s.line
+        """, "nie znaleziono zwierzęcia"),
+        ("""
+            DELETE FROM import_history s
+            WHERE s.location_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM locations l WHERE l.id = s.location_id)
+            RETURNING s.line
+        """, "nie znaleziono lokalizacji"),
+    ),
+    merge=f"""
+        WITH merged AS (
+            INSERT INTO history AS h (external_id, animal_id, visit_date, registered_by, description_reason,
+                                      medication, indications, payment, location_id)
+            SELECT external_id, animal_id, visit_date, registered_by, description_reason,
+                   medication, indications, payment, location_id
+            FROM ({_LATEST_PER_EXTERNAL_ID.format(staging="import_history")}) s
+            ON CONFLICT (external_id) DO UPDATE
+                SET animal_id = EXCLUDED.animal_id, visit_date = EXCLUDED.visit_date,
+                    registered_by = EXCLUDED.registered_by, description_reason = EXCLUDED.description_reason,
+                    medication = EXCLUDED.medication, indications = EXCLUDED.indications,
+                    payment = EXCLUDED.payment, location_id = EXCLUDED.location_id
+            RETURNING xmax = 0 AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged
+    """,
+)
+
+IMPORT_TARGETS = {target.name: target for target in (ANIMALS, HISTORY)}
+
+
+def _copy_payload(batch):
+    """Zapisuje partię w formacie CSV dla COPY (None jako pusty, niecytowany NULL)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for line_number, _, values in batch:
+        writer.writerow((line_number, *values))
+    buffer.seek(0)
+    return buffer
+
+
+def load_batch(connection, target, batch):
+    """
+    Ładuje partię przez COPY do tabeli tymczasowej i scala ją z tabelą docelową w jednej transakcji.
+    :return: Krotka (dodane, zaktualizowane, lista (numer wiersza, powód) odrzuconych przez bazę).
+    """
+    rejected = []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {target.staging_table} "
+                f"(line INTEGER NOT NULL, {', '.join(target.staging_columns)}) ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                f"COPY {target.staging_table} (line, {', '.join(target.column_names)}) "
+                f"FROM STDIN WITH (FORMAT csv)",
+                _copy_payload(batch)
+            )
+            for query, reason in target.checks:
+                cursor.execute(query)
+                if reason is not None:
+                    rejected.extend((row[0], reason) for row in cursor.fetchall())
+            cursor.execute(target.merge)
+            inserted, updated = cursor.fetchone()
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return inserted, updated, rejected
+
+
+class ImportReport:
+    """Liczniki importu i zapis odrzuconych rekordów."""
+
+    def __init__(self, rejects_stream=None):
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+        self._rejects_writer = csv.writer(rejects_stream) if rejects_stream is not None else None
+        if self._rejects_writer is not None:
+            self._rejects_writer.writerow(("wiersz", "powód", "rekord"))
+
+    def reject(self, line_number, reason, record):
+        self.rejected += 1
+        if self._rejects_writer is not None:
+            self._rejects_writer.writerow((line_number, reason, json.dumps(record, ensure_ascii=False, default=str)))
+        elif self.rejected <= REJECTS_PRINT_LIMIT:
+            print(f"Odrzucono wiersz {line_number}: {reason}")
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self):
+        """Przetworzone rekordy na sekundę."""
+        return self.read / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def import_records(target, records, batch_size=IMPORT_BATCH_SIZE, report=None, progress=None):
+    """
+    Importuje strumień rekordów (pary numer wiersza, słownik) do tabeli `target`.
+    :param progress: Funkcja wywoływana z raportem po każdej partii.
+    :return: ImportReport z licznikami.
+    """
+    report = report or ImportReport()
+
+    def counted(items):
+        for item in items:
+            report.read += 1
+            yield item
+
+    valid = validate(counted(records), target.normalize, report.reject)
+    with pooled_connection() as connection:
+        for batch in batched(valid, batch_size):
+            inserted, updated, rejected = load_batch(connection, target, batch)
+            report.inserted += inserted
+            report.updated += updated
+            if rejected:
+                records_by_line = {line_number: record for line_number, record, _ in batch}
+                for line_number, reason in sorted(rejected):
+                    report.reject(line_number, reason, records_by_line.get(line_number))
+            if progress is not None:
+                progress(report)
+    return report
+
+
+def _print_progress(report):
+    print(f"Przetworzono {report.read} rekordów ({report.throughput:,.0f}/s), "
+          f"dodano {report.inserted}, zaktualizowano {report.updated}, odrzucono {report.rejected}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Masowy import danych do bazy VetBase.")
+    parser.add_argument("table", choices=sorted(IMPORT_TARGETS), help="importowana tabela")
+    parser.add_argument("path", help="plik CSV lub JSON Lines ('-' - standardowe wejście)")
+    parser.add_argument("--format", choices=("csv", "jsonl"),
+                        help="format pliku (domyślnie według rozszerzenia, inaczej csv)")
+    parser.add_argument("--delimiter", default=",", help="separator pól CSV (domyślnie ',')")
+    parser.add_argument("--encoding", default="utf-8-sig", help="kodowanie pliku (domyślnie utf-8)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="rekordów w jednej partii")
+    parser.add_argument("--rejects", help="zapisz odrzucone rekordy do pliku CSV")
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    if args.path == "-":
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding=args.encoding, newline="")
+    else:
+        try:
+            stream = open(args.path, encoding=args.encoding, newline="")
+        except OSError as e:
+            print(f"Nie można otworzyć pliku: {e}")
+            return 1
+    rejects_stream = open(args.rejects, "w", encoding="utf-8", newline="") if args.rejects else None
+
+    try:
+        if file_format == "jsonl":
+            records = iter_json_records(stream)
+        else:
+            records = iter_csv_records(stream, args.delimiter)
+        report = import_records(
+            IMPORT_TARGETS[args.table], records, max(1, args.batch_size),
+            ImportReport(rejects_stream), _print_progress
+        )
+    except DatabaseUnavailableError:
+        print("Brak połączenia z bazą danych.")
+        return 1
+    except psycopg2.Error as e:
+        print(f"Błąd podczas importu (zaimportowane partie zostały zapisane): {e}")
+        return 1
+    finally:
+        stream.close()
+        if rejects_stream is not None:
+            rejects_stream.close()
+        close_pool()
+
+    print(f"Zakończono w {report.elapsed:.1f} s: przetworzono {report.read} rekordów "
+          f"({report.throughput:,.0f}/s), dodano {report.inserted}, zaktualizowano {report.updated}, "
+          f"odrzucono {report.rejected}.")
+    if report.rejected > REJECTS_PRINT_LIMIT and rejects_stream is None:
+        print(f"Wypisano pierwsze {REJECTS_PRINT_LIMIT} odrzucone rekordy - pełną listę zapisze opcja --rejects.")
+    return 0 if report.rejected == 0 else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
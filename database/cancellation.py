@@ -0,0 +1,46 @@
+import threading
+
+
+class CancellationToken:
+    """
+    Pozwala przerwać z innego wątku zapytanie wykonywane na połączeniu z puli.
+    Warstwa danych przypina połączenie na czas zapytania (attach/detach), a cancel()
+    wysyła do serwera żądanie przerwania (jak pg_cancel_backend dla tej sesji).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connection = None
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def attach(self, connection):
+        """Przypina połączenie, na którym wykonywane jest zapytanie."""
+        with self._lock:
+            self._connection = connection
+
+    def detach(self):
+        """Odpina połączenie po zakończeniu zapytania."""
+        with self._lock:
+            self._connection = None
+
+    def cancel(self):
+        """Oznacza zapytanie jako anulowane i przerywa je na serwerze, jeśli trwa."""
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            connection = self._connection
+        if connection is not None:
+            # Żądanie przerwania otwiera osobne połączenie - nie blokujemy wątku wywołującego
+            threading.Thread(target=self._send_cancel, args=(connection,), daemon=True).start()
+
+    @staticmethod
+    def _send_cancel(connection):
+        try:
+            connection.cancel()
+        except Exception as e:
+            print(f"Nie udało się przerwać zapytania: {e}")
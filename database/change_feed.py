@@ -0,0 +1,89 @@
+import select
+import threading
+
+import psycopg2
+
+from database.connection import DB_CONFIG
+
+CHANGE_CHANNEL = "vetbase_changes"  # Kanał NOTIFY zasilany wyzwalaczami (migracja 6)
+POLL_TIMEOUT = 1.0                  # Co ile sekund wątek sprawdza, czy ma się zakończyć
+RECONNECT_DELAY_MIN = 1             # Pierwsza przerwa przed ponownym połączeniem (s)
+RECONNECT_DELAY_MAX = 30            # Najdłuższa przerwa przed ponownym połączeniem (s)
+
+
+def parse_change(payload):
+    """
+    Odczytuje zdarzenie "tabela:operacja:id".
+    :return: Krotka (tabela, operacja I/U/D/T, id lub None) albo None dla nieznanej treści.
+    """
+    parts = payload.split(":")
+    if len(parts) != 3 or parts[1] not in ("I", "U", "D", "T"):
+        return None
+    table, operation, row_id = parts
+    try:
+        return table, operation, int(row_id) if row_id else None
+    except ValueError:
+        return None
+
+
+class ChangeListener(threading.Thread):
+    """
+    Wątek nasłuchujący zdarzeń zmian (LISTEN) na własnym połączeniu spoza puli -
+    połączenie nasłuchujące jest zajęte przez cały czas działania aplikacji.
+    Po zerwaniu połączenia wątek łączy się ponownie; zdarzenia z przerwy
+    przepadają, dlatego po ponownym połączeniu wywoływane jest on_reset.
+    """
+
+    def __init__(self, on_changes, on_reset, connect_kwargs=None):
+        """
+        :param on_changes: Wywoływane w wątku nasłuchu z listą krotek (tabela, operacja, id).
+        :param on_reset: Wywoływane po ponownym połączeniu (dane mogły się zmienić bez powiadomień).
+        """
+        super().__init__(name="VetBaseChangeListener", daemon=True)
+        self.on_changes = on_changes
+        self.on_reset = on_reset
+        self.connect_kwargs = connect_kwargs or dict(DB_CONFIG)
+        self.listening = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Kończy nasłuch (najpóźniej po POLL_TIMEOUT sekundach)."""
+        self._stop_event.set()
+
+    def run(self):
+        delay = RECONNECT_DELAY_MIN
+        connected_before = False
+        while not self._stop_event.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(**self.connect_kwargs)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANGE_CHANNEL}")
+                self.listening = True
+                if connected_before:
+                    self.on_reset()
+                connected_before = True
+                delay = RECONNECT_DELAY_MIN
+                self._listen(connection)
+            except psycopg2.Error as e:
+                print(f"Nasłuch zmian w bazie przerwany: {e}")
+            finally:
+                self.listening = False
+                if connection is not None:
+                    connection.close()
+            self._stop_event.wait(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    def _listen(self, connection):
+        """Odbiera powiadomienia do czasu zatrzymania wątku lub błędu połączenia."""
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([connection], [], [], POLL_TIMEOUT)
+            if not readable:
+                continue
+            connection.poll()
+            changes = [parse_change(notify.payload) for notify in connection.notifies]
+            connection.notifies.clear()
+            changes = [change for change in changes if change is not None]
+            if changes:
+                self.on_changes(changes)
@@ -1,21 +1,268 @@
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import extensions
+
+from database.leak_detector import get_leak_detector
+from database.prepared import PreparedStatementCache
+
+DB_CONFIG = {
+    "dbname": "vetbase",                # Nazwa bazy danych
+    "user": "vetbase_user",             # Użytkownik bazy danych
+    "password": "vetbase_password",     # Hasło użytkownika
+    "host": "host.docker.internal",     # Host (dla lokalnej bazy)
+    "port": "5432",                     # Port PostgreSQL
+    "connect_timeout": 5,               # Timeout połączenia (5 sekund)
+    "application_name": "VetBase",      # Nazwa widoczna w pg_stat_activity
+    # Serwer zamyka sesje pozostawione w otwartej transakcji dłużej niż minutę
+    "options": "-c idle_in_transaction_session_timeout=60000",
+}
+
+POOL_MIN_SIZE = 1              # Liczba połączeń otwieranych na starcie
+POOL_MAX_SIZE = 8              # Maksymalna liczba jednoczesnych połączeń
+POOL_CHECKOUT_TIMEOUT = 10     # Ile sekund czekać na wolne połączenie
+POOL_HEALTH_CHECK_AFTER = 30   # Po ilu sekundach bezczynności sprawdzać połączenie
+
+
+class DatabaseUnavailableError(Exception):
+    """Brak połączenia z bazą danych lub brak wolnego połączenia w puli."""
+
+
+class VetBaseConnection(extensions.connection):
+    """Połączenie z własną pamięcią podręczną zapytań przygotowanych."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = PreparedStatementCache()
+
+    def cursor(self, *args, **kwargs):
+        cursor = super().cursor(*args, **kwargs)
+        detector = get_leak_detector()
+        if detector is not None:
+            detector.on_cursor(self, cursor)
+        return cursor
+
+
+class ConnectionPool:
+    """Pula połączeń współdzielona przez całą aplikację."""
+
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+                 health_check_after=POOL_HEALTH_CHECK_AFTER, **connect_kwargs):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Nieprawidłowy rozmiar puli połączeń.")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.connect_kwargs = connect_kwargs or dict(DB_CONFIG)
+
+        self._condition = threading.Condition()
+        self._idle = []        # Lista par (połączenie, czas zwrotu do puli)
+        self._in_use = set()
+        self._size = 0         # Połączenia otwarte (wolne + wypożyczone)
+        self._closed = False
+        self._leak_detector = get_leak_detector()
+
+        for _ in range(min_size):
+            try:
+                connection = self._connect()
+            except DatabaseUnavailableError:
+                break
+            self._idle.append((connection, time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        """Otwiera nowe fizyczne połączenie z bazą."""
+        try:
+            return psycopg2.connect(connection_factory=VetBaseConnection, **self.connect_kwargs)
+        except psycopg2.OperationalError as e:
+            print("OperationalError: Could not connect to the database. Details:", e)
+            raise DatabaseUnavailableError(str(e)) from e
+
+    def _is_alive(self, connection, idle_since):
+        """Sprawdza, czy połączenie nadaje się do ponownego użycia."""
+        if connection.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, connection):
+        """Zamyka połączenie i zwalnia jego miejsce w puli (wywoływane pod blokadą)."""
+        self._size -= 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+        self._condition.notify()
+
+    def _drop(self, connection):
+        """Zamyka połączenie bez blokady, a potem zwalnia jego miejsce w puli."""
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _reserve(self, deadline, timeout):
+        """
+        Pod blokadą zdejmuje wolne połączenie albo rezerwuje miejsce na nowe.
+        :return: Para (połączenie, czas zwrotu do puli) lub (None, None) - trzeba otworzyć nowe.
+        """
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise DatabaseUnavailableError("Pula połączeń została zamknięta.")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DatabaseUnavailableError(
+                        f"Brak wolnego połączenia w puli po {timeout} s oczekiwania."
+                    )
+                self._condition.wait(remaining)
+
+    def acquire(self, timeout=None):
+        """Wypożycza połączenie z puli, czekając najwyżej `timeout` sekund."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            # Zdjęte połączenie nadal zajmuje miejsce w puli, więc sprawdzenie
+            # i łączenie odbywają się bez blokady - inne wątki nie czekają na serwer
+            connection, idle_since = self._reserve(deadline, timeout)
+            if connection is None:
+                try:
+                    connection = self._connect()
+                except DatabaseUnavailableError:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+            elif not self._is_alive(connection, idle_since):
+                self._drop(connection)
+                continue
+
+            with self._condition:
+                if self._closed:
+                    self._discard(connection)
+                    raise DatabaseUnavailableError("Pula połączeń została zamknięta.")
+                self._checkout(connection)
+            return connection
+
+    def _checkout(self, connection):
+        """Oznacza połączenie jako wypożyczone (wywoływane pod blokadą)."""
+        self._in_use.add(connection)
+        if self._leak_detector is not None:
+            self._leak_detector.on_checkout(connection)
+
+    def release(self, connection, discard=False):
+        """Zwraca połączenie do puli; zerwane lub oznaczone połączenia są zamykane."""
+        with self._condition:
+            if connection not in self._in_use:
+                return
+            self._in_use.discard(connection)
+            if self._leak_detector is not None:
+                self._leak_detector.on_release(connection)
+
+            if discard or self._closed or connection.closed:
+                self._discard(connection)
+                return
+
+        # Niezatwierdzone transakcje nie mogą przejść do kolejnego użytkownika
+        # (wycofanie bez blokady - to zapytanie do serwera)
+        try:
+            if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            self._drop(connection)
+            return
+
+        with self._condition:
+            if self._closed:
+                self._discard(connection)
+                return
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close_all(self):
+        """Zamyka wszystkie wolne połączenia; wypożyczone zostaną zamknięte przy zwrocie."""
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._discard(connection)
+            self._condition.notify_all()
+
+    def stats(self):
+        """Zwraca bieżący stan puli."""
+        with self._condition:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "max_size": self.max_size,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Zwraca globalną pulę połączeń, tworząc ją przy pierwszym użyciu."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = ConnectionPool(**DB_CONFIG)
+        return _pool
+
+
+def close_pool():
+    """Zamyka globalną pulę połączeń (np. przy wyjściu z aplikacji)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
 
-def get_connection():
+@contextmanager
+def pooled_connection(timeout=None):
+    """
+    Wypożycza połączenie z puli na czas bloku `with`.
+    Połączenie zawsze wraca do puli, także gdy w bloku wystąpi wyjątek;
+    niezatwierdzona transakcja jest wtedy wycofywana.
+    :raises DatabaseUnavailableError: gdy nie udało się uzyskać połączenia.
+    """
+    pool = get_pool()
+    connection = pool.acquire(timeout)
+    discard = False
     try:
-        print("Attempting to connect to the database...")
-        connection = psycopg2.connect(
-            dbname="vetbase",                # Nazwa bazy danych
-            user="vetbase_user",            # Użytkownik bazy danych
-            password="vetbase_password",    # Hasło użytkownika
-            host="host.docker.internal",               # Host (dla lokalnej bazy)
-            port="5432",                    # Port PostgreSQL
-            connect_timeout=5               # Timeout połączenia (5 sekund)
-        )
-        print("Connection established successfully!")
-        return connection
-    except psycopg2.OperationalError as e:
-        print("OperationalError: Could not connect to the database. Details:", e)
-        return None
-    except Exception as e:
-        print("Unexpected error occurred:", e)
-        return None
\ No newline at end of file
+        yield connection
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # Połączenie mogło zostać zerwane - nie wraca do puli
+        discard = True
+        raise
+    except BaseException:
+        try:
+            connection.rollback()
+        except psycopg2.Error:
+            discard = True
+        raise
+    finally:
+        pool.release(connection, discard=discard)
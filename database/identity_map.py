@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+
+ENTITY_CACHE_SIZE = 5000  # Najwięcej rekordów trzymanych w pamięci (najdawniej używane są usuwane)
+ENTITY_TTL = 60           # Po ilu sekundach rekord jest pobierany ponownie, nawet bez powiadomienia o zmianie
+
+
+class IdentityMap:
+    """
+    Jeden rekord w pamięci na parę (tabela, id), z wersją wiersza (xmin) z chwili odczytu.
+    Rekordy są unieważniane powiadomieniami o zmianach, a bez nich wygasają po ENTITY_TTL.
+    Zwracane słowniki są współdzielone - nie należy ich modyfikować.
+    """
+
+    def __init__(self, capacity=ENTITY_CACHE_SIZE, ttl=ENTITY_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (tabela, id) -> (wersja, czas odczytu, rekord)
+        self._generation = 0           # Zwiększane przy każdym unieważnieniu
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self):
+        """Numer do przekazania do put() - odczyt sprzed unieważnienia nie trafi do pamięci."""
+        return self._generation
+
+    def get(self, table, row_id):
+        """Zwraca rekord z pamięci lub None (brak, wygasły albo unieważniony)."""
+        key = (table, row_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, table, row_id, version, record, generation=None):
+        """
+        Zapamiętuje rekord; przy tej samej wersji zostaje dotychczasowy obiekt.
+        :param generation: Wartość `generation` sprzed zapytania, z którego pochodzi rekord.
+        :return: Rekord przechowywany w pamięci.
+        """
+        key = (table, row_id)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return record
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                record = entry[2]
+            self._entries[key] = (version, time.monotonic(), record)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            return record
+
+    def invalidate(self, table, ids=None):
+        """Usuwa rekordy tabeli (wszystkie lub o podanych id)."""
+        with self._lock:
+            self._generation += 1
+            if ids is None:
+                for key in [key for key in self._entries if key[0] == table]:
+                    del self._entries[key]
+            else:
+                for row_id in ids:
+                    self._entries.pop((table, row_id), None)
+
+    def clear(self):
+        """Usuwa wszystkie rekordy."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Zwraca liczbę rekordów oraz trafień i chybień."""
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_identity_map = IdentityMap()
+
+
+def get_identity_map():
+    """Zwraca współdzieloną mapę rekordów."""
+    return _identity_map
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+import traceback
+import weakref
+
+from psycopg2 import extensions
+
+LEAK_DETECTION_ENABLED = os.environ.get("VETBASE_LEAK_DETECTION", "0") == "1"
+LEAK_CAPTURE_STACKS = os.environ.get("VETBASE_LEAK_STACKS", "1") == "1"
+HOLD_THRESHOLD = float(os.environ.get("VETBASE_LEAK_HOLD_SECONDS", "30"))       # Jak długo można trzymać połączenie
+IDLE_IN_TRANSACTION_THRESHOLD = float(os.environ.get("VETBASE_LEAK_IDLE_SECONDS", "10"))
+CHECK_INTERVAL = 5     # Co ile sekund sprawdzać wypożyczone połączenia
+STACK_DEPTH = 12       # Liczba ramek zapisywanych przy wypożyczeniu
+
+
+def _capture_stack():
+    """Zapisuje stos wywołań miejsca, które pobrało zasób (bez ramek detektora)."""
+    if not LEAK_CAPTURE_STACKS:
+        return None
+    return traceback.extract_stack(limit=STACK_DEPTH + 2)[:-2]
+
+
+def _format_stack(stack):
+    if not stack:
+        return "    (stos niedostępny - ustaw VETBASE_LEAK_STACKS=1)\n"
+    return "".join(traceback.format_list(stack))
+
+
+class _Checkout:
+    """Informacje o jednym wypożyczonym połączeniu."""
+    __slots__ = ("acquired_at", "thread_name", "stack", "cursors",
+                 "in_transaction_since", "warned_hold", "warned_idle")
+
+    def __init__(self, stack):
+        self.acquired_at = time.monotonic()
+        self.thread_name = threading.current_thread().name
+        self.stack = stack
+        self.cursors = []  # Pary (słaba referencja do kursora, stos utworzenia)
+        self.in_transaction_since = None
+        self.warned_hold = False
+        self.warned_idle = False
+
+
+class LeakDetector:
+    """
+    Śledzi wypożyczone z puli połączenia i utworzone na nich kursory.
+    Ostrzega o połączeniach trzymanych zbyt długo, pozostawionych w stanie
+    "idle in transaction" oraz o kursorach niezamkniętych przed zwrotem połączenia.
+    """
+
+    def __init__(self, hold_threshold=HOLD_THRESHOLD,
+                 idle_threshold=IDLE_IN_TRANSACTION_THRESHOLD, check_interval=CHECK_INTERVAL):
+        self.hold_threshold = hold_threshold
+        self.idle_threshold = idle_threshold
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checkouts = {}  # id(połączenia) -> (połączenie, _Checkout)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="LeakDetector", daemon=True)
+        self._thread.start()
+
+    def on_checkout(self, connection):
+        """Rejestruje wypożyczenie połączenia."""
+        with self._lock:
+            self._checkouts[id(connection)] = (connection, _Checkout(_capture_stack()))
+
+    def on_release(self, connection):
+        """Wyrejestrowuje połączenie i zgłasza kursory, których nie zamknięto."""
+        with self._lock:
+            entry = self._checkouts.pop(id(connection), None)
+        if entry is None:
+            return
+        _, checkout = entry
+        for cursor_ref, stack in checkout.cursors:
+            cursor = cursor_ref()
+            if cursor is not None and not cursor.closed:
+                self._warn("Kursor nie został zamknięty przed zwrotem połączenia do puli.", stack)
+
+    def on_cursor(self, connection, cursor):
+        """Rejestruje kursor utworzony na wypożyczonym połączeniu."""
+        with self._lock:
+            entry = self._checkouts.get(id(connection))
+            if entry is not None:
+                entry[1].cursors.append((weakref.ref(cursor), _capture_stack()))
+
+    def report(self):
+        """Zwraca listę aktualnie wypożyczonych połączeń (do diagnostyki)."""
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._checkouts.values())
+        return [
+            {
+                "held_seconds": round(now - checkout.acquired_at, 1),
+                "thread": checkout.thread_name,
+                "transaction_status": connection.info.transaction_status,
+                "open_cursors": sum(1 for ref, _ in checkout.cursors if ref() is not None and not ref().closed),
+                "stack": _format_stack(checkout.stack),
+            }
+            for connection, checkout in entries
+        ]
+
+    def check(self):
+        """Sprawdza wypożyczone połączenia i wypisuje ostrzeżenia."""
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._checkouts.values())
+
+        for connection, checkout in entries:
+            held = now - checkout.acquired_at
+            if held > self.hold_threshold and not checkout.warned_hold:
+                checkout.warned_hold = True
+                self._warn(
+                    f"Połączenie trzymane od {held:.0f} s (wątek {checkout.thread_name}).",
+                    checkout.stack,
+                )
+
+            # Status czytamy bez blokowania połączenia - to tylko odczyt pola libpq
+            status = connection.info.transaction_status if not connection.closed else None
+            if status == extensions.TRANSACTION_STATUS_INTRANS:
+                if checkout.in_transaction_since is None:
+                    checkout.in_transaction_since = now
+                idle = now - checkout.in_transaction_since
+                if idle > self.idle_threshold and not checkout.warned_idle:
+                    checkout.warned_idle = True
+                    self._warn(
+                        f"Połączenie bezczynne w otwartej transakcji od co najmniej {idle:.0f} s.",
+                        checkout.stack,
+                    )
+            else:
+                checkout.in_transaction_since = None
+
+    def stop(self):
+        """Zatrzymuje wątek nadzorujący."""
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"[LeakDetector] Błąd podczas sprawdzania połączeń: {e}")
+
+    def _warn(self, message, stack):
+        print(f"[LeakDetector] {message}\n  Miejsce pobrania:\n{_format_stack(stack)}")
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_leak_detector():
+    """Zwraca detektor wycieków lub None, gdy jest wyłączony (VETBASE_LEAK_DETECTION=1 go włącza)."""
+    global _detector
+    if not LEAK_DETECTION_ENABLED:
+        return None
+    with _detector_lock:
+        if _detector is None:
+            _detector = LeakDetector()
+        return _detector
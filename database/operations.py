@@ -1,39 +1,117 @@
-from database.connection import get_connection
+from database.connection import pooled_connection
+from database.prepared import execute_prepared
+from database.batch import fetch_batch
+from database.streaming import iter_batches, STREAM_ITERSIZE
+from database.parallel import shared_snapshot, run_in_snapshot
+from database.identity_map import get_identity_map
+from database.query_cache import fetch_cached, get_query_cache
+from database.attachments import describe_file, store_attachment
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from functools import partial
+import json
 
-def add_animal(name, species, breed, age, owner_name, owner_contact):
+HISTORY_PAGE_SIZE = 200  # Liczba wpisów historii pobieranych na jedną stronę
+
+# Kolumny rekordów przechowywanych w mapie tożsamości (kolejność jak w zapytaniach)
+ANIMAL_COLUMNS = ("id", "name", "species", "breed", "age", "owner_name", "owner_contact", "owner_email", "info")
+# Skrót podglądu aktualnego zdjęcia zwierzęcia - ukryta, ostatnia kolumna wierszy tabeli zwierząt
+ANIMAL_PHOTO_SELECT = """(
+    SELECT r.sha256 FROM animal_photo_renditions r WHERE r.photo_id = animals.photo_id AND r.rendition = 'preview'
+) AS photo"""
+VISIT_COLUMNS = ("id", "animal_id", "reservation_date", "visit_date", "registered_by", "description", "location_id")
+
+def _as_datetime(value):
+    """Zamienia datę na początek dnia; datetime zostaje bez zmian."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    return datetime.fromisoformat(str(value).strip())
+
+def date_range_bounds(value):
+    """
+    Zamienia filtr daty na półotwarty przedział [od, do).
+    :param value: Tekst 'YYYY', 'YYYY-MM' lub 'YYYY-MM-DD', obiekt date (jeden dzień)
+                  albo para (od, do) z wyłącznym końcem.
+    :raises ValueError: gdy format daty jest nieprawidłowy.
+    """
+    if isinstance(value, (tuple, list)):
+        start, end = value
+        return _as_datetime(start), _as_datetime(end)
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        start = datetime.combine(value, time.min)
+        return start, start + timedelta(days=1)
+
+    text = str(value).strip()
     try:
-        conn = get_connection()
-        if not conn:
-            return False
+        if len(text) == 4:
+            start = datetime.strptime(text, "%Y")
+            return start, start.replace(year=start.year + 1)
+        if len(text) == 7:
+            start = datetime.strptime(text, "%Y-%m")
+            if start.month == 12:
+                return start, start.replace(year=start.year + 1, month=1)
+            return start, start.replace(month=start.month + 1)
+        if len(text) == 10:
+            start = datetime.strptime(text, "%Y-%m-%d")
+            return start, start + timedelta(days=1)
+    except ValueError:
+        pass
+    raise ValueError("Nieprawidłowy format daty! Użyj formatu YYYY, YYYY-MM lub YYYY-MM-DD.")
 
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO animals (name, species, breed, age, owner_name, owner_contact)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (name, species, breed, age, owner_name, owner_contact))
-        conn.commit()
+def date_range_predicate(column, value):
+    """
+    Buduje warunek `kolumna >= od AND kolumna < do`, który może korzystać z indeksu kolumny
+    (w przeciwieństwie do kolumna::date = ... czy TO_CHAR(kolumna, ...) = ...).
+    :param value: Filtr daty w formacie akceptowanym przez date_range_bounds.
+    :return: Krotka (warunek SQL, lista parametrów).
+    """
+    start, end = date_range_bounds(value)
+    return f"{column} >= %s AND {column} < %s", [start, end]
+
+def _fetch_all(query, params):
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            execute_prepared(cursor, query, params)
+            return cursor.fetchall()
+
+def _cached_fetch_all(query, params, tags, ttl=None):
+    """
+    Wykonuje zapytanie odczytu przez pamięć podręczną wyników (klucz: zapytanie i parametry).
+    :param tags: Tabele, od których zależy wynik - ich zmiana usuwa go z pamięci.
+    """
+    return fetch_cached(query, params, tags, partial(_fetch_all, query, params), ttl)
+
+def add_animal(name, species, breed, age, owner_name, owner_contact):
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO animals (name, species, breed, age, owner_name, owner_contact)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (name, species, breed, age, owner_name, owner_contact))
+            conn.commit()
+        get_query_cache().invalidate("animals")
 
-        cursor.close()
-        conn.close()
         print("Animal added successfully!")
         return True
     except Exception as e:
         print("Error adding animal:", e)
         return False
-    
+
 def create_user(username, password_hash, role):
-    connection = get_connection()
-    if not connection:
-        return False
     try:
-        cursor = connection.cursor()
-        cursor.execute("""
-            INSERT INTO users (username, password_hash, role)
-            VALUES (%s, %s, %s)
-        """, (username, password_hash, role))
-        connection.commit()
-        cursor.close()
-        connection.close()
+        with pooled_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO users (username, password_hash, role)
+                    VALUES (%s, %s, %s)
+                """, (username, password_hash, role))
+            connection.commit()
+        get_query_cache().invalidate("users")
         return True
     except Exception as e:
         print(f"Error creating user: {e}")
@@ -41,49 +119,36 @@ def create_user(username, password_hash, role):
 
 def delete_user(user_id):
     try:
-        connection = get_connection()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
-        connection.commit()
-        cursor.close()
-        connection.close()
+        with pooled_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+            connection.commit()
+        get_query_cache().invalidate("users")
         return True
     except Exception as e:
         print(f"Error deleting user: {e}")
         return False
 
-def get_all_users():
-    connection = get_connection()
-    if not connection:
-        return []
-    try:
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, username, role, created_at FROM users")
-        users = cursor.fetchall()
-        cursor.close()
-        connection.close()
-        return users
-    except Exception as e:
-        print(f"Error fetching users: {e}")
-        return []
-    
+def get_all_users(ids=None):
+    """Pobierz wszystkich użytkowników lub tylko tych o podanych id (wyjątki przekazywane do wywołującego)."""
+    query = "SELECT id, username, role, created_at FROM users"
+    params = ()
+    if ids is not None:
+        query += " WHERE id = ANY(%s)"
+        params = (list(ids),)
+    return _cached_fetch_all(query, params, ("users",))
+
 def get_visits_for_date(date):
     """Pobierz wizyty zaplanowane na daną datę."""
-    connection = get_connection()
-    if not connection:
-        return []
     try:
-        cursor = connection.cursor()
-        cursor.execute("""
+        condition, params = date_range_predicate("v.visit_date", date)
+        return _cached_fetch_all(f"""
             SELECT v.id, a.name, v.visit_date::time, v.description
             FROM visits v
             JOIN animals a ON v.animal_id = a.id
-            WHERE v.visit_date::date = %s
-        """, (date,))
-        visits = cursor.fetchall()
-        cursor.close()
-        connection.close()
-        return visits
+            WHERE {condition}
+            ORDER BY v.visit_date
+        """, tuple(params), ("visits", "animals"))
     except Exception as e:
         print(f"Error fetching visits for date {date}: {e}")
         return []
@@ -102,63 +167,522 @@ def add_history_record(animal_id, visit_date, registered_by, description_reason,
     :return: True, jeśli zapis zakończono sukcesem, False w przypadku błędu.
     """
     try:
-        connection = get_connection()
-        if not connection:
-            return False
-
-        cursor = connection.cursor()
-        cursor.execute("""
-            INSERT INTO history (animal_id, visit_date, registered_by, description_reason, medication, indications, location_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (animal_id, visit_date, registered_by, description_reason, medication, indications, location_id))
-        history_id = cursor.fetchone()[0]  # Pobierz ID nowo dodanego rekordu
-
-        # Obsługa załączników
-        if attachments:
-            for attachment in attachments:
+        # Skróty plików liczymy przed transakcją
+        files = [describe_file(path) for path in attachments or ()]
+        with pooled_connection() as connection:
+            with connection.cursor() as cursor:
                 cursor.execute("""
-                    INSERT INTO history_attachments (history_id, file_path)
-                    VALUES (%s, %s)
-                """, (history_id, attachment))
+                    INSERT INTO history (animal_id, visit_date, registered_by, description_reason, medication, indications, location_id)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                """, (animal_id, visit_date, registered_by, description_reason, medication, indications, location_id))
+                history_id = cursor.fetchone()[0]  # Pobierz ID nowo dodanego rekordu
+
+                # Obsługa załączników
+                save_history_attachments(cursor, history_id, files)
 
-        connection.commit()
-        cursor.close()
-        connection.close()
+            connection.commit()
+        get_query_cache().invalidate("history")
         return True
     except Exception as e:
         print(f"Błąd podczas dodawania historii leczenia: {e}")
         return False
 
-def get_filtered_history(filters=None):
-    """Pobierz historię leczenia z zastosowaniem filtrów."""
-    connection = get_connection()
-    if not connection:
-        return []
+def save_history_attachments(cursor, history_id, files):
+    """
+    Zapisuje treść plików w magazynie załączników i dołącza je do wpisu historii (w transakcji wywołującego).
+    Do wpisu trafia skrót treści i metadane, a nie ścieżka na dysku klienta.
+    :param files: Wyniki describe_file().
+    """
+    for file in files:
+        store_attachment(cursor, file)
+        cursor.execute("""
+            INSERT INTO history_attachments (history_id, sha256, file_name, content_type, size)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (history_id, file["sha256"], file["file_name"], file["content_type"], file["size"]))
+
+def get_history_attachments(history_id):
+    """
+    Pobierz załączniki wpisu historii: (id, sha256, nazwa pliku, typ treści, rozmiar, ścieżka).
+    Starsze wpisy mają tylko ścieżkę pliku na stanowisku, które je dodało (sha256 = None).
+    """
+    return _cached_fetch_all("""
+        SELECT id, sha256, COALESCE(file_name, file_path), content_type, size, file_path
+        FROM history_attachments
+        WHERE history_id = %s
+        ORDER BY id
+    """, (history_id,), ("history",))
+
+def _filtered_history_query(filters=None):
+    """Buduje zapytanie historii leczenia z filtrami; zwraca (zapytanie, parametry)."""
+    query = """
+        SELECT h.id, a.name, h.visit_date, h.registered_by, h.description_reason, h.medication, h.payment
+        FROM history h
+        JOIN animals a ON h.animal_id = a.id
+        WHERE TRUE
+    """
+    params = []
+    if filters:
+        if filters.get("date"):
+            condition, condition_params = date_range_predicate("h.visit_date", filters["date"])
+            query += f" AND {condition}"
+            params.extend(condition_params)
+        if filters.get("doctor"):
+            query += " AND h.registered_by ILIKE %s"
+            params.append(f"%{filters['doctor']}%")
+        if filters.get("medication"):
+            query += " AND h.medication ILIKE %s"
+            params.append(f"%{filters['medication']}%")
+    return query, params
+
+def get_filtered_history(filters=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """
+    Pobierz stronę historii leczenia z zastosowaniem filtrów.
+    Stronicowanie kluczem (visit_date, id) od najnowszych wpisów.
+    :param after: Klucz (visit_date, id) ostatniego wiersza poprzedniej strony.
+    :param limit: Rozmiar strony.
+    """
+    query, params = _filtered_history_query(filters)
+    if after is not None:
+        query += " AND (h.visit_date, h.id) < (%s, %s)"
+        params.extend(after)
+    query += " ORDER BY h.visit_date DESC, h.id DESC LIMIT %s"
+    params.append(limit)
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT h.id, a.name, h.visit_date, h.registered_by, h.description_reason, h.medication, h.payment
-            FROM history h
-            JOIN animals a ON h.animal_id = a.id
-            WHERE TRUE
-        """
-        params = []
-        if filters:
-            if filters.get("date"):
-                query += " AND h.visit_date::date = %s"
-                params.append(filters["date"])
-            if filters.get("doctor"):
-                query += " AND h.registered_by ILIKE %s"
-                params.append(f"%{filters['doctor']}%")
-            if filters.get("medication"):
-                query += " AND h.medication ILIKE %s"
-                params.append(f"%{filters['medication']}%")
-        cursor.execute(query, tuple(params))
-        history = cursor.fetchall()
-        cursor.close()
-        connection.close()
-        return history
+        return _cached_fetch_all(query, tuple(params), ("history", "animals"))
     except Exception as e:
         print(f"Error fetching filtered history: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def get_history_rows(ids):
+    """Pobierz wpisy historii leczenia o podanych id (w układzie kolumn get_filtered_history)."""
+    query, params = _filtered_history_query()
+    query += " AND h.id = ANY(%s)"
+    params.append(list(ids))
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query, tuple(params))
+            return cursor.fetchall()
+
+def estimate_filtered_history_count(filters=None):
+    """Szacunkowa liczba wpisów historii pasujących do filtrów (z planu zapytania, bez COUNT(*))."""
+    query, params = _filtered_history_query(filters)
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, tuple(params))
+            plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def _remember(table, columns, rows, generation):
+    """
+    Zapisuje rekordy w mapie tożsamości; ostatnia kolumna wiersza to wersja (xmin).
+    :return: Rekordy (słowniki) w kolejności wierszy.
+    """
+    identity_map = get_identity_map()
+    return [
+        identity_map.put(table, row[0], row[-1], dict(zip(columns, row[:-1])), generation)
+        for row in rows
+    ]
+
+def get_all_animals(ids=None):
+    """
+    Pobierz wszystkie zwierzęta lub tylko te o podanych id (wyjątki przekazywane do wywołującego).
+    Ostatnia kolumna wiersza to skrót podglądu zdjęcia (None bez zdjęcia).
+    Pobrane wiersze trafiają też do mapy tożsamości.
+    """
+    query = f"SELECT {', '.join(ANIMAL_COLUMNS)}, {ANIMAL_PHOTO_SELECT}, xmin::text FROM animals"
+    params = ()
+    if ids is not None:
+        query += " WHERE id = ANY(%s)"
+        params = (list(ids),)
+    generation = get_identity_map().generation
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+    _remember("animals", ANIMAL_COLUMNS, [row[:len(ANIMAL_COLUMNS)] + row[-1:] for row in rows], generation)
+    return [row[:-1] for row in rows]
+
+def _fetch_records(table, columns, row_id):
+    """Pobiera wiersz tabeli z wersją i zapisuje go w mapie tożsamości."""
+    generation = get_identity_map().generation
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            execute_prepared(
+                cursor, f"SELECT {', '.join(columns)}, xmin::text FROM {table} WHERE id = %s", (row_id,)
+            )
+            rows = cursor.fetchall()
+    return _remember(table, columns, rows, generation)
+
+def get_animal(animal_id):
+    """
+    Pobierz zwierzę jako słownik kolumn - z mapy tożsamości, a przy braku lub nieaktualności z bazy.
+    :return: Rekord lub None, jeśli zwierzę nie istnieje.
+    """
+    record = get_identity_map().get("animals", animal_id)
+    if record is None:
+        record = next(iter(_fetch_records("animals", ANIMAL_COLUMNS, animal_id)), None)
+    return record
+
+def find_animals(search_text=None):
+    """Pobierz zwierzęta pasujące do tekstu (imię, właściciel lub rasa)."""
+    query = "SELECT id, name, owner_name, breed FROM animals"
+    params = ()
+    if search_text:
+        query += """
+            WHERE name ILIKE %s
+               OR owner_name ILIKE %s
+               OR breed ILIKE %s
+        """
+        params = (f"%{search_text}%", f"%{search_text}%", f"%{search_text}%")
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            execute_prepared(cursor, query, params)
+            return cursor.fetchall()
+
+def get_animal_index_rows(changed_since=None):
+    """
+    Pobierz zwierzęta do indeksu wyszukiwania - wszystkie lub zmienione od podanej chwili.
+    :return: Krotka (czas serwera, wiersze (id, imię, właściciel, rasa, kontakt),
+             zbiór wszystkich id przy odświeżaniu lub None przy pełnym pobraniu).
+    """
+    query = "SELECT id, name, owner_name, breed, owner_contact FROM animals"
+    params = ()
+    if changed_since is not None:
+        query += " WHERE updated_at >= %s"
+        params = (changed_since,)
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT now()")
+            server_time = cursor.fetchone()[0]
+            execute_prepared(cursor, query, params)
+            rows = cursor.fetchall()
+            existing_ids = None
+            if changed_since is not None:
+                # Usunięte zwierzęta nie zostawiają śladu - porównujemy listy id
+                cursor.execute("SELECT id FROM animals")
+                existing_ids = {row[0] for row in cursor.fetchall()}
+    return server_time, rows, existing_ids
+
+def get_all_visits(ids=None, animal_ids=None):
+    """
+    Pobierz wszystkie zaplanowane wizyty.
+    :param ids: Tylko wizyty o podanych id.
+    :param animal_ids: Tylko wizyty podanych zwierząt (np. po zmianie imienia).
+    """
+    query = f"""
+        SELECT a.name, {', '.join('v.' + column for column in VISIT_COLUMNS)}, v.xmin::text
+        FROM visits v
+        JOIN animals a ON v.animal_id = a.id
+        WHERE TRUE
+    """
+    params = []
+    if ids is not None:
+        query += " AND v.id = ANY(%s)"
+        params.append(list(ids))
+    if animal_ids is not None:
+        query += " AND v.animal_id = ANY(%s)"
+        params.append(list(animal_ids))
+    generation = get_identity_map().generation
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query, tuple(params))
+            rows = cursor.fetchall()
+    # Pełne rekordy wizyt trafiają do mapy tożsamości, a tabela dostaje kolumny do wyświetlenia
+    visits = _remember("visits", VISIT_COLUMNS, [row[1:] for row in rows], generation)
+    return [
+        (visit["id"], row[0], visit["reservation_date"], visit["visit_date"], visit["registered_by"], visit["description"])
+        for row, visit in zip(rows, visits)
+    ]
+
+def get_visit(visit_id):
+    """
+    Pobierz wizytę jako słownik kolumn - z mapy tożsamości, a przy braku lub nieaktualności z bazy.
+    :return: Rekord lub None, jeśli wizyta nie istnieje.
+    """
+    record = get_identity_map().get("visits", visit_id)
+    if record is None:
+        record = next(iter(_fetch_records("visits", VISIT_COLUMNS, visit_id)), None)
+    return record
+
+def get_upcoming_visits(date_from, date_to):
+    """Pobierz wizyty z podanego przedziału dat (do przypomnień)."""
+    condition, params = date_range_predicate("v.visit_date", (date_from, date_to))
+    return _cached_fetch_all(f"""
+        SELECT v.id, a.name, v.visit_date, a.owner_name
+        FROM visits v
+        JOIN animals a ON v.animal_id = a.id
+        WHERE {condition}
+        ORDER BY v.visit_date
+    """, tuple(params), ("visits", "animals"))
+
+def get_species():
+    """Pobierz nazwy gatunków występujących w bazie zwierząt."""
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT species FROM animals WHERE species <> '' ORDER BY species")
+            return [row[0] for row in cursor.fetchall()]
+
+def get_all_locations(ids=None):
+    """Pobierz wszystkie lokalizacje lub tylko te o podanych id."""
+    query = "SELECT id, name, address, phone, email FROM locations"
+    params = ()
+    if ids is not None:
+        query += " WHERE id = ANY(%s)"
+        params = (list(ids),)
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+def _search_history_query(filters=None):
+    """Buduje zapytanie wyszukiwania historii; zwraca (zapytanie, parametry)."""
+    query = """
+        SELECT 
+            a.id, a.name, a.species, a.breed, 
+            a.owner_name, h.visit_date, h.description_reason, h.id
+        FROM animals a
+        JOIN history h ON a.id = h.animal_id
+    """
+    conditions = []
+    params = []
+    if filters:
+        for key, column in (("name", "a.name"), ("breed", "a.breed"), ("owner", "a.owner_name"),
+                            ("description", "h.description_reason")):
+            if filters.get(key):
+                conditions.append(f"{column} ILIKE %s")
+                params.append(f"%{filters[key]}%")
+        if filters.get("visit_date"):
+            condition, condition_params = date_range_predicate("h.visit_date", filters["visit_date"])
+            conditions.append(condition)
+            params.extend(condition_params)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY h.visit_date DESC, h.id DESC"
+    return query, tuple(params)
+
+def search_history(filters=None):
+    """
+    Pobierz historię leczenia razem z danymi zwierząt (ostatnia kolumna to id wpisu historii).
+    :param filters: Słownik z kluczami name, breed, owner, visit_date (YYYY, YYYY-MM
+                    lub YYYY-MM-DD), description; puste wartości nie filtrują.
+    """
+    query, params = _search_history_query(filters)
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            execute_prepared(cursor, query, params)
+            return cursor.fetchall()
+
+def iter_search_history(filters=None, limit=None, offset=0, batch_size=STREAM_ITERSIZE, cancel_token=None):
+    """
+    Jak search_history, ale zwraca generator paczek wierszy z kursora serwera.
+    :param limit: Maksymalna liczba wierszy (None - bez limitu).
+    :param offset: Liczba pomijanych wierszy (kolejne strony wyników).
+    :param cancel_token: CancellationToken do przerwania zapytania z innego wątku.
+    """
+    query, params = _search_history_query(filters)
+    if limit is not None:
+        query += " LIMIT %s OFFSET %s"
+        params += (limit, offset)
+    return iter_batches(query, params, batch_size, cancel_token)
+
+TREATMENT_REPORT_LIMIT = 10  # Liczba leków w statystykach leczenia
+
+def _split_report_rows(rows):
+    """
+    Rozdziela wiersze raportu zbiorczego (rodzaj, etykieta, wartości...) na trzy tabele.
+    :return: Krotka (statystyki wizyt, statystyki leczenia, statystyki płatności).
+    """
+    visit_stats, treatment_stats, payment_stats = [], [], []
+    for kind, label, visit_count, animal_count, payment in rows:
+        if kind == "month":
+            visit_stats.append((label, visit_count, animal_count))
+            payment_stats.append((label, visit_count, payment))
+        else:
+            average = round(Decimal(visit_count) / animal_count, 2) if animal_count else None
+            treatment_stats.append((label, average))
+
+    visit_stats.sort(key=lambda row: row[0])
+    payment_stats.sort(key=lambda row: row[0])
+    treatment_stats.sort(key=lambda row: (row[1] is None, -(row[1] or 0)))
+    return visit_stats, treatment_stats[:TREATMENT_REPORT_LIMIT], payment_stats
+
+def _report_rows_from_rollup(cursor, location_id):
+    """Wiersze raportu z tabel zbiorczych - jedno zapytanie zamiast trzech."""
+    location_condition = "WHERE location_id = %s" if location_id else ""
+    params = (location_id,) * 3 if location_id else ()
+    execute_prepared(cursor, f"""
+        WITH months AS (
+            SELECT month, SUM(visit_count) AS visit_count, COUNT(DISTINCT animal_id) AS animal_count
+            FROM history_rollup_month_animals
+            {location_condition}
+            GROUP BY month
+        ), payments AS (
+            SELECT month, SUM(payment_total) AS payment
+            FROM history_rollup
+            {location_condition}
+            GROUP BY month
+        ), medications AS (
+            SELECT medication, SUM(visit_count) AS visit_count, COUNT(DISTINCT animal_id) AS animal_count
+            FROM history_rollup_medication_animals
+            {location_condition}
+            GROUP BY medication
+        )
+        SELECT 'month', TO_CHAR(m.month, 'YYYY-MM'), m.visit_count, m.animal_count, p.payment
+        FROM months m
+        LEFT JOIN payments p ON p.month = m.month
+        UNION ALL
+        SELECT 'medication', NULLIF(medication, ''), visit_count, animal_count, NULL
+        FROM medications
+    """, params)
+    return cursor.fetchall()
+
+def _report_rows_from_history(cursor, location_id, date_filter):
+    """Wiersze raportu z jednego przebiegu po history (GROUPING SETS po miesiącu i leku)."""
+    conditions, params = [], []
+    if location_id:
+        conditions.append("location_id = %s")
+        params.append(location_id)
+    if date_filter:
+        condition, condition_params = date_range_predicate("visit_date", date_filter)
+        conditions.append(condition)
+        params.extend(condition_params)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    execute_prepared(cursor, f"""
+        SELECT 
+            CASE WHEN GROUPING(month) = 0 THEN 'month' ELSE 'medication' END,
+            CASE WHEN GROUPING(month) = 0 THEN TO_CHAR(month, 'YYYY-MM') ELSE medication END,
+            COUNT(*),
+            COUNT(DISTINCT animal_id),
+            SUM(payment)
+        FROM (
+            SELECT date_trunc('month', visit_date) AS month, medication, animal_id, payment
+            FROM history
+            {where}
+        ) AS filtered
+        GROUP BY GROUPING SETS ((month), (medication))
+    """, tuple(params))
+    return cursor.fetchall()
+
+def get_report_statistics(location_id=None, date_filter=None):
+    """
+    Pobierz statystyki wizyt, leczenia i płatności w jednym przebiegu.
+    Bez filtra daty dane pochodzą z tabel zbiorczych (history_rollup*); z filtrem
+    daty - z jednego skanu history zgrupowanego naraz po miesiącach i lekach.
+    :param location_id: ID lokalizacji lub None dla wszystkich lokalizacji.
+    :param date_filter: Filtr daty w formacie date_range_bounds lub None dla całego okresu.
+    :return: Krotka (statystyki wizyt, statystyki leczenia, statystyki płatności).
+    """
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            if date_filter:
+                rows = _report_rows_from_history(cursor, location_id, date_filter)
+            else:
+                rows = _report_rows_from_rollup(cursor, location_id)
+    return _split_report_rows(rows)
+
+def _financial_summary_query(date_filter=None, location_id=None):
+    """Buduje zapytanie sum płatności wg miesięcy; zwraca (zapytanie, parametry)."""
+    query = """
+        SELECT 
+            TO_CHAR(month, 'YYYY-MM') AS period, 
+            SUM(payment_total) AS total_payment
+        FROM history_rollup
+    """
+    conditions = []
+    parameters = []
+
+    # Filtr daty (rok lub miesiąc jako przedział miesięcy)
+    if date_filter:
+        if len(date_filter) not in (4, 7):
+            raise ValueError("Nieprawidłowy format daty! Użyj formatu YYYY-MM lub YYYY.")
+        condition, condition_params = date_range_predicate("month", date_filter)
+        conditions.append(condition)
+        parameters.extend(condition_params)
+
+    # Filtr lokalizacji (0 oznacza wpisy bez lokalizacji)
+    if location_id is not None:
+        conditions.append("location_id = %s")
+        parameters.append(location_id)
+
+    # Dodaj warunki do zapytania
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    query += " GROUP BY period ORDER BY period"
+    return query, tuple(parameters)
+
+def get_financial_summary(date_filter=None, location_id=None):
+    """
+    Pobierz sumy płatności w podziale na miesiące (z tabeli zbiorczej history_rollup).
+    :param date_filter: Rok (YYYY) lub miesiąc (YYYY-MM); None oznacza cały okres.
+    :param location_id: ID lokalizacji lub None dla wszystkich lokalizacji.
+    """
+    query, parameters = _financial_summary_query(date_filter, location_id)
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            execute_prepared(cursor, query, parameters)
+            return cursor.fetchall()
+
+def _financial_summary_task(date_filter, location_id, cursor):
+    """Zadanie dla run_in_snapshot: sumy płatności jednej lokalizacji jako słownik {okres: kwota}."""
+    query, parameters = _financial_summary_query(date_filter, location_id)
+    execute_prepared(cursor, query, parameters)
+    return dict(cursor.fetchall())
+
+def get_financial_summary_by_location(date_filter=None):
+    """
+    Pobierz sumy płatności w podziale na miesiące i lokalizacje.
+    Każda lokalizacja i suma całkowita liczone są równolegle na wolnych połączeniach z puli
+    współdzielących jedną migawkę bazy, więc wyniki są ze sobą spójne.
+    :param date_filter: Rok (YYYY) lub miesiąc (YYYY-MM); None oznacza cały okres.
+    :return: Krotka (lista lokalizacji (id, nazwa), wiersze (okres, kwoty wg lokalizacji..., suma)).
+    """
+    with shared_snapshot() as (cursor, snapshot_id):
+        cursor.execute("SELECT id, name FROM locations ORDER BY name")
+        locations = cursor.fetchall() + [(0, "Bez lokalizacji")]
+        tasks = [partial(_financial_summary_task, date_filter, location_id) for location_id, _ in locations]
+        tasks.append(partial(_financial_summary_task, date_filter, None))
+        *by_location, total = run_in_snapshot(cursor, snapshot_id, tasks)
+
+    # Kolumna wpisów bez lokalizacji tylko wtedy, gdy takie wpisy istnieją
+    if not by_location[-1]:
+        locations.pop()
+        by_location.pop()
+
+    rows = [
+        (period, *(amounts.get(period, 0) for amounts in by_location), total[period])
+        for period in sorted(total)
+    ]
+    return locations, rows
+
+def get_animal_name(animal_id):
+    """Pobierz imię zwierzęcia (z mapy tożsamości, jeśli jest); None, jeśli zwierzę nie istnieje."""
+    record = get_animal(animal_id)
+    return record["name"] if record else None
+
+def get_edit_visit_dialog_data(visit_id):
+    """
+    Pobierz w jednym przejściu listę zwierząt i dane edytowanej wizyty.
+    :return: Krotka (lista zwierząt (id, imię), wizyta lub None).
+    """
+    animals, visit = fetch_batch([
+        ("SELECT id, name FROM animals", ()),
+        ("""
+            SELECT animal_id, reservation_date, visit_date, description
+            FROM visits
+            WHERE id = %s
+        """, (visit_id,)),
+    ])
+    if not visit:
+        return animals, None
+    animal_id, reservation_date, visit_date, description = visit[0]
+    return animals, (
+        animal_id,
+        datetime.fromisoformat(reservation_date) if reservation_date else None,
+        datetime.fromisoformat(visit_date) if visit_date else None,
+        description,
+    )
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from queue import Empty, SimpleQueue
+
+from database.connection import pooled_connection, DatabaseUnavailableError
+
+PARALLEL_WORKERS = 3  # Ile dodatkowych połączeń z puli może zająć jedno zapytanie równoległe
+
+
+@contextmanager
+def shared_snapshot():
+    """
+    Otwiera transakcję tylko do odczytu i eksportuje jej migawkę (pg_export_snapshot).
+    Migawka pozostaje ważna do końca bloku `with`.
+    :return: Para (kursor połączenia wiodącego, identyfikator migawki).
+    """
+    with pooled_connection() as connection:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                cursor.execute("SELECT pg_export_snapshot()")
+                snapshot_id = cursor.fetchone()[0]
+                yield cursor, snapshot_id
+        finally:
+            connection.rollback()
+
+
+def _free_connections(stack, count):
+    """
+    Wypożycza do `count` połączeń bez czekania na pulę - tylko tyle, ile jest wolnych,
+    żeby zapytanie równoległe nie blokowało innych okien ani nie czekało samo na siebie.
+    """
+    connections = []
+    for _ in range(count):
+        try:
+            connections.append(stack.enter_context(pooled_connection(timeout=0)))
+        except DatabaseUnavailableError:
+            break
+    return connections
+
+
+def _drain(cursor, queue, results):
+    """Wykonuje kolejne zadania z kolejki na podanym kursorze, aż kolejka się opróżni."""
+    while True:
+        try:
+            index, task = queue.get_nowait()
+        except Empty:
+            return
+        results[index] = task(cursor)
+
+
+def _drain_in_snapshot(connection, snapshot_id, queue, results):
+    """Jak _drain(), na osobnym połączeniu w zaimportowanej migawce."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+            _drain(cursor, queue, results)
+    finally:
+        connection.rollback()
+
+
+def run_in_snapshot(cursor, snapshot_id, tasks, max_workers=PARALLEL_WORKERS):
+    """
+    Wykonuje zadania równolegle na kilku połączeniach, które widzą ten sam stan bazy.
+    Musi być wywołane wewnątrz bloku shared_snapshot(), który wyeksportował migawkę.
+    Zadania wykonuje też połączenie wiodące; bez wolnych połączeń w puli - tylko ono, po kolei.
+    :param cursor: Kursor połączenia wiodącego (z shared_snapshot()).
+    :param tasks: Lista funkcji przyjmujących kursor i zwracających wynik.
+    :return: Lista wyników w kolejności zadań.
+    """
+    queue = SimpleQueue()
+    for item in enumerate(tasks):
+        queue.put(item)
+    results = [None] * len(tasks)
+
+    with ExitStack() as stack:
+        connections = _free_connections(stack, min(max_workers, len(tasks) - 1))
+        if not connections:
+            _drain(cursor, queue, results)
+            return results
+        with ThreadPoolExecutor(max_workers=len(connections), thread_name_prefix="VetBaseSnapshot") as executor:
+            futures = [
+                executor.submit(_drain_in_snapshot, connection, snapshot_id, queue, results)
+                for connection in connections
+            ]
+            _drain(cursor, queue, results)
+            for future in futures:
+                future.result()
+    return results
@@ -0,0 +1,296 @@
+"""
+Zdjęcia zwierząt: z każdego zdjęcia powstają wersje o stałych rozmiarach (RENDITIONS),
+zapisywane w magazynie załączników (treść adresowana skrótem SHA-256, lokalna kopia
+w katalogach wg skrótu), a w bazie - ich skróty i wymiary. Okna czytają zawsze wersję
+w potrzebnym rozmiarze zamiast skalować oryginał.
+
+Import katalogu (np. dotychczasowego images/ z plikami <id>.jpg):
+    python -m database.photos images/
+    python -m database.photos zdjecia/ --external-id   # nazwy plików to external_id zwierząt
+
+Wersje generowane są w puli procesów (dekodowanie i skalowanie JPEG obciąża procesor
+i nie zwalnia GIL), a zapis do bazy odbywa się w procesie głównym, osobna transakcja na zdjęcie.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import psycopg2
+
+from database.attachments import describe_file, store_attachment
+from database.connection import pooled_connection, close_pool, DatabaseUnavailableError
+
+# Wersje zdjęcia: (nazwa, najdłuższy bok w pikselach), od najmniejszej
+RENDITIONS = (("thumbnail", 150), ("preview", 300), ("full", 1600))
+RENDITION_QUALITY = 85       # Jakość JPEG zapisywanych wersji
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".heic")
+PROGRESS_EVERY = 100         # Co ile zdjęć wypisywać postęp importu katalogu
+
+_pool = None
+
+
+def render_photo(path, work_dir, known_hashes=()):
+    """
+    Generuje wersje zdjęcia (wywoływane w procesie roboczym).
+    :param known_hashes: Skróty zdjęć, które zwierzę już ma - takie zdjęcie jest pomijane bez dekodowania.
+    :return: Słownik z kluczami sha256, original_name i renditions (lista wyników describe_file()
+             uzupełnionych o rendition, width, height) lub None dla pominiętego zdjęcia.
+    :raises ValueError: Pliku nie da się odczytać jako obrazu.
+    """
+    # Qt tylko w procesach roboczych i przy imporcie - moduł nie wymaga go do zapytań
+    from PyQt6.QtCore import QSize, Qt
+    from PyQt6.QtGui import QImageReader
+
+    original = describe_file(path)
+    if original["sha256"] in known_hashes:
+        return None
+
+    largest = RENDITIONS[-1][1]
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)  # Zdjęcia z telefonu - obrót według EXIF
+    size = reader.size()
+    if size.isValid() and (size.width() > largest or size.height() > largest):
+        # Dekoder JPEG od razu zmniejsza obraz - oryginał nie jest rozkodowywany w pełnym rozmiarze
+        reader.setScaledSize(size.scaled(QSize(largest, largest), Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(f"nie można odczytać obrazu: {reader.errorString()}")
+
+    renditions = []
+    prefix = uuid.uuid4().hex
+    # Od największej - każda kolejna wersja powstaje z poprzedniej, mniejszej od oryginału
+    for name, edge in reversed(RENDITIONS):
+        if image.width() > edge or image.height() > edge:
+            image = image.scaled(
+                edge, edge, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+            )
+        target = os.path.join(work_dir, f"{prefix}_{name}.jpg")
+        if not image.save(target, "JPG", RENDITION_QUALITY):
+            raise ValueError(f"nie udało się zapisać wersji {name}")
+        rendition = describe_file(target)
+        rendition.update(rendition=name, width=image.width(), height=image.height())
+        renditions.append(rendition)
+    return {"sha256": original["sha256"], "original_name": original["file_name"], "renditions": renditions}
+
+
+def get_photo_pool(workers=None):
+    """
+    Zwraca współdzieloną pulę procesów generujących wersje zdjęć (tworzoną przy pierwszym użyciu).
+    Procesy są uruchamiane metodą spawn - fork procesu z wątkami Qt i połączeniami bazy nie jest bezpieczny.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_photo_pool():
+    """Zamyka pulę procesów (np. przy wyjściu z aplikacji)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def save_photo(connection, animal_id, photo):
+    """
+    Zapisuje wersje zdjęcia w magazynie załączników i ustawia je jako aktualne zdjęcie zwierzęcia.
+    :param photo: Wynik render_photo().
+    :return: Id zdjęcia lub None, jeśli zwierzę ma już to zdjęcie.
+    :raises LookupError: Zwierzę nie istnieje.
+    """
+    try:
+        with connection.cursor() as cursor:
+            # Blokada wiersza - równoległe usunięcie zwierzęcia poczeka na koniec zapisu
+            cursor.execute("SELECT id FROM animals WHERE id = %s FOR UPDATE", (animal_id,))
+            if cursor.fetchone() is None:
+                raise LookupError(f"nie znaleziono zwierzęcia o id {animal_id}")
+            cursor.execute("""
+                INSERT INTO animal_photos (animal_id, sha256, original_name)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (animal_id, sha256) DO NOTHING
+                RETURNING id
+            """, (animal_id, photo["sha256"], photo["original_name"]))
+            row = cursor.fetchone()
+            if row is None:
+                connection.rollback()
+                return None
+            photo_id = row[0]
+            for rendition in photo["renditions"]:
+                store_attachment(cursor, rendition)
+                cursor.execute("""
+                    INSERT INTO animal_photo_renditions (photo_id, rendition, sha256, width, height)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (photo_id, rendition["rendition"], rendition["sha256"], rendition["width"], rendition["height"]))
+            cursor.execute("UPDATE animals SET photo_id = %s WHERE id = %s", (photo_id, animal_id))
+        connection.commit()
+        return photo_id
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def add_animal_photo(animal_id, path):
+    """
+    Dodaje zdjęcie zwierzęcia wybrane w oknie (wersje generowane w puli procesów).
+    :return: Id zdjęcia lub None, jeśli zwierzę ma już to zdjęcie.
+    """
+    work_dir = tempfile.mkdtemp(prefix="vetbase_photo_")
+    try:
+        photo = get_photo_pool().submit(render_photo, path, work_dir).result()
+        with pooled_connection() as connection:
+            return save_photo(connection, animal_id, photo)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _known_photo_hashes(connection):
+    """Skróty zdjęć zapisanych już w bazie, per zwierzę."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT animal_id, sha256 FROM animal_photos")
+        known = {}
+        for animal_id, sha256 in cursor.fetchall():
+            known.setdefault(animal_id, set()).add(sha256)
+    connection.commit()
+    return known
+
+
+def _external_ids(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT external_id, id FROM animals WHERE external_id IS NOT NULL")
+        mapping = dict(cursor.fetchall())
+    connection.commit()
+    return mapping
+
+
+def iter_photo_files(directory, by_external_id=False, external_ids=None):
+    """
+    Zwraca pary (id zwierzęcia lub None, ścieżka) dla zdjęć w katalogu (z podkatalogami).
+    Nazwa pliku bez rozszerzenia to id zwierzęcia albo - z by_external_id - jego external_id.
+    """
+    for root, _, files in os.walk(directory):
+        for file_name in sorted(files):
+            stem, extension = os.path.splitext(file_name)
+            if extension.lower() not in PHOTO_EXTENSIONS:
+                continue
+            if by_external_id:
+                animal_id = external_ids.get(stem)
+            else:
+                animal_id = int(stem) if stem.isdigit() else None
+            yield animal_id, os.path.join(root, file_name)
+
+
+def import_photos(items, workers=None, progress=None):
+    """
+    Importuje zdjęcia: wersje powstają równolegle w puli procesów, a gotowe są od razu zapisywane.
+    W pamięci są naraz najwyżej wyniki zleconych zadań (dwa na proces), niezależnie od liczby zdjęć.
+    :param items: Pary (id zwierzęcia lub None, ścieżka).
+    :param progress: Funkcja wywoływana ze słownikiem liczników co PROGRESS_EVERY zdjęć.
+    :return: Słownik liczników: read, imported, skipped, rejected, elapsed.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = {"read": 0, "imported": 0, "skipped": 0, "rejected": 0, "elapsed": 0.0}
+    started = time.monotonic()
+    work_dir = tempfile.mkdtemp(prefix="vetbase_photos_")
+
+    def reject(path, reason):
+        stats["rejected"] += 1
+        print(f"Odrzucono {path}: {reason}")
+
+    try:
+        with pooled_connection() as connection:
+            known = _known_photo_hashes(connection)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                pending = {}
+                items = iter(items)
+                exhausted = False
+                while pending or not exhausted:
+                    # Zlecamy kolejne zdjęcia tylko do wypełnienia okna zadań
+                    while not exhausted and len(pending) < workers * 2:
+                        item = next(items, None)
+                        if item is None:
+                            exhausted = True
+                            break
+                        animal_id, path = item
+                        stats["read"] += 1
+                        if animal_id is None:
+                            reject(path, "nazwa pliku nie wskazuje zwierzęcia")
+                            continue
+                        future = pool.submit(render_photo, path, work_dir, frozenset(known.get(animal_id, ())))
+                        pending[future] = (animal_id, path)
+                    if not pending:
+                        continue
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        animal_id, path = pending.pop(future)
+                        photo = None
+                        try:
+                            photo = future.result()
+                            if photo is None or save_photo(connection, animal_id, photo) is None:
+                                stats["skipped"] += 1
+                            else:
+                                stats["imported"] += 1
+                                known.setdefault(animal_id, set()).add(photo["sha256"])
+                        except (ValueError, OSError, LookupError) as e:
+                            reject(path, e)
+                        finally:
+                            if photo is not None:
+                                for rendition in photo["renditions"]:
+                                    os.unlink(rendition["path"])
+                        processed = stats["imported"] + stats["skipped"] + stats["rejected"]
+                        if progress is not None and processed % PROGRESS_EVERY == 0:
+                            stats["elapsed"] = time.monotonic() - started
+                            progress(stats)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    stats["elapsed"] = time.monotonic() - started
+    return stats
+
+
+def _print_progress(stats):
+    rate = stats["read"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+    print(f"Przetworzono {stats['read']} zdjęć ({rate:,.1f}/s), zaimportowano {stats['imported']}, "
+          f"pominięto {stats['skipped']}, odrzucono {stats['rejected']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import zdjęć zwierząt do bazy VetBase.")
+    parser.add_argument("directory", help="katalog ze zdjęciami (nazwa pliku to id zwierzęcia)")
+    parser.add_argument("--external-id", action="store_true",
+                        help="nazwy plików to external_id zwierząt (z importu masowego)")
+    parser.add_argument("--workers", type=int, help="liczba procesów (domyślnie liczba rdzeni)")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"Nie znaleziono katalogu: {args.directory}")
+        return 1
+    try:
+        external_ids = None
+        if args.external_id:
+            with pooled_connection() as connection:
+                external_ids = _external_ids(connection)
+        files = iter_photo_files(args.directory, args.external_id, external_ids)
+        stats = import_photos(files, args.workers, _print_progress)
+    except DatabaseUnavailableError:
+        print("Brak połączenia z bazą danych.")
+        return 1
+    except psycopg2.Error as e:
+        print(f"Błąd podczas importu zdjęć (zapisane zdjęcia pozostają w bazie): {e}")
+        return 1
+    finally:
+        close_pool()
+
+    _print_progress(stats)
+    print(f"Zakończono w {stats['elapsed']:.1f} s.")
+    return 0 if stats["rejected"] == 0 else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+import itertools
+import re
+from collections import OrderedDict
+
+PREPARED_CACHE_SIZE = 64  # Maksymalna liczba przygotowanych zapytań na połączenie
+
+_PLACEHOLDER = re.compile(r"%(s|%)")
+
+
+def to_server_placeholders(query):
+    """
+    Zamienia znaczniki psycopg2 (%s) na znaczniki serwera ($1, $2, ...).
+    :return: Krotka (zapytanie dla PREPARE, liczba parametrów).
+    """
+    counter = itertools.count(1)
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(1) == "%":
+            return "%"
+        count = next(counter)
+        return f"${count}"
+
+    return _PLACEHOLDER.sub(replace, query), count
+
+
+class PreparedStatementCache:
+    """
+    Pamięć podręczna zapytań przygotowanych (PREPARE) dla jednego połączenia.
+    Najdawniej używane zapytania są zwalniane (DEALLOCATE) po przekroczeniu limitu.
+    """
+
+    def __init__(self, max_size=PREPARED_CACHE_SIZE):
+        self.max_size = max_size
+        self._statements = OrderedDict()  # tekst zapytania -> (nazwa, liczba parametrów)
+        self._names = itertools.count(1)
+
+    def __len__(self):
+        return len(self._statements)
+
+    def _prepare(self, cursor, query):
+        """Przygotowuje zapytanie na serwerze i zapamiętuje jego nazwę."""
+        while len(self._statements) >= self.max_size:
+            _, (old_name, _) = self._statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {old_name}")
+
+        name = f"vetbase_stmt_{next(self._names)}"
+        server_query, param_count = to_server_placeholders(query)
+        cursor.execute(f"PREPARE {name} AS {server_query}")
+        self._statements[query] = (name, param_count)
+        return name, param_count
+
+    def execute(self, cursor, query, params=()):
+        """Wykonuje zapytanie po nazwie, przygotowując je przy pierwszym użyciu."""
+        entry = self._statements.get(query)
+        if entry is None:
+            name, param_count = self._prepare(cursor, query)
+        else:
+            self._statements.move_to_end(query)
+            name, param_count = entry
+
+        params = tuple(params or ())
+        if len(params) != param_count:
+            raise ValueError(
+                f"Zapytanie oczekuje {param_count} parametrów, przekazano {len(params)}."
+            )
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def clear(self):
+        """Zapomina wszystkie zapytania (np. po DISCARD ALL lub zerwaniu połączenia)."""
+        self._statements.clear()
+
+
+def execute_prepared(cursor, query, params=()):
+    """
+    Wykonuje zapytanie jako przygotowane w połączeniu kursora.
+    Połączenia spoza puli (bez pamięci podręcznej) wykonują je zwyczajnie.
+    """
+    cache = getattr(cursor.connection, "prepared_statements", None)
+    if cache is None:
+        cursor.execute(query, params)
+    else:
+        cache.execute(cursor, query, params)
@@ -0,0 +1,166 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+QUERY_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Górny limit (szacunkowego) rozmiaru zapamiętanych wyników
+QUERY_CACHE_TTL = 30                      # Domyślny czas ważności wyniku w sekundach
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """Ujednolica tekst zapytania (białe znaki), żeby to samo zapytanie dawało ten sam klucz."""
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def estimate_size(rows):
+    """Szacuje rozmiar wyniku zapytania w bajtach (lista krotek wartości skalarnych)."""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+
+class QueryCache:
+    """
+    Pamięć podręczna wyników zapytań odczytu, z kluczem (znormalizowane zapytanie, parametry).
+    Każdy wynik ma własny czas ważności i znaczniki tabel, z których pochodzi -
+    zmiana tabeli usuwa wszystkie zależne od niej wyniki. Po przekroczeniu limitu
+    rozmiaru usuwane są najdawniej używane wyniki.
+    """
+
+    def __init__(self, max_bytes=QUERY_CACHE_MAX_BYTES, default_ttl=QUERY_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # klucz -> (wynik, rozmiar, termin ważności, znaczniki)
+        self._tags = {}                # tabela -> klucze zależnych wyników
+        self._versions = {}            # tabela -> numer unieważnienia (wynik sprzed unieważnienia nie trafia do pamięci)
+        self._generation = 0           # Numer czyszczenia całej pamięci
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query, params=()):
+        """Klucz wyniku; parametry są porównywane po reprezentacji (listy, daty itp.)."""
+        return normalize_query(query), repr(tuple(params))
+
+    def get(self, key):
+        """Zwraca zapamiętany wynik lub None (brak albo wygasły)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() > entry[2]:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def versions(self, tags):
+        """Numery unieważnień znaczników - do przekazania do put() razem z wynikiem."""
+        with self._lock:
+            return self._current_versions(tags)
+
+    def put(self, key, rows, tags, ttl=None, versions=None):
+        """
+        Zapamiętuje wynik zapytania.
+        :param tags: Tabele, od których zależy wynik.
+        :param ttl: Czas ważności w sekundach (domyślnie default_ttl).
+        :param versions: Wartość versions(tags) sprzed zapytania.
+        """
+        rows = tuple(rows)
+        size = estimate_size(rows)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if versions is not None and versions != self._current_versions(tags):
+                return
+            if key in self._entries:
+                self._remove(key)
+            expires = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+            self._entries[key] = (rows, size, expires, tuple(tags))
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        """Usuwa wyniki zależne od podanych tabel (bez argumentów - wszystkie)."""
+        with self._lock:
+            if not tags:
+                self._generation += 1
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._tags.clear()
+                self._bytes = 0
+                return
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def stats(self):
+        """Zwraca liczniki pamięci podręcznej (rozmiar, trafienia, chybienia, usunięcia)."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _current_versions(self, tags):
+        return self._generation, tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def _remove(self, key):
+        rows, size, _, tags = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+_cache = QueryCache()
+
+
+def get_query_cache():
+    """Zwraca współdzieloną pamięć podręczną wyników zapytań."""
+    return _cache
+
+
+def fetch_cached(query, params, tags, fetch, ttl=None):
+    """
+    Zwraca wynik zapytania z pamięci podręcznej albo pobiera go funkcją `fetch()` i zapamiętuje.
+    Wyjątki `fetch` są przekazywane do wywołującego (błędy nie trafiają do pamięci).
+    :param tags: Tabele, od których zależy wynik.
+    :return: Lista wierszy (kopia - można ją modyfikować).
+    """
+    key = _cache.make_key(query, params)
+    rows = _cache.get(key)
+    if rows is None:
+        versions = _cache.versions(tags)
+        rows = fetch()
+        _cache.put(key, rows, tags, ttl, versions)
+    return list(rows)
@@ -0,0 +1,74 @@
+import threading
+
+from database.operations import get_all_locations, get_all_users, get_species
+
+# Zbiory danych słownikowych i funkcje, które je pobierają
+REFERENCE_LOADERS = {
+    "locations": get_all_locations,  # (id, nazwa, adres, telefon, e-mail)
+    "users": get_all_users,          # (id, login, rola, data utworzenia)
+    "species": get_species,          # Nazwy gatunków
+}
+
+# Tabela bazy -> zbiory danych, które unieważnia jej zmiana
+TABLE_DEPENDENCIES = {
+    "locations": ("locations",),
+    "users": ("users",),
+    "animals": ("species",),
+}
+
+
+class ReferenceDataCache:
+    """
+    Pamięć podręczna rzadko zmieniających się danych (lokalizacje, użytkownicy, gatunki).
+    Każdy zbiór jest pobierany raz i podawany z pamięci do wszystkich okien,
+    dopóki zmiana w bazie go nie unieważni.
+    """
+
+    def __init__(self, loaders=None):
+        self._loaders = loaders or REFERENCE_LOADERS
+        self._lock = threading.Lock()
+        self._data = {}
+        self._versions = {}  # Zbiór -> numer unieważnienia (wynik sprzed unieważnienia nie trafia do pamięci)
+
+    def get(self, name):
+        """
+        Zwraca zbiór danych, pobierając go z bazy tylko przy pierwszym użyciu.
+        Wyjątki bazy danych przekazywane są do wywołującego.
+        :return: Krotka wierszy (nie należy jej modyfikować).
+        """
+        with self._lock:
+            if name in self._data:
+                return self._data[name]
+            version = self._versions.get(name, 0)
+        # Zapytanie bez blokady - równoległe pierwsze odczyty pobiorą dane dwukrotnie, ale nie czekają na siebie
+        rows = tuple(self._loaders[name]())
+        with self._lock:
+            if self._versions.get(name, 0) == version:
+                self._data[name] = rows
+        return rows
+
+    def invalidate(self, *names):
+        """Unieważnia podane zbiory (bez argumentów - wszystkie)."""
+        with self._lock:
+            for name in names or tuple(self._loaders):
+                self._data.pop(name, None)
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def invalidate_table(self, table):
+        """Unieważnia zbiory zależne od zmienionej tabeli bazy."""
+        names = TABLE_DEPENDENCIES.get(table)
+        if names:
+            self.invalidate(*names)
+
+
+_cache = ReferenceDataCache()
+
+
+def get_reference_cache():
+    """Zwraca współdzieloną pamięć podręczną danych słownikowych."""
+    return _cache
+
+
+def get_reference_data(name):
+    """Zwraca zbiór danych słownikowych (z pamięci lub z bazy przy pierwszym użyciu)."""
+    return _cache.get(name)
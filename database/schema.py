@@ -0,0 +1,448 @@
+"""
+Wersjonowany schemat bazy VetBase: tabele i indeksy używane przez zapytania aplikacji.
+
+Uruchomienie:
+    python -m database.schema            # wykonuje brakujące migracje
+    python -m database.schema --status   # pokazuje stan migracji
+
+Każda migracja wykonywana jest w osobnej transakcji i zapisywana w tabeli
+schema_migrations, a polecenia używają IF NOT EXISTS - ponowne uruchomienie
+na aktualnej bazie niczego nie zmienia. Migracja z pg_trgm wymaga uprawnień
+do CREATE EXTENSION (lub wcześniej zainstalowanego rozszerzenia).
+"""
+import argparse
+
+import psycopg2
+
+from database.connection import pooled_connection, close_pool, DatabaseUnavailableError
+
+MIGRATION_LOCK_ID = 74_221_001  # Klucz blokady doradczej - chroni przed równoległym migrowaniem
+
+# Lista migracji: (wersja, opis, polecenia SQL). Nowe migracje dopisujemy na końcu.
+MIGRATIONS = [
+    (1, "Tabele podstawowe", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(100) NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            role VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS locations (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            address TEXT,
+            phone VARCHAR(50),
+            email VARCHAR(200)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS animals (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            species VARCHAR(100),
+            breed VARCHAR(100),
+            age VARCHAR(50),
+            owner_name VARCHAR(200),
+            owner_contact VARCHAR(100),
+            owner_email VARCHAR(200),
+            info TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS visits (
+            id SERIAL PRIMARY KEY,
+            animal_id INTEGER NOT NULL REFERENCES animals (id) ON DELETE CASCADE,
+            reservation_date TIMESTAMP,
+            visit_date TIMESTAMP NOT NULL,
+            registered_by VARCHAR(100),
+            description TEXT,
+            location_id INTEGER REFERENCES locations (id) ON DELETE SET NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS history (
+            id SERIAL PRIMARY KEY,
+            animal_id INTEGER NOT NULL REFERENCES animals (id) ON DELETE CASCADE,
+            visit_date TIMESTAMP NOT NULL,
+            registered_by VARCHAR(100),
+            description_reason TEXT,
+            medication TEXT,
+            indications TEXT,
+            payment NUMERIC(10, 2),
+            location_id INTEGER REFERENCES locations (id) ON DELETE SET NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS history_attachments (
+            id SERIAL PRIMARY KEY,
+            history_id INTEGER NOT NULL REFERENCES history (id) ON DELETE CASCADE,
+            file_path TEXT NOT NULL
+        )
+        """,
+    ]),
+    (2, "Indeksy trigramowe dla wyszukiwania ILIKE '%...%'", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS animals_name_trgm_idx ON animals USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS animals_owner_name_trgm_idx ON animals USING gin (owner_name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS animals_breed_trgm_idx ON animals USING gin (breed gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS history_medication_trgm_idx ON history USING gin (medication gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS history_registered_by_trgm_idx ON history USING gin (registered_by gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS history_description_reason_trgm_idx ON history USING gin (description_reason gin_trgm_ops)",
+    ]),
+    (3, "Indeksy kluczy obcych, dat i agregatów raportów", [
+        # Złączenia i usuwanie kaskadowe
+        "CREATE INDEX IF NOT EXISTS history_animal_id_idx ON history (animal_id)",
+        "CREATE INDEX IF NOT EXISTS visits_animal_id_idx ON visits (animal_id)",
+        "CREATE INDEX IF NOT EXISTS visits_location_id_idx ON visits (location_id)",
+        "CREATE INDEX IF NOT EXISTS history_attachments_history_id_idx ON history_attachments (history_id)",
+        # Zakresy dat (grafik, przypomnienia) i stronicowanie historii po (visit_date, id)
+        "CREATE INDEX IF NOT EXISTS visits_visit_date_idx ON visits (visit_date)",
+        "CREATE INDEX IF NOT EXISTS history_visit_date_id_idx ON history (visit_date, id) INCLUDE (animal_id, payment)",
+        # Raporty i zestawienia filtrowane po lokalizacji - skan samego indeksu
+        """
+        CREATE INDEX IF NOT EXISTS history_location_visit_date_idx
+            ON history (location_id, visit_date) INCLUDE (animal_id, payment, medication)
+        """,
+        "ANALYZE animals",
+        "ANALYZE visits",
+        "ANALYZE history",
+    ]),
+    (4, "Tabele zbiorcze raportów aktualizowane wyzwalaczami", [
+        # Wiersze bez lokalizacji/leku zapisujemy jako 0/'' - kolumny klucza nie mogą być NULL
+        """
+        CREATE TABLE IF NOT EXISTS history_rollup (
+            location_id INTEGER NOT NULL,
+            month DATE NOT NULL,
+            medication TEXT NOT NULL,
+            visit_count BIGINT NOT NULL,
+            payment_total NUMERIC(14, 2) NOT NULL,
+            PRIMARY KEY (location_id, month, medication)
+        )
+        """,
+        # Liczniki odwołań zwierząt - COUNT(DISTINCT animal_id) nie da się sumować
+        """
+        CREATE TABLE IF NOT EXISTS history_rollup_month_animals (
+            location_id INTEGER NOT NULL,
+            month DATE NOT NULL,
+            animal_id INTEGER NOT NULL,
+            visit_count BIGINT NOT NULL,
+            PRIMARY KEY (location_id, month, animal_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS history_rollup_medication_animals (
+            location_id INTEGER NOT NULL,
+            medication TEXT NOT NULL,
+            animal_id INTEGER NOT NULL,
+            visit_count BIGINT NOT NULL,
+            PRIMARY KEY (location_id, medication, animal_id)
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION history_rollup_add(
+            p_location_id INTEGER, p_visit_date TIMESTAMP, p_medication TEXT,
+            p_animal_id INTEGER, p_payment NUMERIC, p_sign INTEGER
+        ) RETURNS void AS $$
+        DECLARE
+            v_location_id INTEGER := COALESCE(p_location_id, 0);
+            v_month DATE := date_trunc('month', p_visit_date)::date;
+            v_medication TEXT := COALESCE(p_medication, '');
+        BEGIN
+            INSERT INTO history_rollup AS r (location_id, month, medication, visit_count, payment_total)
+            VALUES (v_location_id, v_month, v_medication, p_sign, p_sign * COALESCE(p_payment, 0))
+            ON CONFLICT (location_id, month, medication) DO UPDATE
+                SET visit_count = r.visit_count + EXCLUDED.visit_count,
+                    payment_total = r.payment_total + EXCLUDED.payment_total;
+            DELETE FROM history_rollup
+            WHERE location_id = v_location_id AND month = v_month
+              AND medication = v_medication AND visit_count = 0;
+
+            INSERT INTO history_rollup_month_animals AS r (location_id, month, animal_id, visit_count)
+            VALUES (v_location_id, v_month, p_animal_id, p_sign)
+            ON CONFLICT (location_id, month, animal_id) DO UPDATE
+                SET visit_count = r.visit_count + EXCLUDED.visit_count;
+            DELETE FROM history_rollup_month_animals
+            WHERE location_id = v_location_id AND month = v_month
+              AND animal_id = p_animal_id AND visit_count = 0;
+
+            INSERT INTO history_rollup_medication_animals AS r (location_id, medication, animal_id, visit_count)
+            VALUES (v_location_id, v_medication, p_animal_id, p_sign)
+            ON CONFLICT (location_id, medication, animal_id) DO UPDATE
+                SET visit_count = r.visit_count + EXCLUDED.visit_count;
+            DELETE FROM history_rollup_medication_animals
+            WHERE location_id = v_location_id AND medication = v_medication
+              AND animal_id = p_animal_id AND visit_count = 0;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION history_rollup_trigger() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM history_rollup_add(OLD.location_id, OLD.visit_date, OLD.medication,
+                                           OLD.animal_id, OLD.payment, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM history_rollup_add(NEW.location_id, NEW.visit_date, NEW.medication,
+                                           NEW.animal_id, NEW.payment, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION history_rollup_rebuild() RETURNS void AS $$
+        BEGIN
+            TRUNCATE history_rollup, history_rollup_month_animals, history_rollup_medication_animals;
+            INSERT INTO history_rollup (location_id, month, medication, visit_count, payment_total)
+            SELECT COALESCE(location_id, 0), date_trunc('month', visit_date)::date, COALESCE(medication, ''),
+                   COUNT(*), COALESCE(SUM(payment), 0)
+            FROM history
+            GROUP BY 1, 2, 3;
+            INSERT INTO history_rollup_month_animals (location_id, month, animal_id, visit_count)
+            SELECT COALESCE(location_id, 0), date_trunc('month', visit_date)::date, animal_id, COUNT(*)
+            FROM history
+            GROUP BY 1, 2, 3;
+            INSERT INTO history_rollup_medication_animals (location_id, medication, animal_id, visit_count)
+            SELECT COALESCE(location_id, 0), COALESCE(medication, ''), animal_id, COUNT(*)
+            FROM history
+            GROUP BY 1, 2, 3;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS history_rollup_row ON history",
+        """
+        CREATE TRIGGER history_rollup_row
+            AFTER INSERT OR DELETE OR UPDATE OF location_id, visit_date, medication, animal_id, payment
+            ON history
+            FOR EACH ROW EXECUTE FUNCTION history_rollup_trigger()
+        """,
+        """
+        CREATE OR REPLACE FUNCTION history_rollup_truncate() RETURNS trigger AS $$
+        BEGIN
+            TRUNCATE history_rollup, history_rollup_month_animals, history_rollup_medication_animals;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS history_rollup_truncate ON history",
+        """
+        CREATE TRIGGER history_rollup_truncate
+            AFTER TRUNCATE ON history
+            FOR EACH STATEMENT EXECUTE FUNCTION history_rollup_truncate()
+        """,
+        # Zapis do history czeka na koniec wypełniania, żeby żadna zmiana nie została pominięta
+        "LOCK TABLE history IN SHARE ROW EXCLUSIVE MODE",
+        "SELECT history_rollup_rebuild()",
+        "ANALYZE history_rollup",
+        "ANALYZE history_rollup_month_animals",
+        "ANALYZE history_rollup_medication_animals",
+    ]),
+    (5, "Znacznik czasu zmiany zwierzęcia (odświeżanie indeksu wyszukiwania)", [
+        "ALTER TABLE animals ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now()",
+        """
+        CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS animals_set_updated_at ON animals",
+        """
+        CREATE TRIGGER animals_set_updated_at
+            BEFORE UPDATE ON animals
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at()
+        """,
+        "CREATE INDEX IF NOT EXISTS animals_updated_at_idx ON animals (updated_at)",
+    ]),
+    (6, "Powiadomienia NOTIFY o zmianach w tabelach", [
+        # Treść zdarzenia: "tabela:operacja:id" (operacja I/U/D, T - TRUNCATE bez id)
+        """
+        CREATE OR REPLACE FUNCTION notify_change() RETURNS trigger AS $$
+        DECLARE
+            v_id INTEGER;
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                PERFORM pg_notify('vetbase_changes', TG_TABLE_NAME || ':T:');
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'DELETE' THEN
+                v_id := OLD.id;
+            ELSE
+                v_id := NEW.id;
+            END IF;
+            PERFORM pg_notify('vetbase_changes', TG_TABLE_NAME || ':' || left(TG_OP, 1) || ':' || v_id);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        *[
+            statement
+            for table in ("animals", "visits", "history", "locations", "users")
+            for statement in (
+                f"DROP TRIGGER IF EXISTS {table}_notify_change ON {table}",
+                f"""
+                CREATE TRIGGER {table}_notify_change
+                    AFTER INSERT OR UPDATE OR DELETE ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION notify_change()
+                """,
+                f"DROP TRIGGER IF EXISTS {table}_notify_truncate ON {table}",
+                f"""
+                CREATE TRIGGER {table}_notify_truncate
+                    AFTER TRUNCATE ON {table}
+                    FOR EACH STATEMENT EXECUTE FUNCTION notify_change()
+                """,
+            )
+        ],
+    ]),
+    (7, "Identyfikatory z systemów zewnętrznych (import masowy)", [
+        # Ponowny import tego samego pliku aktualizuje wiersze zamiast je dublować
+        "ALTER TABLE animals ADD COLUMN IF NOT EXISTS external_id VARCHAR(100)",
+        "ALTER TABLE history ADD COLUMN IF NOT EXISTS external_id VARCHAR(100)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS animals_external_id_key ON animals (external_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS history_external_id_key ON history (external_id)",
+    ]),
+    (8, "Magazyn załączników adresowany skrótem SHA-256", [
+        # Jedna kopia treści na skrót - ten sam plik dołączony wielokrotnie zajmuje miejsce raz
+        """
+        CREATE TABLE IF NOT EXISTS attachment_blobs (
+            sha256 CHAR(64) PRIMARY KEY,
+            size BIGINT NOT NULL,
+            chunk_count INTEGER NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS attachment_chunks (
+            sha256 CHAR(64) NOT NULL REFERENCES attachment_blobs (sha256) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            data BYTEA NOT NULL,
+            PRIMARY KEY (sha256, seq)
+        )
+        """,
+        # PDF-y i zdjęcia są już skompresowane - TOAST bez ponownej kompresji
+        "ALTER TABLE attachment_chunks ALTER COLUMN data SET STORAGE EXTERNAL",
+        # Nowe wpisy nie zapisują lokalnej ścieżki klienta, tylko skrót treści i metadane
+        "ALTER TABLE history_attachments ALTER COLUMN file_path DROP NOT NULL",
+        "ALTER TABLE history_attachments ADD COLUMN IF NOT EXISTS sha256 CHAR(64) REFERENCES attachment_blobs (sha256)",
+        "ALTER TABLE history_attachments ADD COLUMN IF NOT EXISTS file_name TEXT",
+        "ALTER TABLE history_attachments ADD COLUMN IF NOT EXISTS content_type VARCHAR(200)",
+        "ALTER TABLE history_attachments ADD COLUMN IF NOT EXISTS size BIGINT",
+        "CREATE INDEX IF NOT EXISTS history_attachments_sha256_idx ON history_attachments (sha256)",
+    ]),
+    (9, "Zdjęcia zwierząt w wersjach o stałych rozmiarach", [
+        # sha256 - skrót oryginalnego pliku; ponowny import tego samego zdjęcia jest pomijany
+        """
+        CREATE TABLE IF NOT EXISTS animal_photos (
+            id SERIAL PRIMARY KEY,
+            animal_id INTEGER NOT NULL REFERENCES animals (id) ON DELETE CASCADE,
+            sha256 CHAR(64) NOT NULL,
+            original_name TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT now(),
+            UNIQUE (animal_id, sha256)
+        )
+        """,
+        # Treść wersji (miniatura, podgląd, pełna) w magazynie załączników
+        """
+        CREATE TABLE IF NOT EXISTS animal_photo_renditions (
+            photo_id INTEGER NOT NULL REFERENCES animal_photos (id) ON DELETE CASCADE,
+            rendition VARCHAR(20) NOT NULL,
+            sha256 CHAR(64) NOT NULL REFERENCES attachment_blobs (sha256),
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            PRIMARY KEY (photo_id, rendition)
+        )
+        """,
+        # Aktualne zdjęcie - jego zmiana jest zmianą wiersza zwierzęcia (powiadomienia, indeks wyszukiwania)
+        "ALTER TABLE animals ADD COLUMN IF NOT EXISTS photo_id INTEGER REFERENCES animal_photos (id) ON DELETE SET NULL",
+    ]),
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def applied_versions(cursor):
+    """Zwraca zbiór wersji migracji zapisanych w bazie."""
+    _ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(target=None):
+    """
+    Wykonuje brakujące migracje (do wersji `target` włącznie, domyślnie wszystkie).
+    :return: Lista wykonanych wersji.
+    """
+    applied = []
+    with pooled_connection() as connection:
+        for version, description, statements in MIGRATIONS:
+            if target is not None and version > target:
+                break
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+                # Sprawdzamy pod blokadą - inny proces mógł właśnie wykonać tę migrację
+                if version in applied_versions(cursor):
+                    connection.rollback()
+                    continue
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+            connection.commit()
+            applied.append(version)
+            print(f"Wykonano migrację {version}: {description}")
+    return applied
+
+
+def status():
+    """Zwraca listę (wersja, opis, data wykonania lub None) dla wszystkich migracji."""
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            _ensure_migrations_table(cursor)
+            cursor.execute("SELECT version, applied_at FROM schema_migrations")
+            applied_at = dict(cursor.fetchall())
+        connection.commit()
+    return [(version, description, applied_at.get(version)) for version, description, _ in MIGRATIONS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migracje schematu bazy VetBase.")
+    parser.add_argument("--status", action="store_true", help="pokaż stan migracji i zakończ")
+    parser.add_argument("--target", type=int, help="migruj tylko do podanej wersji")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.status:
+            for version, description, applied_at in status():
+                state = f"wykonana {applied_at:%Y-%m-%d %H:%M}" if applied_at else "oczekuje"
+                print(f"{version:>4}  {state:<24} {description}")
+        elif not migrate(args.target):
+            print("Schemat jest aktualny.")
+    except DatabaseUnavailableError:
+        print("Brak połączenia z bazą danych.")
+        return 1
+    except psycopg2.Error as e:
+        print(f"Błąd podczas migracji schematu: {e}")
+        return 1
+    finally:
+        close_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,250 @@
+import heapq
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+
+from database.operations import get_animal_index_rows
+
+REFRESH_OVERLAP = timedelta(minutes=5)  # Zakładka odświeżania - zmiany z dłuższych transakcji
+SEARCH_LIMIT = 50                       # Domyślna liczba zwracanych wyników
+
+# Wagi pól: imię, właściciel, rasa, kontakt właściciela
+FIELD_WEIGHTS = (1.0, 0.8, 0.6, 0.5)
+
+_WORD = re.compile(r"\w+")
+_FOLD_EXTRA = str.maketrans({"ł": "l", "Ł": "l"})  # NFKD nie rozkłada litery ł
+
+
+def fold(text):
+    """Sprowadza tekst do postaci porównywalnej: małe litery, bez polskich znaków diakrytycznych."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text).translate(_FOLD_EXTRA).lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def trigrams(word):
+    """Trójki znaków słowa z dopełnieniem spacjami (jak w pg_trgm)."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _within_distance(a, b, max_distance):
+    """Sprawdza, czy odległość edycyjna słów (z przestawieniem sąsiednich liter) nie przekracza max_distance."""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i]
+        for j in range(1, len(b) + 1):
+            cost = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1]),
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        if min(current) > max_distance:
+            return False
+        before_previous, previous = previous, current
+    return previous[-1] <= max_distance
+
+
+class AnimalSearchIndex:
+    """
+    Indeks wyszukiwania zwierząt po imieniu, właścicielu, rasie i kontakcie.
+    Słownik słów wskazuje pozycje rekordów (zakodowane razem z numerem pola w tablicach `array`),
+    a trójki znaków wskazują słowa - dopasowanie ocenia się raz na słowo, nie na rekord.
+    Zmienione rekordy dopisywane są na końcu, a stare wersje oznaczane jako usunięte
+    i usuwane przy okresowym kompaktowaniu.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.watermark = None  # Czas serwera, od którego pobierać zmiany
+        self._clear()
+
+    def _clear(self):
+        self._rows = []            # (id, imię, właściciel, rasa, kontakt)
+        self._sort_keys = []       # Złożone imiona - kolejność przy równej ocenie
+        self._alive = bytearray()
+        self._positions = {}       # id -> pozycja aktualnej wersji rekordu
+        self._words = {}           # słowo -> array(pozycja * 4 + numer pola)
+        self._trigrams = {}        # trójka znaków -> lista słów
+        self._sorted_words = None  # Posortowane słowa (wyszukiwanie po prefiksie), budowane leniwie
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    @property
+    def loaded(self):
+        return self.watermark is not None
+
+    def load(self, rows, watermark):
+        """Buduje indeks od nowa z wierszy (id, imię, właściciel, rasa, kontakt)."""
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self._append(row)
+            self.watermark = watermark
+
+    def apply_changes(self, rows, existing_ids, watermark):
+        """
+        Uwzględnia zmienione wiersze i usuwa zwierzęta, których już nie ma w bazie.
+        :param existing_ids: Zbiór wszystkich id w bazie lub None (bez usuwania).
+        """
+        with self._lock:
+            for row in rows:
+                self._remove(row[0])
+                self._append(row)
+            if existing_ids is not None:
+                for animal_id in set(self._positions) - existing_ids:
+                    self._remove(animal_id)
+            self.watermark = watermark
+            if self._dead > max(256, len(self._positions) // 4):
+                self._compact()
+
+    def _append(self, row):
+        row = tuple(row)
+        position = len(self._rows)
+        self._rows.append(row)
+        self._sort_keys.append(fold(row[1]))
+        self._alive.append(1)
+        self._positions[row[0]] = position
+
+        for field, value in enumerate(row[1:]):
+            for word in set(_WORD.findall(fold(value))):
+                postings = self._words.get(word)
+                if postings is None:
+                    postings = self._words[word] = array("I")
+                    for trigram in trigrams(word):
+                        self._trigrams.setdefault(trigram, []).append(word)
+                    self._sorted_words = None
+                postings.append(position * 4 + field)
+
+    def _remove(self, animal_id):
+        position = self._positions.pop(animal_id, None)
+        if position is not None:
+            self._alive[position] = 0
+            self._dead += 1
+
+    def _compact(self):
+        """Przebudowuje indeks bez usuniętych wersji rekordów i nieużywanych słów."""
+        alive_rows = [row for position, row in enumerate(self._rows) if self._alive[position]]
+        watermark = self.watermark
+        self._clear()
+        for row in alive_rows:
+            self._append(row)
+        self.watermark = watermark
+
+    def _matching_words(self, term):
+        """Słowa pasujące do słowa zapytania wraz z oceną dopasowania."""
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self._words)
+        matches = {}
+        index = bisect_left(self._sorted_words, term)
+        while index < len(self._sorted_words) and self._sorted_words[index].startswith(term):
+            word = self._sorted_words[index]
+            matches[word] = 1.0 if word == term else 0.9
+            index += 1
+
+        if len(term) >= 3:
+            # Numerów (telefon) nie poprawiamy - szukamy tylko fragmentu
+            max_distance = 0 if term.isdigit() else (1 if len(term) <= 5 else 2)
+            term_trigrams = trigrams(term)
+            # Każda edycja psuje najwyżej trzy trójki; fragment słowa zachowuje wszystkie poza brzegowymi
+            required = max(1, len(term_trigrams) - max(3, 3 * max_distance))
+            hits = {}
+            for trigram in term_trigrams:
+                for word in self._trigrams.get(trigram, ()):
+                    hits[word] = hits.get(word, 0) + 1
+            for word, count in hits.items():
+                if count < required or word in matches:
+                    continue
+                if term in word:
+                    matches[word] = 0.7
+                elif max_distance and _within_distance(term, word, max_distance):
+                    matches[word] = 0.5  # Literówka
+        return matches
+
+    def _term_scores(self, term):
+        """Najlepsza ocena słowa zapytania dla każdego pasującego rekordu."""
+        scores = {}
+        for word, word_score in self._matching_words(term).items():
+            for encoded in self._words[word]:
+                position, field = divmod(encoded, 4)
+                score = word_score * FIELD_WEIGHTS[field]
+                if score > scores.get(position, 0.0):
+                    scores[position] = score
+        return scores
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        Wyszukuje zwierzęta; każde słowo zapytania musi pasować do któregoś pola.
+        Wyniki sortowane są od najlepszego dopasowania.
+        :return: Lista krotek (id, imię, właściciel, rasa).
+        """
+        terms = _WORD.findall(fold(query))
+        with self._lock:
+            if not terms:
+                return self.all_rows()[:limit]
+
+            totals = None
+            for term in terms:
+                scores = self._term_scores(term)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {
+                        position: total + scores[position]
+                        for position, total in totals.items() if position in scores
+                    }
+                if not totals:
+                    return []
+
+            best = heapq.nsmallest(
+                limit,
+                (
+                    (-total, self._sort_keys[position], position)
+                    for position, total in totals.items() if self._alive[position]
+                ),
+            )
+            return [self._rows[position][:4] for _, _, position in best]
+
+    def all_rows(self):
+        """Wszystkie zwierzęta (id, imię, właściciel, rasa) w kolejności imion."""
+        with self._lock:
+            positions = [position for position in range(len(self._rows)) if self._alive[position]]
+            positions.sort(key=self._sort_keys.__getitem__)
+            return [self._rows[position][:4] for position in positions]
+
+
+_index = AnimalSearchIndex()
+_refresh_lock = threading.Lock()
+
+
+def get_animal_search_index():
+    """Zwraca współdzielony indeks wyszukiwania zwierząt (może być jeszcze niezaładowany)."""
+    return _index
+
+
+def refresh_animal_search_index():
+    """
+    Buduje indeks przy pierwszym wywołaniu w sesji, a później dociąga tylko zmienione zwierzęta.
+    Wyjątki bazy danych przekazywane są do wywołującego.
+    :return: Współdzielony indeks.
+    """
+    with _refresh_lock:
+        if not _index.loaded:
+            server_time, rows, _ = get_animal_index_rows()
+            _index.load(rows, server_time - REFRESH_OVERLAP)
+        else:
+            server_time, rows, existing_ids = get_animal_index_rows(_index.watermark)
+            _index.apply_changes(rows, existing_ids, server_time - REFRESH_OVERLAP)
+    return _index
@@ -0,0 +1,38 @@
+import itertools
+
+from database.connection import pooled_connection
+
+STREAM_ITERSIZE = 500  # Liczba wierszy pobieranych z kursora serwera w jednej paczce
+
+_cursor_names = itertools.count(1)
+
+
+def iter_batches(query, params=(), batch_size=STREAM_ITERSIZE, cancel_token=None):
+    """
+    Wykonuje zapytanie na nazwanym kursorze serwera i zwraca wyniki paczkami.
+    W pamięci klienta znajduje się naraz najwyżej jedna paczka wierszy;
+    połączenie wraca do puli po wyczerpaniu lub zamknięciu generatora.
+    :param batch_size: Liczba wierszy w paczce (itersize kursora).
+    :param cancel_token: CancellationToken pozwalający przerwać zapytanie z innego wątku.
+    :return: Generator list krotek.
+    """
+    with pooled_connection() as connection:
+        if cancel_token is not None:
+            cancel_token.attach(connection)
+        try:
+            # Kursor nazwany istnieje tylko w transakcji - wycofuje ją zwrot połączenia do puli
+            with connection.cursor(name=f"vetbase_stream_{next(_cursor_names)}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows or (cancel_token is not None and cancel_token.cancelled):
+                        break
+                    yield rows
+        finally:
+            if cancel_token is not None:
+                cancel_token.detach()
+                if cancel_token.cancelled:
+                    # Spóźnione żądanie przerwania mogłoby trafić w kolejne zapytanie
+                    # na tym połączeniu - zamknięte połączenie pula odrzuca
+                    connection.close()
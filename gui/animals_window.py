@@ -1,11 +1,42 @@
+import os
+
 from PyQt6.QtWidgets import (
-    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QTableWidget,
-    QTableWidgetItem, QLabel, QDialog, QLineEdit, QMessageBox, QMainWindow, QHeaderView
+    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QTableView,
+    QLabel, QDialog, QLineEdit, QMessageBox, QMainWindow, QHeaderView, QCompleter, QFileDialog
 )
-from PyQt6.QtGui import QPixmap
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon, QGuiApplication
-from database.connection import get_connection
+from database.connection import pooled_connection, DatabaseUnavailableError
+from database.operations import get_all_animals, get_animal, ANIMAL_PHOTO_SELECT
+from database.photos import add_animal_photo
+from database.identity_map import get_identity_map
+from database.query_cache import get_query_cache
+from database.reference_cache import get_reference_cache, get_reference_data
+from gui.query_executor import get_query_executor
+from gui.table_model import ColumnarTableModel
+from gui.thumbnail_cache import get_thumbnail_cache
+from gui.change_notifier import LiveTableUpdater
+
+PREFETCH_ROWS = 2  # Ile wierszy nad i pod zaznaczeniem ma gotowe miniatury zdjęć
+PHOTO_COLUMN = 9   # Ukryta kolumna modelu ze skrótem podglądu zdjęcia (za kolumnami z nagłówkami)
+PHOTO_FILTER = "Zdjęcia (*.jpg *.jpeg *.png *.bmp *.webp *.heic)"
+
+
+def add_photo_and_fetch_row(animal_id, path):
+    """Zapisuje zdjęcie zwierzęcia i zwraca jego odświeżony wiersz tabeli (wykonywane w tle)."""
+    add_animal_photo(animal_id, path)
+    return get_all_animals([animal_id])
+
+
+def species_completer(parent):
+    """Podpowiedzi gatunków z pamięci podręcznej danych słownikowych (None bez połączenia z bazą)."""
+    try:
+        species = get_reference_data("species")
+    except DatabaseUnavailableError:
+        return None
+    completer = QCompleter(list(species), parent)
+    completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+    return completer
 
 
 class AnimalsWindow(QMainWindow):
@@ -49,11 +80,11 @@ class AnimalsWindow(QMainWindow):
         self.main_layout.addLayout(self.content_layout)
 
         # Tabela
-        self.animals_table = QTableWidget()
-        self.animals_table.setColumnCount(9)
-        self.animals_table.setHorizontalHeaderLabels(["ID", "Imię", "Gatunek", "Rasa", "Wiek", "Właściciel", "Kontakt", "Mail", "Uwagi"])
+        self.animals_model = ColumnarTableModel(["ID", "Imię", "Gatunek", "Rasa", "Wiek", "Właściciel", "Kontakt", "Mail", "Uwagi"], parent=self, hidden_columns=1)
+        self.animals_table = QTableView()
+        self.animals_table.setModel(self.animals_model)
         self.style_table()
-        self.animals_table.cellClicked.connect(self.toggle_action_buttons)
+        self.animals_table.clicked.connect(self.toggle_action_buttons)
         self.content_layout.addWidget(self.animals_table)
 
         # Pole na zdjęcie
@@ -67,6 +98,11 @@ class AnimalsWindow(QMainWindow):
         self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.content_layout.addWidget(self.image_label)
 
+        # Miniatury zdjęć dekodowane w tle i zapamiętywane
+        self.shown_image_path = None
+        self.thumbnails = get_thumbnail_cache()
+        self.thumbnails.ready.connect(self.on_thumbnail_ready)
+
         # Sygnały reagujące na zmianę zaznaczenia w tabeli
         self.animals_table.selectionModel().selectionChanged.connect(self.toggle_action_buttons)
         self.animals_table.selectionModel().selectionChanged.connect(self.update_image_from_selection)
@@ -74,6 +110,10 @@ class AnimalsWindow(QMainWindow):
         # Wczytaj dane zwierząt
         self.load_animals()
 
+        # Zmiany z innych stanowisk podmieniają tylko dotknięte wiersze tabeli
+        self.live_updater = LiveTableUpdater(self, self.animals_model, self.load_animals)
+        self.live_updater.watch("animals", get_all_animals)
+
     def style_table(self):
         """Stylizuje tabelę i dodaje funkcjonalność zaznaczania całych wierszy."""
         # Rozciąganie kolumn na całą szerokość tabeli
@@ -97,16 +137,16 @@ class AnimalsWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.animals_table.setAlternatingRowColors(True)
         self.animals_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -125,7 +165,7 @@ class AnimalsWindow(QMainWindow):
         self.animals_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.animals_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.animals_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.animals_table.verticalHeader().setVisible(False)
@@ -139,27 +179,12 @@ class AnimalsWindow(QMainWindow):
         self.move(x, y)
 
     def load_animals(self):
-        """Ładuje dane z tabeli animals do widżetu tabeli"""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
+        """Ładuje dane z tabeli animals do widżetu tabeli (w tle)"""
+        get_query_executor().submit(self, "animals", get_all_animals, on_result=self.populate_table)
 
-        cursor = connection.cursor()
-        cursor.execute("""
-            SELECT id, name, species, breed, age, owner_name, owner_contact, owner_email, info
-            FROM animals
-        """)
-        results = cursor.fetchall()
-
-        self.animals_table.setRowCount(0)
-        for row_number, row_data in enumerate(results):
-            self.animals_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.animals_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
-
-        cursor.close()
-        connection.close()
+    def populate_table(self, results):
+        """Wypełnia tabelę danymi zwierząt"""
+        self.animals_model.set_rows(results)
 
     def toggle_action_buttons(self):
         """Aktywuje przyciski akcji po zaznaczeniu wiersza"""
@@ -174,8 +199,14 @@ class AnimalsWindow(QMainWindow):
     def open_add_animal_dialog(self):
         """Otwiera okno dialogowe do dodania zwierzęcia"""
         dialog = AddAnimalDialog(self)
-        dialog.exec()
-        self.load_animals()
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            # Dialog zwraca zapisany wiersz - dopisujemy go bez przeładowania tabeli
+            self.animals_model.patch_rows((), [dialog.saved_row])
+            get_identity_map().invalidate("animals", [dialog.saved_row[0]])
+            get_query_cache().invalidate("animals")
+            get_reference_cache().invalidate("species")
+            if dialog.photo_path:
+                self.upload_photo(dialog.saved_row[0], dialog.photo_path)
 
     def edit_animal(self):
         """Edytuje zaznaczone zwierzę"""
@@ -185,12 +216,33 @@ class AnimalsWindow(QMainWindow):
             return
 
         selected_row = selected_rows[0]
-        animal_id = self.animals_table.item(selected_row.row(), 0).text()
+        animal_id = self.animals_model.value(selected_row.row(), 0)
 
         # Otwieramy dialog edycji
         dialog = EditAnimalDialog(self, animal_id)
-        dialog.exec()
-        self.load_animals()
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            # Brak zwróconego wiersza oznacza, że zwierzę usunięto na innym stanowisku
+            self.animals_model.patch_rows([animal_id], [dialog.saved_row] if dialog.saved_row else [])
+            get_identity_map().invalidate("animals", [animal_id])
+            get_query_cache().invalidate("animals")
+            get_reference_cache().invalidate("species")
+            if dialog.saved_row and dialog.photo_path:
+                self.upload_photo(animal_id, dialog.photo_path)
+
+    def upload_photo(self, animal_id, path):
+        """Zapisuje wybrane zdjęcie w tle (generowanie wersji trwa chwilę) i odświeża wiersz zwierzęcia"""
+        get_query_executor().submit(
+            self, f"photo:{animal_id}", add_photo_and_fetch_row, animal_id, path,
+            on_result=lambda rows: self.on_photo_saved(animal_id, rows),
+            on_error=lambda error: QMessageBox.warning(self, "Błąd", f"Nie udało się zapisać zdjęcia: {error}")
+        )
+
+    def on_photo_saved(self, animal_id, rows):
+        """Podmienia wiersz zwierzęcia po zapisaniu zdjęcia"""
+        self.animals_model.patch_rows([animal_id], rows)
+        get_identity_map().invalidate("animals", [animal_id])
+        get_query_cache().invalidate("animals")
+        self.update_image_from_selection()
 
     def delete_animal(self):
         """Usuwa zaznaczone zwierzę"""
@@ -200,7 +252,8 @@ class AnimalsWindow(QMainWindow):
             return
 
         selected_row = selected_rows[0]
-        animal_name = self.animals_table.item(selected_row.row(), 1).text()
+        animal_id = self.animals_model.value(selected_row.row(), 0)
+        animal_name = self.animals_model.value(selected_row.row(), 1)
 
         confirm = QMessageBox.question(
             self,
@@ -211,19 +264,21 @@ class AnimalsWindow(QMainWindow):
 
         if confirm == QMessageBox.StandardButton.Yes:
             try:
-                connection = get_connection()
-                if not connection:
-                    QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-                    return
-
-                cursor = connection.cursor()
-                cursor.execute("DELETE FROM animals WHERE id = %s", (animal_id,))
-                connection.commit()
-                cursor.close()
-                connection.close()
-
-                QMessageBox.information(self, "Sukces", "Zwierzę zostało usunięte!")
-                self.load_animals()
+                with pooled_connection() as connection:
+                    with connection.cursor() as cursor:
+                        cursor.execute("DELETE FROM animals WHERE id = %s RETURNING id", (animal_id,))
+                        deleted = cursor.fetchone()
+                    connection.commit()
+
+                if deleted:
+                    QMessageBox.information(self, "Sukces", "Zwierzę zostało usunięte!")
+                else:
+                    QMessageBox.information(self, "Informacja", "Zwierzę zostało już wcześniej usunięte.")
+                self.animals_model.patch_rows([animal_id], [])
+                get_identity_map().invalidate("animals", [animal_id])
+                get_query_cache().invalidate("animals")
+            except DatabaseUnavailableError:
+                QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
             except Exception as e:
                 QMessageBox.critical(self, "Błąd", f"Wystąpił błąd podczas usuwania: {e}")
 
@@ -234,6 +289,7 @@ class AnimalsWindow(QMainWindow):
             row = selected_rows[0].row()
             self.display_image(row, 0)
         else:
+            self.shown_image_path = None
             self.image_label.setText("Brak zdjęcia")
             self.image_label.setStyleSheet("""
                 background-color: #f0f0f0;
@@ -242,20 +298,43 @@ class AnimalsWindow(QMainWindow):
             """)
 
     def display_image(self, row, column):
-        """Wyświetla zdjęcie dla zaznaczonego wiersza"""
-        selected_id = self.animals_table.item(row, 0).text()  # Pobieramy ID zwierzęcia
-        image_path = f"images/{selected_id}.jpg"  # Ścieżka do zdjęcia
-        pixmap = QPixmap(image_path)
+        """Wyświetla zdjęcie dla zaznaczonego wiersza (miniatura z pamięci albo wczytywana w tle)"""
+        photo = self.animals_model.value(row, PHOTO_COLUMN)  # Skrót podglądu zapisanego zdjęcia
+        if photo:
+            self.shown_image_path = photo
+            self.show_thumbnail(self.thumbnails.get_rendition(photo))
+        else:
+            # Zwierzęta bez zaimportowanego zdjęcia - plik images/<id>.jpg
+            selected_id = self.animals_model.value(row, 0)  # Pobieramy ID zwierzęcia
+            image_path = f"images/{selected_id}.jpg"  # Ścieżka do zdjęcia
+            self.shown_image_path = image_path
+            self.show_thumbnail(self.thumbnails.get(image_path))
+
+        # Sąsiednie wiersze będą zapewne oglądane zaraz po tym
+        first, last = max(0, row - PREFETCH_ROWS), min(self.animals_model.rowCount(), row + PREFETCH_ROWS + 1)
+        neighbours = [other for other in range(first, last) if other != row]
+        self.thumbnails.prefetch_renditions(
+            self.animals_model.value(other, PHOTO_COLUMN) for other in neighbours
+            if self.animals_model.value(other, PHOTO_COLUMN)
+        )
+        self.thumbnails.prefetch(
+            f"images/{self.animals_model.value(other, 0)}.jpg" for other in neighbours
+            if not self.animals_model.value(other, PHOTO_COLUMN)
+        )
 
-        if pixmap.isNull():
-            self.image_label.setText("Brak zdjęcia")            
-            self.image_label.setStyleSheet("""
-                background-color: #f0f0f0;
-                font-size: 14px;
-                color: #555555;
-            """)
+    def on_thumbnail_ready(self, image_key, pixmap):
+        """Pokazuje wczytaną w tle miniaturę, jeśli wiersz jest nadal zaznaczony"""
+        if image_key == self.shown_image_path:
+            self.show_thumbnail(pixmap)
+
+    def show_thumbnail(self, pixmap):
+        """Ustawia miniaturę w polu zdjęcia (None - brak zdjęcia, False - trwa wczytywanie)"""
+        if pixmap is None:
+            self.image_label.setText("Brak zdjęcia")
+        elif pixmap is False:
+            self.image_label.setText("Wczytywanie zdjęcia...")
         else:
-            self.image_label.setPixmap(pixmap.scaled(300, 300, Qt.AspectRatioMode.KeepAspectRatio))
+            self.image_label.setPixmap(pixmap)
             self.image_label.setStyleSheet("""
                 background-color: #f0f0f0;
                 font-size: 14px;
@@ -266,7 +345,7 @@ class AddAnimalDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Dodaj Zwierzę")
-        self.setFixedSize(400, 450)
+        self.setFixedSize(400, 490)
         self.setWindowIcon(QIcon("images/background/icon.png"))  # Ustawienie ikony
 
         layout = QVBoxLayout(self)
@@ -276,6 +355,7 @@ class AddAnimalDialog(QDialog):
         layout.addWidget(self.name_input)
 
         self.species_input = QLineEdit()
+        self.species_input.setCompleter(species_completer(self))
         layout.addWidget(QLabel("Gatunek:"))
         layout.addWidget(self.species_input)
 
@@ -303,10 +383,25 @@ class AddAnimalDialog(QDialog):
         layout.addWidget(QLabel("Uwagi:"))
         layout.addWidget(self.info_input)
 
+        # Zdjęcie zapisywane po zapisaniu zwierzęcia
+        self.photo_path = None
+        self.photo_button = QPushButton("Wybierz Zdjęcie")
+        self.photo_button.clicked.connect(self.choose_photo)
+        layout.addWidget(self.photo_button)
+
         self.add_button = QPushButton("Dodaj")
         self.add_button.clicked.connect(self.add_animal)
         layout.addWidget(self.add_button)
 
+        self.saved_row = None  # Dodany wiersz (układ kolumn tabeli zwierząt)
+
+    def choose_photo(self):
+        """Wybiera plik zdjęcia zwierzęcia"""
+        file_path, _ = QFileDialog.getOpenFileName(self, "Wybierz zdjęcie", "", PHOTO_FILTER)
+        if file_path:
+            self.photo_path = file_path
+            self.photo_button.setText(f"Zdjęcie: {os.path.basename(file_path)}")
+
     def add_animal(self):
         """Dodaje nowe zwierzę do bazy danych"""
         name = self.name_input.text()
@@ -323,22 +418,20 @@ class AddAnimalDialog(QDialog):
             return
 
         try:
-            connection = get_connection()
-            if not connection:
-                QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-                return
-
-            cursor = connection.cursor()
-            cursor.execute("""
-                INSERT INTO animals (name, species, breed, age, owner_name, owner_contact, owner_email, info)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (name, species, breed, age, owner_name, owner_contact, owner_email, info))
-            connection.commit()
-            cursor.close()
-            connection.close()
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        INSERT INTO animals (name, species, breed, age, owner_name, owner_contact, owner_email, info)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        RETURNING id, name, species, breed, age, owner_name, owner_contact, owner_email, info, NULL
+                    """, (name, species, breed, age, owner_name, owner_contact, owner_email, info))
+                    self.saved_row = cursor.fetchone()
+                connection.commit()
 
             QMessageBox.information(self, "Sukces", "Zwierzę zostało dodane!")
             self.accept()
+        except DatabaseUnavailableError:
+            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
         except Exception as e:
             QMessageBox.critical(self, "Błąd", f"Wystąpił błąd podczas dodawania zwierzęcia: {e}")
 
@@ -348,7 +441,7 @@ class EditAnimalDialog(QDialog):
         super().__init__(parent)
         self.animal_id = animal_id
         self.setWindowTitle("Edytuj Zwierzę")
-        self.setFixedSize(400, 450)
+        self.setFixedSize(400, 490)
         self.setWindowIcon(QIcon("images/background/icon.png"))  # Ustawienie ikony
 
         layout = QVBoxLayout(self)
@@ -358,6 +451,7 @@ class EditAnimalDialog(QDialog):
         layout.addWidget(self.name_input)
 
         self.species_input = QLineEdit()
+        self.species_input.setCompleter(species_completer(self))
         layout.addWidget(QLabel("Gatunek:"))
         layout.addWidget(self.species_input)
 
@@ -385,35 +479,42 @@ class EditAnimalDialog(QDialog):
         layout.addWidget(QLabel("Uwagi:"))
         layout.addWidget(self.info_input)
 
+        # Zdjęcie zapisywane po zapisaniu zwierzęcia
+        self.photo_path = None
+        self.photo_button = QPushButton("Wybierz Zdjęcie")
+        self.photo_button.clicked.connect(self.choose_photo)
+        layout.addWidget(self.photo_button)
+
         self.save_button = QPushButton("Zapisz Zmiany")
         self.save_button.clicked.connect(self.save_changes)
         layout.addWidget(self.save_button)
 
+        self.saved_row = None  # Zapisany wiersz lub None, jeśli zwierzęcia już nie ma
         self.load_animal_data()
 
+    def choose_photo(self):
+        """Wybiera plik zdjęcia zwierzęcia"""
+        file_path, _ = QFileDialog.getOpenFileName(self, "Wybierz zdjęcie", "", PHOTO_FILTER)
+        if file_path:
+            self.photo_path = file_path
+            self.photo_button.setText(f"Zdjęcie: {os.path.basename(file_path)}")
+
     def load_animal_data(self):
         """Ładuje dane zwierzęcia do pól formularza"""
         try:
-            connection = get_connection()
-            cursor = connection.cursor()
-            cursor.execute("""
-                SELECT name, species, breed, age, owner_name, owner_contact, owner_email, info
-                FROM animals WHERE id = %s
-            """, (self.animal_id,))
-            result = cursor.fetchone()
-            if result:  # Sprawdź, czy zapytanie zwróciło wynik
-                self.name_input.setText(result[0])
-                self.species_input.setText(result[1])
-                self.breed_input.setText(result[2])
-                self.age_input.setText(str(result[3]))
-                self.owner_name_input.setText(result[4])
-                self.owner_contact_input.setText(result[5])
-                self.owner_email_input.setText(result[6])
-                self.info_input.setText(result[7])
+            # Rekord wczytany już przez tabelę zwierząt nie wymaga zapytania
+            animal = get_animal(self.animal_id)
+            if animal:  # Sprawdź, czy zwierzę istnieje
+                self.name_input.setText(animal["name"])
+                self.species_input.setText(animal["species"])
+                self.breed_input.setText(animal["breed"])
+                self.age_input.setText(str(animal["age"]))
+                self.owner_name_input.setText(animal["owner_name"])
+                self.owner_contact_input.setText(animal["owner_contact"])
+                self.owner_email_input.setText(animal["owner_email"])
+                self.info_input.setText(animal["info"])
             else:
                 QMessageBox.warning(self, "Błąd", "Nie znaleziono danych dla wybranego zwierzęcia!")
-            cursor.close()
-            connection.close()
         except Exception as e:
             QMessageBox.critical(self, "Błąd", f"Wystąpił błąd podczas ładowania danych: {e}")
 
@@ -433,16 +534,16 @@ class EditAnimalDialog(QDialog):
             return
 
         try:
-            connection = get_connection()
-            cursor = connection.cursor()
-            cursor.execute("""
-                UPDATE animals
-                SET name = %s, species = %s, breed = %s, age = %s, owner_name = %s, owner_contact = %s, owner_email = %s,  info = %s
-                WHERE id = %s
-            """, (name, species, breed, age, owner_name, owner_contact, owner_email, info, self.animal_id))
-            connection.commit()
-            cursor.close()
-            connection.close()
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"""
+                        UPDATE animals
+                        SET name = %s, species = %s, breed = %s, age = %s, owner_name = %s, owner_contact = %s, owner_email = %s,  info = %s
+                        WHERE id = %s
+                        RETURNING id, name, species, breed, age, owner_name, owner_contact, owner_email, info, {ANIMAL_PHOTO_SELECT}
+                    """, (name, species, breed, age, owner_name, owner_contact, owner_email, info, self.animal_id))
+                    self.saved_row = cursor.fetchone()
+                connection.commit()
             QMessageBox.information(self, "Sukces", "Zmiany zostały zapisane!")
             self.accept()
         except Exception as e:
@@ -0,0 +1,126 @@
+import os
+
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QListWidget, QListWidgetItem, QListView, QMessageBox, QStyle
+from PyQt6.QtCore import Qt, QSize, QUrl
+from PyQt6.QtGui import QDesktopServices, QIcon
+from database.operations import get_history_attachments
+from database.attachments import export_attachment
+from gui.query_executor import get_query_executor
+from gui.thumbnail_cache import get_thumbnail_cache, PREVIEW_SIZE
+
+SHA_ROLE = Qt.ItemDataRole.UserRole             # Skrót treści załącznika (None dla starszych wpisów)
+CONTENT_TYPE_ROLE = Qt.ItemDataRole.UserRole + 1
+FILE_PATH_ROLE = Qt.ItemDataRole.UserRole + 2   # Ścieżka pliku starszego załącznika
+
+
+def format_size(size):
+    """Rozmiar pliku w czytelnej postaci."""
+    if size is None:
+        return ""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class AttachmentPanel(QWidget):
+    """
+    Panel załączników zaznaczonego wpisu historii. Lista plików pojawia się od razu,
+    a podglądy (obrazy, pierwsza strona PDF-a) są wczytywane w tle tylko dla widocznych pozycji.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.history_id = None
+        self.items = {}  # skrót -> pozycje listy z tą treścią
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.title_label = QLabel("Załączniki")
+        layout.addWidget(self.title_label)
+
+        self.list_widget = QListWidget()
+        self.list_widget.setViewMode(QListView.ViewMode.IconMode)
+        self.list_widget.setResizeMode(QListView.ResizeMode.Adjust)
+        self.list_widget.setMovement(QListView.Movement.Static)
+        self.list_widget.setIconSize(QSize(PREVIEW_SIZE, PREVIEW_SIZE))
+        self.list_widget.setWordWrap(True)
+        self.list_widget.itemDoubleClicked.connect(self.open_attachment)
+        self.list_widget.verticalScrollBar().valueChanged.connect(self.request_visible_previews)
+        layout.addWidget(self.list_widget)
+        self.setMinimumWidth(PREVIEW_SIZE + 60)
+
+        self.placeholder_icon = self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon)
+        self.thumbnails = get_thumbnail_cache()
+        self.thumbnails.ready.connect(self.on_preview_ready)
+
+    def show_history(self, history_id):
+        """Wczytuje w tle listę załączników wpisu historii (None czyści panel)."""
+        self.history_id = history_id
+        self.list_widget.clear()
+        self.items = {}
+        if history_id is None:
+            get_query_executor().cancel(self, "attachments")
+            self.title_label.setText("Załączniki")
+            return
+        self.title_label.setText("Załączniki: wczytywanie...")
+        get_query_executor().submit(
+            self, "attachments", get_history_attachments, history_id,
+            on_result=self.populate,
+            on_error=lambda error: self.title_label.setText(f"Załączniki: błąd ({error})")
+        )
+
+    def populate(self, attachments):
+        """Wypełnia listę załącznikami z ikoną zastępczą; podglądy dochodzą później."""
+        self.title_label.setText(f"Załączniki: {len(attachments)}" if attachments else "Załączniki: brak")
+        for _, sha256, file_name, content_type, size, file_path in attachments:
+            item = QListWidgetItem(self.placeholder_icon, f"{os.path.basename(file_name or '')}\n{format_size(size)}")
+            item.setData(SHA_ROLE, sha256)
+            item.setData(CONTENT_TYPE_ROLE, content_type)
+            item.setData(FILE_PATH_ROLE, file_path)
+            item.setToolTip(file_name)
+            self.list_widget.addItem(item)
+            if sha256:
+                self.items.setdefault(sha256, []).append(item)
+        self.request_visible_previews()
+
+    def request_visible_previews(self):
+        """Zleca podglądy tylko dla pozycji widocznych w liście (pozostałe przy przewinięciu)."""
+        viewport = self.list_widget.viewport().rect()
+        for row in range(self.list_widget.count()):
+            item = self.list_widget.item(row)
+            sha256 = item.data(SHA_ROLE)
+            if not sha256 or not self.list_widget.visualItemRect(item).intersects(viewport):
+                continue
+            pixmap = self.thumbnails.get_preview(sha256, item.data(CONTENT_TYPE_ROLE))
+            if pixmap:
+                item.setIcon(QIcon(pixmap))
+
+    def on_preview_ready(self, key, pixmap):
+        """Podmienia ikonę zastępczą, gdy podgląd wczytany w tle dotyczy załącznika z listy."""
+        for item in self.items.get(key, []):
+            # Ten sam skrót może mieć też miniatura zdjęcia - bierzemy podgląd z pamięci
+            preview = self.thumbnails.get_preview(key, item.data(CONTENT_TYPE_ROLE))
+            if preview:
+                item.setIcon(QIcon(preview))
+
+    def resizeEvent(self, event):
+        """Po powiększeniu panelu widocznych może być więcej pozycji."""
+        super().resizeEvent(event)
+        self.request_visible_previews()
+
+    def open_attachment(self, item):
+        """Otwiera załącznik w domyślnym programie (treść z bazy kopiowana w tle pod oryginalną nazwą)."""
+        sha256 = item.data(SHA_ROLE)
+        if sha256:
+            get_query_executor().submit(
+                self, f"open:{sha256}", export_attachment, sha256, item.toolTip(),
+                on_result=lambda path: QDesktopServices.openUrl(QUrl.fromLocalFile(path)),
+                on_error=lambda error: QMessageBox.warning(self, "Błąd", f"Nie udało się otworzyć załącznika: {error}")
+            )
+            return
+        path = item.data(FILE_PATH_ROLE)
+        if path and os.path.exists(path):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(path))
+        else:
+            QMessageBox.warning(self, "Brak pliku", f"Plik {path} nie jest dostępny na tym stanowisku.")
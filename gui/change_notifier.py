@@ -0,0 +1,182 @@
+from functools import partial
+
+from PyQt6.QtCore import QObject, QThreadPool, QTimer, pyqtSignal
+from database.change_feed import ChangeListener
+from database.identity_map import get_identity_map
+from database.query_cache import get_query_cache
+from database.reference_cache import get_reference_cache
+from database.search_index import get_animal_search_index, refresh_animal_search_index
+from gui.query_executor import get_query_executor
+
+COALESCE_MS = 100  # Zdarzenia z tego okresu trafiają do okien jedną paczką
+
+
+class ChangeNotifier(QObject):
+    """
+    Przekazuje zdarzenia zmian z wątku nasłuchu do wątku GUI jako sygnały Qt.
+    Zdarzenia są łączone w paczki per tabela, żeby seria zmian (np. import)
+    nie wywoływała osobnego zapytania dla każdego wiersza.
+    """
+    changed = pyqtSignal(str, object, object)  # tabela, id dodanych/zmienionych, id usuniętych
+    reset = pyqtSignal(object)                 # tabela lub None (wszystkie) - trzeba przeładować dane
+    _received = pyqtSignal(object)             # Zdarzenia z wątku nasłuchu
+    _reset_requested = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pending = {}  # tabela -> {id: ostatnia operacja}
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(COALESCE_MS)
+        self._timer.timeout.connect(self._flush)
+        # Sygnały emitowane z innego wątku są kolejkowane do wątku GUI
+        self._received.connect(self._collect)
+        self._reset_requested.connect(self._on_reset)
+        # Pamięci podręczne są unieważniane przed oknami, które mogą z nich od razu czytać
+        self.changed.connect(self._update_caches)
+        self.reset.connect(self._reset_caches)
+        self._listener = ChangeListener(self._received.emit, partial(self._reset_requested.emit, None))
+        self._listener.start()
+
+    @property
+    def listening(self):
+        """Czy zmiany z bazy są właśnie dostarczane (w przeciwnym razie okna przeładowują dane same)."""
+        return self._listener.listening
+
+    def stop(self):
+        """Zatrzymuje wątek nasłuchu."""
+        self._listener.stop()
+
+    def _collect(self, changes):
+        for table, operation, row_id in changes:
+            if operation == "T":
+                self._pending.pop(table, None)
+                self._reset_requested.emit(table)
+            else:
+                self._pending.setdefault(table, {})[row_id] = operation
+        if self._pending and not self._timer.isActive():
+            self._timer.start()
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        for table, operations in pending.items():
+            deleted = {row_id for row_id, operation in operations.items() if operation == "D"}
+            self.changed.emit(table, set(operations) - deleted, deleted)
+
+    def _on_reset(self, table):
+        if table is None:
+            self._pending = {}
+        self.reset.emit(table)
+
+    def _update_caches(self, table, changed_ids, deleted_ids):
+        """Unieważnia dane słownikowe, zmienione rekordy i zależne wyniki zapytań, dociąga zmiany do indeksu wyszukiwania."""
+        get_reference_cache().invalidate_table(table)
+        get_query_cache().invalidate(table)
+        get_identity_map().invalidate(table, changed_ids | deleted_ids)
+        if table == "animals" and get_animal_search_index().loaded:
+            QThreadPool.globalInstance().start(_refresh_search_index)
+
+    def _reset_caches(self, table):
+        """Po utracie zdarzeń dane słownikowe mogą być nieaktualne."""
+        if table is None:
+            get_reference_cache().invalidate()
+            get_identity_map().clear()
+            get_query_cache().invalidate()
+        else:
+            get_reference_cache().invalidate_table(table)
+            get_identity_map().invalidate(table)
+            get_query_cache().invalidate(table)
+
+
+def _refresh_search_index():
+    try:
+        refresh_animal_search_index()
+    except Exception as e:
+        print(f"Nie udało się odświeżyć indeksu wyszukiwania: {e}")
+
+
+class LiveTableUpdater(QObject):
+    """
+    Utrzymuje aktualność tabeli okna na podstawie zdarzeń zmian: pobiera w tle
+    tylko zmienione wiersze i podmienia je w modelu bez przeładowania całej tabeli.
+    """
+
+    def __init__(self, owner, model, reload):
+        """
+        :param owner: Okno tabeli (zapytania są wykonywane w jego imieniu).
+        :param model: ColumnarTableModel z id wiersza w kolumnie 0.
+        :param reload: Funkcja przeładowująca całą tabelę (po utracie zdarzeń).
+        """
+        super().__init__(owner)
+        self.owner = owner
+        self.model = model
+        self.reload = reload
+        self._sources = {}  # tabela -> (funkcja pobierająca wiersze, czy id zdarzenia to id wiersza, czy dopisywać)
+        self._pending = {}  # tabela -> id czekające na pobranie
+        notifier = get_change_notifier()
+        notifier.changed.connect(self.on_changed)
+        notifier.reset.connect(self.on_reset)
+
+    def watch(self, table, fetch_rows, keyed=True, insert=True):
+        """
+        Rejestruje tabelę bazy, której zmiany dotyczą wierszy modelu.
+        :param fetch_rows: Funkcja przyjmująca listę id i zwracająca wiersze modelu.
+        :param keyed: Id zdarzeń są id wierszy modelu; inaczej zmiana (np. imienia zwierzęcia)
+                      tylko odświeża powiązane wiersze zwrócone przez fetch_rows.
+        :param insert: Czy dopisywać nowe wiersze (False dla tabel z filtrem lub stronicowaniem).
+        """
+        self._sources[table] = (fetch_rows, keyed, insert)
+
+    def refresh(self):
+        """Po zmianie wykonanej w tym oknie: przeładowuje tabelę tylko bez działającego nasłuchu zmian."""
+        if not get_change_notifier().listening:
+            self.reload()
+
+    def on_changed(self, table, changed_ids, deleted_ids):
+        source = self._sources.get(table)
+        if source is None:
+            return
+        fetch_rows, keyed, insert = source
+        if keyed and deleted_ids:
+            self.model.patch_rows(deleted_ids, [])
+        pending = self._pending.setdefault(table, set())
+        pending.update(changed_ids)
+        pending.difference_update(deleted_ids)
+        if not pending:
+            return
+        # Nowsze zapytanie w kanale zastępuje starsze, więc obejmuje wszystkie oczekujące id
+        ids = frozenset(pending)
+        get_query_executor().submit(
+            self.owner, f"changes:{table}", fetch_rows, sorted(ids),
+            on_result=partial(self._apply, table, ids), on_error=self._fetch_failed
+        )
+
+    def _apply(self, table, ids, rows):
+        _, keyed, insert = self._sources[table]
+        self._pending.get(table, set()).difference_update(ids)
+        self.model.patch_rows(ids if keyed else (), rows, insert=insert)
+
+    def _fetch_failed(self, error):
+        print(f"Nie udało się pobrać zmienionych wierszy: {error}")
+
+    def on_reset(self, table):
+        if table is None or table in self._sources:
+            self._pending = {}
+            self.reload()
+
+
+_notifier = None
+
+
+def get_change_notifier():
+    """Zwraca współdzielony odbiornik zmian (tworzony w wątku GUI przy pierwszym użyciu)."""
+    global _notifier
+    if _notifier is None:
+        _notifier = ChangeNotifier()
+    return _notifier
+
+
+def stop_change_notifier():
+    """Zatrzymuje nasłuch zmian (np. przy wyjściu z aplikacji)."""
+    if _notifier is not None:
+        _notifier.stop()
@@ -1,9 +1,17 @@
-from PyQt6.QtWidgets import QMainWindow, QVBoxLayout, QTableWidget, QTableWidgetItem, QMessageBox, QDialog, QWidget, QLabel, QLineEdit, QPushButton, QHBoxLayout, QTextEdit, QFileDialog, QComboBox, QHeaderView
-from database.connection import get_connection
-from database.operations import add_history_record
-from database.operations import get_filtered_history
+from PyQt6.QtWidgets import QMainWindow, QVBoxLayout, QTableView, QMessageBox, QDialog, QWidget, QLabel, QLineEdit, QPushButton, QHBoxLayout, QTextEdit, QFileDialog, QComboBox, QHeaderView
+from database.connection import pooled_connection
+from database.operations import save_history_attachments
+from database.attachments import describe_file
+from database.operations import get_filtered_history, get_history_rows, get_animal_name
+from database.reference_cache import get_reference_data
+from database.query_cache import get_query_cache
+from database.operations import estimate_filtered_history_count, date_range_bounds, HISTORY_PAGE_SIZE
 from gui.search_history_window import SearchHistoryWindow
 from gui.notifications_window import NotificationsWindow
+from gui.query_executor import get_query_executor
+from gui.table_model import PagedTableModel
+from gui.change_notifier import LiveTableUpdater
+from gui.attachment_panel import AttachmentPanel
 from PyQt6.QtGui import QIcon, QGuiApplication
 
 
@@ -25,8 +33,8 @@ class AddHistoryDialog(QDialog):
         self.description_reason = description_reason
         self.location_id = location_id
 
-        # Pobierz imię zwierzęcia
-        animal_name = self.get_animal_name(animal_id)
+        # Imię zwierzęcia osobnym zapytaniem; lokalizacje z pamięci podręcznej danych słownikowych
+        animal_name, locations = self.load_initial_data(animal_id)
 
         # Layout główny
         layout = QVBoxLayout(self)
@@ -39,7 +47,7 @@ class AddHistoryDialog(QDialog):
 
         # Lokalizacja
         self.location_selector = QComboBox()
-        self.load_locations(location_id)
+        self.load_locations(locations, location_id)
         layout.addWidget(QLabel("Lokalizacja:"))
         layout.addWidget(self.location_selector)
 
@@ -82,22 +90,17 @@ class AddHistoryDialog(QDialog):
         y = (screen_geometry.height() - self.height()) // 2
         self.move(x, y)
 
-    def get_animal_name(self, animal_id):
-        """Pobiera imię zwierzęcia na podstawie jego ID."""
+    def load_initial_data(self, animal_id):
+        """Pobiera imię zwierzęcia; lokalizacje pochodzą z pamięci podręcznej danych słownikowych."""
         try:
-            connection = get_connection()
-            cursor = connection.cursor()
-            cursor.execute("SELECT name FROM animals WHERE id = %s", (animal_id,))
-            result = cursor.fetchone()
-            cursor.close()
-            connection.close()
-            if result:
-                return result[0]
-            else:
-                return "Nieznane zwierzę"
+            locations = get_reference_data("locations")
+            name = get_animal_name(animal_id)
         except Exception as e:
-            QMessageBox.critical(self, "Błąd", f"Nie udało się pobrać imienia zwierzęcia: {e}")
-            return "Błąd"
+            QMessageBox.critical(self, "Błąd", f"Nie udało się pobrać danych wizyty: {e}")
+            return "Błąd", []
+        if name is None:
+            return "Nieznane zwierzę", locations
+        return name, locations
 
     def add_attachment(self):
         """Dodaj załącznik."""
@@ -106,19 +109,13 @@ class AddHistoryDialog(QDialog):
             self.attachments.append(file_path)
             self.attachments_label.setText("Załączniki: " + ", ".join(self.attachments))
 
-    def load_locations(self, selected_location_id):
+    def load_locations(self, locations, selected_location_id):
         """Ładuje lokalizacje do selektora."""
-        connection = get_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, name FROM locations")
-        locations = cursor.fetchall()
-        for location_id, name in locations:
+        for location_id, name, *_ in locations:
             self.location_selector.addItem(name, location_id)
         self.location_selector.setCurrentIndex(
             next((i for i, loc in enumerate(locations) if loc[0] == selected_location_id), 0)
         )
-        cursor.close()
-        connection.close()
 
     def add_history(self):
         """Zapisuje dane historii leczenia do bazy danych."""
@@ -132,15 +129,25 @@ class AddHistoryDialog(QDialog):
             return
 
         try:
-            connection = get_connection()
-            cursor = connection.cursor()
-            cursor.execute("""
-                INSERT INTO history (animal_id, visit_date, registered_by, description_reason, indications, medication, payment, location_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (self.animal_id, self.visit_date, self.registered_by, self.description_reason, indications, medication, payment, location_id))
-            connection.commit()
-            cursor.close()
-            connection.close()
+            # Skróty załączników liczymy przed otwarciem transakcji
+            files = [describe_file(path) for path in self.attachments]
+        except OSError as e:
+            QMessageBox.critical(self, "Błąd", f"Nie można odczytać załącznika: {e}")
+            return
+
+        try:
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        INSERT INTO history (animal_id, visit_date, registered_by, description_reason, indications, medication, payment, location_id)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        RETURNING id
+                    """, (self.animal_id, self.visit_date, self.registered_by, self.description_reason, indications, medication, payment, location_id))
+                    history_id = cursor.fetchone()[0]
+                    # Treść plików trafia do bazy, więc załączniki otworzy każde stanowisko
+                    save_history_attachments(cursor, history_id, files)
+                connection.commit()
+            get_query_cache().invalidate("history")
 
             QMessageBox.information(self, "Sukces", "Historia leczenia została dodana!")
             self.accept()
@@ -191,17 +198,37 @@ class HistoryWindow(QMainWindow):
         self.main_layout.addWidget(self.search_button)        
 
         # Tabela historii leczenia
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(7)
-        self.history_table.setHorizontalHeaderLabels([
-            "ID", "Zwierzę", "Data wizyty", "Lekarz", "Opis zabiegów", "Podane leki", "Kwota" 
-        ])
+        self.filters = None
+        self.estimated_count = None
+        self.history_model = PagedTableModel([
+            "ID", "Zwierzę", "Data wizyty", "Lekarz", "Opis zabiegów", "Podane leki", "Kwota"
+        ], HISTORY_PAGE_SIZE, self.load_next_page, parent=self)
+        self.history_model.rowsInserted.connect(self.update_count_label)
+        self.history_model.modelReset.connect(self.update_count_label)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
         self.style_table()
-        self.main_layout.addWidget(self.history_table)
 
-        # Wczytaj całą historię
+        # Tabela i panel załączników zaznaczonego wpisu obok siebie
+        self.content_layout = QHBoxLayout()
+        self.main_layout.addLayout(self.content_layout)
+        self.content_layout.addWidget(self.history_table, 3)
+        self.attachment_panel = AttachmentPanel(self)
+        self.content_layout.addWidget(self.attachment_panel, 1)
+        self.history_table.selectionModel().selectionChanged.connect(self.show_selected_attachments)
+        self.history_model.modelReset.connect(self.show_selected_attachments)
+
+        # Liczba wczytanych i szacowana liczba wszystkich wpisów
+        self.count_label = QLabel("")
+        self.main_layout.addWidget(self.count_label)
+
+        # Wczytaj pierwszą stronę historii (kolejne są doładowywane przy przewijaniu)
         self.load_history()
 
+        # Zmiany z innych stanowisk podmieniają wczytane wiersze (nowe wpisy pojawią się po odświeżeniu filtrów)
+        self.live_updater = LiveTableUpdater(self, self.history_model, lambda: self.load_history(self.filters))
+        self.live_updater.watch("history", get_history_rows, insert=False)
+
     def style_table(self):
         """Stylizuje tabelę i dodaje funkcjonalność zaznaczania całych wierszy."""
         # Rozciąganie kolumn na całą szerokość tabeli
@@ -225,16 +252,16 @@ class HistoryWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.history_table.setAlternatingRowColors(True)
         self.history_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -253,7 +280,7 @@ class HistoryWindow(QMainWindow):
         self.history_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.history_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.history_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.history_table.verticalHeader().setVisible(False)
@@ -267,13 +294,47 @@ class HistoryWindow(QMainWindow):
         self.move(x, y)
 
     def load_history(self, filters=None):
-        """Wczytuje historię leczenia z bazy danych."""
-        history = get_filtered_history(filters)  # Pobieranie danych z bazy
-        self.history_table.setRowCount(0)
-        for row_number, record in enumerate(history):
-            self.history_table.insertRow(row_number)
-            for column_number, data in enumerate(record):
-                self.history_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))  # Dodawanie danych do tabeli
+        """Wczytuje pierwszą stronę historii leczenia i szacowaną liczbę wpisów (w tle)."""
+        self.filters = filters
+        self.estimated_count = None
+        self.history_model.begin_loading()
+        executor = get_query_executor()
+        executor.submit(self, "history", get_filtered_history, filters, on_result=self.populate_table)
+        executor.submit(self, "count", estimate_filtered_history_count, filters, on_result=self.show_estimated_count)
+
+    def load_next_page(self, last_row):
+        """Pobiera stronę historii następującą po ostatnim wczytanym wierszu."""
+        after = (last_row[2], last_row[0])  # Klucz stronicowania: (visit_date, id)
+        get_query_executor().submit(
+            self, "history", get_filtered_history, self.filters, after,
+            on_result=self.history_model.append_page
+        )
+
+    def show_selected_attachments(self):
+        """Pokazuje załączniki zaznaczonego wpisu (lista wczytywana w tle - zaznaczenie nie czeka na bazę)."""
+        selected_rows = self.history_table.selectionModel().selectedRows()
+        history_id = self.history_model.value(selected_rows[0].row(), 0) if selected_rows else None
+        if history_id != self.attachment_panel.history_id:
+            self.attachment_panel.show_history(history_id)
+
+    def populate_table(self, history):
+        """Wypełnia tabelę pierwszą stroną historii leczenia."""
+        self.history_model.set_rows(history)
+
+    def show_estimated_count(self, count):
+        """Zapamiętuje szacowaną liczbę wpisów."""
+        self.estimated_count = count
+        self.update_count_label()
+
+    def update_count_label(self):
+        """Pokazuje liczbę wczytanych i szacowaną liczbę wszystkich wpisów."""
+        loaded = self.history_model.rowCount()
+        if self.estimated_count is None:
+            self.count_label.setText(f"Wczytano wpisów: {loaded}")
+        else:
+            # Szacunek z planu zapytania bywa niedokładny - nie pokazujemy mniej niż wczytano
+            total = max(self.estimated_count, loaded)
+            self.count_label.setText(f"Wczytano wpisów: {loaded} z około {total}")
 
     def apply_filters(self):
         """Zastosuj filtry wyszukiwania."""
@@ -282,6 +343,12 @@ class HistoryWindow(QMainWindow):
             "doctor": self.doctor_filter.text(),
             "medication": self.medication_filter.text()
         }
+        if filters["date"]:
+            try:
+                date_range_bounds(filters["date"])
+            except ValueError as e:
+                QMessageBox.warning(self, "Błąd", str(e))
+                return
         self.load_history(filters)
 
     def open_search_window(self):
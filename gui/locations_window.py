@@ -1,8 +1,13 @@
 from PyQt6.QtWidgets import (
     QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton,
-    QTableWidget, QTableWidgetItem, QDialog, QLabel, QLineEdit, QMessageBox, QHeaderView
+    QTableView, QDialog, QLabel, QLineEdit, QMessageBox, QHeaderView
 )
-from database.connection import get_connection
+from database.connection import pooled_connection, DatabaseUnavailableError
+from database.operations import get_all_locations
+from database.reference_cache import get_reference_cache, get_reference_data
+from gui.query_executor import get_query_executor
+from gui.table_model import ColumnarTableModel
+from gui.change_notifier import LiveTableUpdater
 from PyQt6.QtGui import QIcon, QGuiApplication
 
 class LocationsWindow(QMainWindow):
@@ -42,16 +47,20 @@ class LocationsWindow(QMainWindow):
         self.nav_layout.addWidget(self.delete_location_button)
 
         # Tabela lokalizacji
-        self.locations_table = QTableWidget()
-        self.locations_table.setColumnCount(5)
-        self.locations_table.setHorizontalHeaderLabels(["ID", "Nazwa", "Adres", "Telefon", "E-mail"])
+        self.locations_model = ColumnarTableModel(["ID", "Nazwa", "Adres", "Telefon", "E-mail"], parent=self)
+        self.locations_table = QTableView()
+        self.locations_table.setModel(self.locations_model)
         self.style_table()
-        self.locations_table.cellClicked.connect(self.toggle_action_buttons)
+        self.locations_table.clicked.connect(self.toggle_action_buttons)
         self.main_layout.addWidget(self.locations_table)
 
         # Załaduj lokalizacje
         self.load_locations()
 
+        # Zmiany z innych stanowisk podmieniają tylko dotknięte wiersze tabeli
+        self.live_updater = LiveTableUpdater(self, self.locations_model, self.load_locations)
+        self.live_updater.watch("locations", get_all_locations)
+
     def style_table(self):
         """Stylizuje tabelę i dodaje funkcjonalność zaznaczania całych wierszy."""
         # Rozciąganie kolumn na całą szerokość tabeli
@@ -75,16 +84,16 @@ class LocationsWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.locations_table.setAlternatingRowColors(True)
         self.locations_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -103,7 +112,7 @@ class LocationsWindow(QMainWindow):
         self.locations_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.locations_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.locations_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.locations_table.verticalHeader().setVisible(False)
@@ -117,24 +126,12 @@ class LocationsWindow(QMainWindow):
         self.move(x, y)
 
     def load_locations(self):
-        """Ładuje lokalizacje z bazy danych do tabeli."""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, name, address, phone, email FROM locations")
-        results = cursor.fetchall()
+        """Ładuje lokalizacje z bazy danych do tabeli (w tle)."""
+        get_query_executor().submit(self, "locations", get_reference_data, "locations", on_result=self.populate_table)
 
-        self.locations_table.setRowCount(0)
-        for row_number, row_data in enumerate(results):
-            self.locations_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.locations_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
-
-        cursor.close()
-        connection.close()
+    def populate_table(self, results):
+        """Wypełnia tabelę lokalizacji."""
+        self.locations_model.set_rows(results)
 
     def toggle_action_buttons(self):
         """Włącza lub wyłącza przyciski akcji w zależności od zaznaczenia wiersza."""
@@ -151,8 +148,10 @@ class LocationsWindow(QMainWindow):
     def open_add_location_dialog(self):
         """Otwiera okno dialogowe do dodania lokalizacji."""
         dialog = AddLocationDialog(self)
-        dialog.exec()
-        self.load_locations()
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            # Dialog zwraca zapisany wiersz - dopisujemy go bez przeładowania tabeli
+            self.locations_model.patch_rows((), [dialog.saved_row])
+            get_reference_cache().invalidate("locations")
 
     def edit_location(self):
         """Edytuje zaznaczoną lokalizację."""
@@ -162,11 +161,13 @@ class LocationsWindow(QMainWindow):
             return
 
         selected_row = selected_rows[0]
-        location_id = self.locations_table.item(selected_row.row(), 0).text()
+        location_id = self.locations_model.value(selected_row.row(), 0)
 
         dialog = EditLocationDialog(self, location_id)
-        dialog.exec()
-        self.load_locations()
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            # Brak zwróconego wiersza oznacza, że lokalizację usunięto na innym stanowisku
+            self.locations_model.patch_rows([location_id], [dialog.saved_row] if dialog.saved_row else [])
+            get_reference_cache().invalidate("locations")
 
     def delete_location(self):
         """Usuwa zaznaczoną lokalizację."""
@@ -176,8 +177,8 @@ class LocationsWindow(QMainWindow):
             return
 
         selected_row = selected_rows[0]
-        location_id = self.locations_table.item(selected_row.row(), 0).text()
-        location_name = self.locations_table.item(selected_row.row(), 1).text()
+        location_id = self.locations_model.value(selected_row.row(), 0)
+        location_name = self.locations_model.display_value(selected_row.row(), 1)
 
         confirm = QMessageBox.question(
             self,
@@ -187,19 +188,22 @@ class LocationsWindow(QMainWindow):
         )
 
         if confirm == QMessageBox.StandardButton.Yes:
-            connection = get_connection()
-            if not connection:
+            try:
+                with pooled_connection() as connection:
+                    with connection.cursor() as cursor:
+                        cursor.execute("DELETE FROM locations WHERE id = %s RETURNING id", (location_id,))
+                        deleted = cursor.fetchone()
+                    connection.commit()
+            except DatabaseUnavailableError:
                 QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
                 return
 
-            cursor = connection.cursor()
-            cursor.execute("DELETE FROM locations WHERE id = %s", (location_id,))
-            connection.commit()
-            cursor.close()
-            connection.close()
-
-            QMessageBox.information(self, "Sukces", "Lokalizacja została usunięta!")
-            self.load_locations()
+            if deleted:
+                QMessageBox.information(self, "Sukces", "Lokalizacja została usunięta!")
+            else:
+                QMessageBox.information(self, "Informacja", "Lokalizacja została już wcześniej usunięta.")
+            self.locations_model.patch_rows([location_id], [])
+            get_reference_cache().invalidate("locations")
 
 
 class AddLocationDialog(QDialog):
@@ -231,6 +235,8 @@ class AddLocationDialog(QDialog):
         self.add_button.clicked.connect(self.add_location)
         layout.addWidget(self.add_button)
 
+        self.saved_row = None  # Dodany wiersz (układ kolumn tabeli lokalizacji)
+
     def add_location(self):
         """Dodaje nową lokalizację do bazy danych."""
         name = self.name_input.text()
@@ -242,20 +248,20 @@ class AddLocationDialog(QDialog):
             QMessageBox.warning(self, "Błąd", "Nazwa i adres są wymagane!")
             return
 
-        connection = get_connection()
-        if not connection:
+        try:
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO locations (name, address, phone, email) VALUES (%s, %s, %s, %s) "
+                        "RETURNING id, name, address, phone, email",
+                        (name, address, phone, email)
+                    )
+                    self.saved_row = cursor.fetchone()
+                connection.commit()
+        except DatabaseUnavailableError:
             QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
             return
 
-        cursor = connection.cursor()
-        cursor.execute(
-            "INSERT INTO locations (name, address, phone, email) VALUES (%s, %s, %s, %s)",
-            (name, address, phone, email)
-        )
-        connection.commit()
-        cursor.close()
-        connection.close()
-
         QMessageBox.information(self, "Sukces", "Lokalizacja została dodana!")
         self.accept()
 
@@ -290,22 +296,21 @@ class EditLocationDialog(QDialog):
         self.save_button.clicked.connect(self.save_changes)
         layout.addWidget(self.save_button)
 
+        self.saved_row = None  # Zapisany wiersz lub None, jeśli lokalizacji już nie ma
         self.load_location_data()
 
     def load_location_data(self):
         """Ładuje dane lokalizacji do formularza."""
-        connection = get_connection()
-        if not connection:
+        try:
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT name, address, phone, email FROM locations WHERE id = %s", (self.location_id,))
+                    result = cursor.fetchone()
+        except DatabaseUnavailableError:
             QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
             self.reject()
             return
 
-        cursor = connection.cursor()
-        cursor.execute("SELECT name, address, phone, email FROM locations WHERE id = %s", (self.location_id,))
-        result = cursor.fetchone()
-        cursor.close()
-        connection.close()
-
         if result:
             self.name_input.setText(result[0])
             self.address_input.setText(result[1])
@@ -323,19 +328,19 @@ class EditLocationDialog(QDialog):
             QMessageBox.warning(self, "Błąd", "Nazwa i adres są wymagane!")
             return
 
-        connection = get_connection()
-        if not connection:
+        try:
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "UPDATE locations SET name = %s, address = %s, phone = %s, email = %s WHERE id = %s "
+                        "RETURNING id, name, address, phone, email",
+                        (name, address, phone, email, self.location_id)
+                    )
+                    self.saved_row = cursor.fetchone()
+                connection.commit()
+        except DatabaseUnavailableError:
             QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
             return
 
-        cursor = connection.cursor()
-        cursor.execute(
-            "UPDATE locations SET name = %s, address = %s, phone = %s, email = %s WHERE id = %s",
-            (name, address, phone, email, self.location_id)
-        )
-        connection.commit()
-        cursor.close()
-        connection.close()
-
         QMessageBox.information(self, "Sukces", "Zmiany zostały zapisane!")
         self.accept()
\ No newline at end of file
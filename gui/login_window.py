@@ -1,6 +1,6 @@
 from PyQt6.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QLineEdit, QPushButton, QMessageBox, QApplication
 from PyQt6.QtCore import Qt
-from database.connection import get_connection
+from database.connection import pooled_connection, DatabaseUnavailableError
 from gui.main_window import MainWindow
 from PyQt6.QtGui import QIcon, QScreen
 import bcrypt
@@ -59,17 +59,15 @@ class LoginWindow(QMainWindow):
             self.error_label.setText("Proszę wprowadzić nazwę użytkownika i hasło.")
             return
 
-        connection = get_connection()
-        if not connection:
+        try:
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT id, password_hash, role FROM users WHERE username = %s", (username,))
+                    user = cursor.fetchone()
+        except DatabaseUnavailableError:
             QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
             return
 
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, password_hash, role FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        cursor.close()
-        connection.close()
-
         if not user:
             self.error_label.setText("Nieprawidłowy użytkownik lub hasło.")
             return
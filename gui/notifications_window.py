@@ -1,5 +1,8 @@
-from PyQt6.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QLabel, QMessageBox, QTableWidget, QTableWidgetItem, QHeaderView
-from database.connection import get_connection
+from PyQt6.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QLabel, QMessageBox, QTableView, QHeaderView
+from database.connection import pooled_connection, DatabaseUnavailableError
+from database.operations import get_upcoming_visits
+from gui.query_executor import get_query_executor
+from gui.table_model import ColumnarTableModel
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon, QGuiApplication
 from api.email_service import send_email
@@ -28,9 +31,9 @@ class NotificationsWindow(QMainWindow):
         self.main_layout.addWidget(QLabel("Przypomnienia o wizytach (7 dni do przodu)"))
 
         # Tabela przypomnień
-        self.notifications_table = QTableWidget()
-        self.notifications_table.setColumnCount(4)
-        self.notifications_table.setHorizontalHeaderLabels(["ID Wizyty", "Zwierzę", "Data Wizyty", "Właściciel"])
+        self.notifications_model = ColumnarTableModel(["ID Wizyty", "Zwierzę", "Data Wizyty", "Właściciel"], parent=self)
+        self.notifications_table = QTableView()
+        self.notifications_table.setModel(self.notifications_model)
         self.style_table()
         self.main_layout.addWidget(self.notifications_table)
 
@@ -47,7 +50,7 @@ class NotificationsWindow(QMainWindow):
         self.button_layout.addWidget(self.send_notification_button)
 
         # Włączanie/wyłączanie przycisku na podstawie zaznaczenia w tabeli
-        self.notifications_table.cellClicked.connect(self.toggle_send_button)
+        self.notifications_table.clicked.connect(self.toggle_send_button)
 
     def style_table(self):
         """Stylizuje tabelę i dodaje funkcjonalność zaznaczania całych wierszy."""
@@ -72,16 +75,16 @@ class NotificationsWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.notifications_table.setAlternatingRowColors(True)
         self.notifications_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -100,7 +103,7 @@ class NotificationsWindow(QMainWindow):
         self.notifications_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.notifications_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.notifications_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.notifications_table.verticalHeader().setVisible(False)
@@ -115,36 +118,18 @@ class NotificationsWindow(QMainWindow):
 
     def load_notifications(self):
         """Ładuje listę wizyt do przypomnienia."""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
         # Pobierz wizyty w ciągu najbliższych 7 dni
         today = datetime.date.today()  # Fixed here
         week_later = today + datetime.timedelta(days=7)
-        cursor.execute("""
-            SELECT v.id, a.name, v.visit_date, a.owner_name
-            FROM visits v
-            JOIN animals a ON v.animal_id = a.id
-            WHERE v.visit_date BETWEEN %s AND %s
-        """, (today, week_later))
-        results = cursor.fetchall()
-
-        self.notifications_table.setRowCount(0)
-        for row_number, row_data in enumerate(results):
-            self.notifications_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.notifications_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
-
-        cursor.close()
-        connection.close()
+        get_query_executor().submit(self, "notifications", get_upcoming_visits, today, week_later, on_result=self.populate_table)
+
+    def populate_table(self, results):
+        """Wypełnia tabelę przypomnień."""
+        self.notifications_model.set_rows(results)
 
     def toggle_send_button(self):
         """Aktywuje przycisk wysyłania przypomnienia po zaznaczeniu wiersza."""
-        selected_items = self.notifications_table.selectedItems()
-        if selected_items:  # Check if any items are selected
+        if self.notifications_table.selectionModel().hasSelection():
             self.send_notification_button.setEnabled(True)
         else:
             self.send_notification_button.setEnabled(False)
@@ -158,35 +143,33 @@ class NotificationsWindow(QMainWindow):
 
         # Pobieramy dane z zaznaczonego rekordu
         selected_row = selected_rows[0]
-        visit_id = self.notifications_table.item(selected_row.row(), 0).text()
-        animal_name = self.notifications_table.item(selected_row.row(), 1).text()
-        visit_date = self.notifications_table.item(selected_row.row(), 2).text()
-        owner_name = self.notifications_table.item(selected_row.row(), 3).text()
+        visit_id = self.notifications_model.value(selected_row.row(), 0)
+        animal_name = self.notifications_model.display_value(selected_row.row(), 1)
+        visit_date = self.notifications_model.display_value(selected_row.row(), 2)
+        owner_name = self.notifications_model.display_value(selected_row.row(), 3)
 
         # Pobieramy adres e-mail właściciela z tabeli animals
-        connection = get_connection()
-        if not connection:
+        try:
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT owner_email
+                        FROM animals
+                        WHERE id = (
+                            SELECT animal_id FROM visits WHERE id = %s
+                        )
+                    """, (visit_id,))
+                    owner_email = cursor.fetchone()
+        except DatabaseUnavailableError:
             QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
             return
 
-        cursor = connection.cursor()
-        cursor.execute("""
-            SELECT owner_email
-            FROM animals
-            WHERE id = (
-                SELECT animal_id FROM visits WHERE id = %s
-            )
-        """, (visit_id,))
-        owner_email = cursor.fetchone()
-
         # Sprawdzamy, czy adres e-mail jest dostępny
         if not owner_email or not owner_email[0]:
             QMessageBox.warning(self, "Brak e-maila", f"Brak adresu e-mail dla właściciela {owner_name}.")
             return
 
         owner_email = owner_email[0]  # Rozpakowanie wyniku
-        cursor.close()
-        connection.close()
 
         # Tworzymy wiadomość e-mail
         message = f"Przypomnienie: Wizyta dla {animal_name} zaplanowana na {visit_date}. Jeśli wizyta jest nieaktualna prosimy o kontakt."
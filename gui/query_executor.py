@@ -0,0 +1,234 @@
+import itertools
+
+from PyQt6 import sip
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt6.QtWidgets import QApplication, QMainWindow, QMessageBox
+from database.cancellation import CancellationToken
+from database.connection import DatabaseUnavailableError, POOL_MAX_SIZE
+
+
+class _TaskSignals(QObject):
+    """Sygnały zadania - emitowane z wątku roboczego, odbierane w wątku GUI."""
+    succeeded = pyqtSignal(object, object)  # bilet, wynik
+    failed = pyqtSignal(object, object)     # bilet, wyjątek
+    batch = pyqtSignal(object, object)      # bilet, paczka wierszy (tryb strumieniowy)
+
+
+class _QueryTask(QRunnable):
+    """Zadanie wykonujące funkcję warstwy danych w puli wątków."""
+
+    def __init__(self, ticket, function, args, kwargs):
+        super().__init__()
+        self.ticket = ticket
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = _TaskSignals()
+
+    def run(self):
+        try:
+            result = self.function(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(self.ticket, e)
+        else:
+            self.signals.succeeded.emit(self.ticket, result)
+
+
+class _StreamTask(_QueryTask):
+    """Zadanie przekazujące kolejne paczki wyników generatora, zanim zapytanie się zakończy."""
+
+    def __init__(self, ticket, function, args, kwargs, is_current):
+        super().__init__(ticket, function, args, kwargs)
+        self.is_current = is_current
+
+    def run(self):
+        try:
+            batches = self.function(*self.args, **self.kwargs)
+            try:
+                for rows in batches:
+                    self.signals.batch.emit(self.ticket, rows)
+                    # Nowsze zapytanie w kanale - przerywamy i zwalniamy połączenie
+                    if not self.is_current(self.ticket):
+                        break
+            finally:
+                close = getattr(batches, "close", None)
+                if close is not None:
+                    close()
+        except Exception as e:
+            self.signals.failed.emit(self.ticket, e)
+        else:
+            self.signals.succeeded.emit(self.ticket, None)
+
+
+class QueryExecutor(QObject):
+    """
+    Wykonuje zapytania w tle, aby okna nie blokowały się na cursor.execute.
+    Każde okno (owner) zgłasza zapytania w nazwanych kanałach; nowsze zapytanie
+    w tym samym kanale unieważnia wyniki poprzedniego.
+    """
+    loading_changed = pyqtSignal(object, bool)  # okno, czy trwa ładowanie
+
+    def __init__(self, max_threads=None, parent=None):
+        super().__init__(parent)
+        self._thread_pool = QThreadPool(self)
+        # Zostawiamy wolne połączenia w puli dla operacji wykonywanych w wątku GUI
+        self._thread_pool.setMaxThreadCount(max_threads or max(1, POOL_MAX_SIZE - 2))
+        self._generations = {}  # (id okna, kanał) -> numer najnowszego zapytania
+        self._pending = {}      # bilet -> (zadanie, okno, on_result, on_error)
+        self._batch_handlers = {}  # bilet -> on_batch (zapytania strumieniowe)
+        self._cancel_tokens = {}   # bilet -> CancellationToken (zapytania przerywalne)
+        self._counter = itertools.count(1)
+
+    def submit(self, owner, channel, function, *args, on_result=None, on_error=None, **kwargs):
+        """
+        Zleca wykonanie `function(*args, **kwargs)` w tle.
+        :param owner: Okno, do którego trafią wyniki (wyniki dla zamkniętego okna są porzucane).
+        :param channel: Nazwa kanału; nowe zapytanie unieważnia poprzednie w tym kanale.
+        :param on_result: Wywoływane w wątku GUI z wynikiem funkcji.
+        :param on_error: Wywoływane w wątku GUI z wyjątkiem; domyślnie komunikat błędu.
+        :return: Bilet identyfikujący zapytanie.
+        """
+        ticket = self._new_ticket(owner, channel)
+        task = _QueryTask(ticket, function, args, kwargs)
+        self._start(task, owner, on_result, on_error)
+        return ticket
+
+    def submit_stream(self, owner, channel, function, *args, on_batch=None,
+                      on_finished=None, on_error=None, cancellable=False, **kwargs):
+        """
+        Zleca w tle funkcję zwracającą generator paczek wierszy (np. iter_batches).
+        :param on_batch: Wywoływane w wątku GUI z każdą kolejną paczką wierszy.
+        :param on_finished: Wywoływane bez argumentów po ostatniej paczce.
+        :param on_error: Wywoływane w wątku GUI z wyjątkiem; domyślnie komunikat błędu.
+        :param cancellable: Przekazuje funkcji `cancel_token`; nowsze zapytanie w kanale
+                            przerywa wtedy to zapytanie na serwerze, zamiast czekać na jego koniec.
+        :return: Bilet identyfikujący zapytanie.
+        """
+        ticket = self._new_ticket(owner, channel)
+        if cancellable:
+            kwargs["cancel_token"] = self._cancel_tokens[ticket] = CancellationToken()
+        # is_current czyta słownik z wątku roboczego - pojedynczy odczyt jest bezpieczny pod GIL
+        task = _StreamTask(ticket, function, args, kwargs, self.is_current)
+        task.signals.batch.connect(self._on_batch)
+        self._batch_handlers[ticket] = on_batch
+        on_result = (lambda _: on_finished()) if on_finished is not None else None
+        self._start(task, owner, on_result, on_error)
+        return ticket
+
+    def _new_ticket(self, owner, channel):
+        """Tworzy bilet nowego zapytania; unieważnia poprzednie w kanale."""
+        key = (id(owner), channel)
+        self._cancel_pending(lambda pending_key: pending_key == key)
+        ticket = (key, next(self._counter))
+        self._generations[key] = ticket[1]
+        return ticket
+
+    def _cancel_pending(self, matches):
+        """Przerywa na serwerze trwające zapytania w pasujących kanałach."""
+        for ticket, token in self._cancel_tokens.items():
+            if matches(ticket[0]):
+                token.cancel()
+
+    def _start(self, task, owner, on_result, on_error):
+        """Rejestruje zadanie i uruchamia je w puli wątków."""
+        task.signals.succeeded.connect(self._on_succeeded)
+        task.signals.failed.connect(self._on_failed)
+        self._pending[task.ticket] = (task, owner, on_result, on_error)
+
+        self._update_loading(owner)
+        self._thread_pool.start(task)
+
+    def cancel(self, owner, channel=None):
+        """Porzuca wyniki oczekujących zapytań okna (w jednym lub we wszystkich kanałach)."""
+        matches = lambda key: key[0] == id(owner) and (channel is None or key[1] == channel)
+        self._cancel_pending(matches)
+        for key in list(self._generations):
+            if matches(key):
+                del self._generations[key]
+        self._update_loading(owner)
+
+    def is_current(self, ticket):
+        """Sprawdza, czy bilet dotyczy najnowszego zapytania w swoim kanale."""
+        key, generation = ticket
+        return self._generations.get(key) == generation
+
+    def is_loading(self, owner):
+        """Sprawdza, czy okno czeka na wyniki któregoś z zapytań."""
+        return any(
+            key[0] == id(owner) and self.is_current((key, generation))
+            for key, generation in self._pending
+        )
+
+    def _take(self, ticket):
+        """Zdejmuje zakończone zadanie; zwraca None dla wyników nieaktualnych."""
+        entry = self._pending.pop(ticket, None)
+        self._batch_handlers.pop(ticket, None)
+        self._cancel_tokens.pop(ticket, None)
+        if entry is None:
+            return None
+        _, owner, on_result, on_error = entry
+        key = ticket[0]
+        current = self.is_current(ticket)
+        if current:
+            del self._generations[key]
+        if sip.isdeleted(owner):
+            return None
+        self._update_loading(owner)
+        if not current:
+            return None
+        return owner, on_result, on_error
+
+    def _on_batch(self, ticket, rows):
+        entry = self._pending.get(ticket)
+        if entry is None or not self.is_current(ticket) or sip.isdeleted(entry[1]):
+            return
+        on_batch = self._batch_handlers.get(ticket)
+        if on_batch is not None:
+            on_batch(rows)
+
+    def _on_succeeded(self, ticket, result):
+        entry = self._take(ticket)
+        if entry is None:
+            return
+        _, on_result, _ = entry
+        if on_result is not None:
+            on_result(result)
+
+    def _on_failed(self, ticket, error):
+        entry = self._take(ticket)
+        if entry is None:
+            return
+        owner, _, on_error = entry
+        if on_error is not None:
+            on_error(error)
+        elif isinstance(error, DatabaseUnavailableError):
+            QMessageBox.critical(owner, "Błąd", "Brak połączenia z bazą danych.")
+        else:
+            QMessageBox.critical(owner, "Błąd", f"Wystąpił błąd podczas ładowania danych: {error}")
+
+    def _update_loading(self, owner):
+        """Pokazuje stan ładowania w oknie (pasek statusu i kursor)."""
+        if sip.isdeleted(owner):
+            return
+        loading = self.is_loading(owner)
+        if isinstance(owner, QMainWindow):
+            if loading:
+                owner.statusBar().showMessage("Ładowanie danych...")
+            else:
+                owner.statusBar().clearMessage()
+        if loading:
+            owner.setCursor(Qt.CursorShape.BusyCursor)
+        else:
+            owner.unsetCursor()
+        self.loading_changed.emit(owner, loading)
+
+
+_executor = None
+
+
+def get_query_executor():
+    """Zwraca współdzielony wykonawca zapytań (tworzony w wątku GUI)."""
+    global _executor
+    if _executor is None:
+        _executor = QueryExecutor(parent=QApplication.instance())
+    return _executor
@@ -1,7 +1,10 @@
 from PyQt6.QtWidgets import (
-    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QPushButton, QTableWidget, QTableWidgetItem, QMessageBox, QFileDialog, QComboBox, QHeaderView
+    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QPushButton, QTableView, QMessageBox, QFileDialog, QComboBox, QHeaderView, QLineEdit
 )
-from database.connection import get_connection
+from database.reference_cache import get_reference_data
+from database.operations import get_report_statistics, date_range_bounds
+from gui.query_executor import get_query_executor
+from gui.table_model import ColumnarTableModel
 from PyQt6.QtGui import QIcon, QGuiApplication
 import csv
 from reportlab.lib.pagesizes import letter
@@ -34,25 +37,38 @@ class ReportsWindow(QMainWindow):
         self.main_layout.addWidget(QLabel("Wybierz lokalizację:"))
         self.main_layout.addWidget(self.location_selector)
 
+        # Filtr okresu
+        self.date_layout = QHBoxLayout()
+        self.main_layout.addLayout(self.date_layout)
+
+        self.date_filter = QLineEdit()
+        self.date_filter.setPlaceholderText("Okres (YYYY, YYYY-MM lub YYYY-MM-DD) - puste oznacza cały okres")
+        self.date_filter.returnPressed.connect(self.update_statistics)
+        self.date_layout.addWidget(self.date_filter)
+
+        self.date_filter_button = QPushButton("Filtruj")
+        self.date_filter_button.clicked.connect(self.update_statistics)
+        self.date_layout.addWidget(self.date_filter_button)
+
         # Nagłówki sekcji
         self.main_layout.addWidget(QLabel("Statystyki Wizyt:"))
-        self.visits_table = QTableWidget()
-        self.visits_table.setColumnCount(3)
-        self.visits_table.setHorizontalHeaderLabels(["Miesiąc", "Liczba Wizyt", "Liczba Zwierząt"])
+        self.visits_model = ColumnarTableModel(["Miesiąc", "Liczba Wizyt", "Liczba Zwierząt"], parent=self)
+        self.visits_table = QTableView()
+        self.visits_table.setModel(self.visits_model)
         self.style_table()
         self.main_layout.addWidget(self.visits_table)
 
         self.main_layout.addWidget(QLabel("Statystyki Leczenia:"))
-        self.treatment_table = QTableWidget()
-        self.treatment_table.setColumnCount(2)
-        self.treatment_table.setHorizontalHeaderLabels(["Najczęściej Stosowane Leki", "Średnia Liczba Wizyt na Zwierzę"])
+        self.treatment_model = ColumnarTableModel(["Najczęściej Stosowane Leki", "Średnia Liczba Wizyt na Zwierzę"], parent=self)
+        self.treatment_table = QTableView()
+        self.treatment_table.setModel(self.treatment_model)
         self.style_treatment_table()
         self.main_layout.addWidget(self.treatment_table)
 
         self.main_layout.addWidget(QLabel("Statystyki Płatności:"))
-        self.payments_table = QTableWidget()
-        self.payments_table.setColumnCount(3)
-        self.payments_table.setHorizontalHeaderLabels(["Miesiąc", "Liczba Wizyt", "Łączna Kwota"])
+        self.payments_model = ColumnarTableModel(["Miesiąc", "Liczba Wizyt", "Łączna Kwota"], parent=self)
+        self.payments_table = QTableView()
+        self.payments_table.setModel(self.payments_model)
         self.style_payments_table()
         self.main_layout.addWidget(self.payments_table)
 
@@ -94,16 +110,16 @@ class ReportsWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.visits_table.setAlternatingRowColors(True)
         self.visits_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -122,7 +138,7 @@ class ReportsWindow(QMainWindow):
         self.visits_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.visits_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.visits_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.visits_table.verticalHeader().setVisible(False)
@@ -150,16 +166,16 @@ class ReportsWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.treatment_table.setAlternatingRowColors(True)
         self.treatment_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -178,7 +194,7 @@ class ReportsWindow(QMainWindow):
         self.treatment_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.treatment_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.treatment_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.treatment_table.verticalHeader().setVisible(False)
@@ -206,16 +222,16 @@ class ReportsWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.payments_table.setAlternatingRowColors(True)
         self.payments_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -234,7 +250,7 @@ class ReportsWindow(QMainWindow):
         self.payments_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.payments_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.payments_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.payments_table.verticalHeader().setVisible(False)
@@ -248,117 +264,36 @@ class ReportsWindow(QMainWindow):
         self.move(x, y)        
 
     def load_data(self):
-        """Ładuje dane statystyczne do tabel z uwzględnieniem lokalizacji."""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
-
+        """Ładuje dane statystyczne do tabel z uwzględnieniem lokalizacji i okresu (w tle)."""
         # Pobierz ID lokalizacji z pola wyboru
         location_id = self.location_selector.currentData()
-
-        # Statystyki wizyt
-        if location_id:  # Jeśli wybrano konkretną lokalizację
-            cursor.execute("""
-                SELECT 
-                    TO_CHAR(visit_date, 'YYYY-MM') AS month, 
-                    COUNT(*) AS visit_count, 
-                    COUNT(DISTINCT animal_id) AS animal_count
-                FROM history
-                WHERE location_id = %s
-                GROUP BY month
-                ORDER BY month
-            """, (location_id,))
-        else:  # Dla wszystkich lokalizacji
-            cursor.execute("""
-                SELECT 
-                    TO_CHAR(visit_date, 'YYYY-MM') AS month, 
-                    COUNT(*) AS visit_count, 
-                    COUNT(DISTINCT animal_id) AS animal_count
-                FROM history
-                GROUP BY month
-                ORDER BY month
-            """)
-        visit_stats = cursor.fetchall()
-        self.populate_table(self.visits_table, visit_stats)
-
-        # Statystyki leczenia
-        if location_id:  # Jeśli wybrano konkretną lokalizację
-            cursor.execute("""
-                SELECT 
-                    medication, 
-                    ROUND(CAST(COUNT(*) AS NUMERIC) / NULLIF(COUNT(DISTINCT animal_id), 0), 2) AS avg_visits_per_animal
-                FROM history
-                WHERE location_id = %s
-                GROUP BY medication
-                ORDER BY avg_visits_per_animal DESC
-                LIMIT 10
-            """, (location_id,))
-        else:  # Dla wszystkich lokalizacji
-            cursor.execute("""
-                SELECT 
-                    medication, 
-                    ROUND(CAST(COUNT(*) AS NUMERIC) / NULLIF(COUNT(DISTINCT animal_id), 0), 2) AS avg_visits_per_animal
-                FROM history
-                GROUP BY medication
-                ORDER BY avg_visits_per_animal DESC
-                LIMIT 10
-            """)
-        treatment_stats = cursor.fetchall()
-        self.populate_table(self.treatment_table, treatment_stats)
-
-        # Statystyki płatności
-        if location_id:  # Jeśli wybrano konkretną lokalizację
-            cursor.execute("""
-                SELECT 
-                    TO_CHAR(visit_date, 'YYYY-MM') AS month, 
-                    COUNT(*) AS visit_count, 
-                    SUM(payment) AS total_payment
-                FROM history
-                WHERE location_id = %s
-                GROUP BY month
-                ORDER BY month
-            """, (location_id,))
-        else:  # Dla wszystkich lokalizacji
-            cursor.execute("""
-                SELECT 
-                    TO_CHAR(visit_date, 'YYYY-MM') AS month, 
-                    COUNT(*) AS visit_count, 
-                    SUM(payment) AS total_payment
-                FROM history
-                GROUP BY month
-                ORDER BY month
-            """)
-        payment_stats = cursor.fetchall()
-        self.populate_table(self.payments_table, payment_stats)
-
-        cursor.close()
-        connection.close()
+        date_filter = self.date_filter.text().strip() or None
+        if date_filter:
+            try:
+                date_range_bounds(date_filter)
+            except ValueError as e:
+                QMessageBox.warning(self, "Błąd", str(e))
+                return
+        get_query_executor().submit(
+            self, "statistics", get_report_statistics, location_id, date_filter,
+            on_result=self.populate_statistics
+        )
+
+    def populate_statistics(self, statistics):
+        """Wypełnia tabele statystyk wizyt, leczenia i płatności."""
+        visit_stats, treatment_stats, payment_stats = statistics
+        self.visits_model.set_rows(visit_stats)
+        self.treatment_model.set_rows(treatment_stats)
+        self.payments_model.set_rows(payment_stats)
 
     def load_locations(self):
-        """Ładuje lokalizacje do pola wyboru."""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
+        """Ładuje lokalizacje do pola wyboru (z pamięci podręcznej danych słownikowych)."""
+        get_query_executor().submit(self, "locations", get_reference_data, "locations", on_result=self.populate_locations)
 
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, name FROM locations")
-        locations = cursor.fetchall()
-        for location_id, location_name in locations:
+    def populate_locations(self, locations):
+        """Dodaje lokalizacje do pola wyboru."""
+        for location_id, location_name, *_ in locations:
             self.location_selector.addItem(location_name, location_id)
-        cursor.close()
-        connection.close()
-
-    def populate_table(self, table, data):
-        """Wypełnia tabelę danymi."""
-        table.setRowCount(0)
-        for row_number, row_data in enumerate(data):
-            table.insertRow(row_number)
-            for column_number, value in enumerate(row_data):
-                table.setItem(row_number, column_number, QTableWidgetItem(str(value)))
 
     def export_to_csv(self):
         """Eksportuje dane statystyk do pliku CSV."""
@@ -373,25 +308,19 @@ class ReportsWindow(QMainWindow):
                 # Eksportuj dane wizyt
                 writer.writerow(["Statystyki Wizyt"])
                 writer.writerow(["Miesiąc", "Liczba Wizyt", "Liczba Zwierząt"])
-                for row in range(self.visits_table.rowCount()):
-                    row_data = [self.visits_table.item(row, col).text() for col in range(self.visits_table.columnCount())]
-                    writer.writerow(row_data)
+                writer.writerows(self.visits_model.display_rows())
 
                 # Eksportuj dane leczenia
                 writer.writerow([])
                 writer.writerow(["Statystyki Leczenia"])
                 writer.writerow(["Najczęściej Stosowane Leki", "Średnia Liczba Wizyt na Zwierzę"])
-                for row in range(self.treatment_table.rowCount()):
-                    row_data = [self.treatment_table.item(row, col).text() for col in range(self.treatment_table.columnCount())]
-                    writer.writerow(row_data)
+                writer.writerows(self.treatment_model.display_rows())
 
                 # Eksportuj dane płatności
                 writer.writerow([])
                 writer.writerow(["Statystyki Płatności"])
                 writer.writerow(["Miesiąc", "Liczba Wizyt", "Łączna Kwota"])
-                for row in range(self.payments_table.rowCount()):
-                    row_data = [self.payments_table.item(row, col).text() for col in range(self.payments_table.columnCount())]
-                    writer.writerow(row_data)
+                writer.writerows(self.payments_model.display_rows())
 
             QMessageBox.information(self, "Sukces", f"Statystyki zapisano do pliku: {file_path}")
         except Exception as e:
@@ -412,8 +341,8 @@ class ReportsWindow(QMainWindow):
             y_position = 730
             pdf.drawString(30, y_position, "Miesiąc | Liczba Wizyt | Liczba Zwierząt")
             y_position -= 20
-            for row in range(self.visits_table.rowCount()):
-                row_data = " | ".join([self.visits_table.item(row, col).text() for col in range(self.visits_table.columnCount())])
+            for row_values in self.visits_model.display_rows():
+                row_data = " | ".join(row_values)
                 pdf.drawString(30, y_position, row_data)
                 y_position -= 20
 
@@ -423,8 +352,8 @@ class ReportsWindow(QMainWindow):
             y_position -= 20
             pdf.drawString(30, y_position, "Najczęściej Stosowane Leki | Średnia Liczba Wizyt na Zwierzę")
             y_position -= 20
-            for row in range(self.treatment_table.rowCount()):
-                row_data = " | ".join([self.treatment_table.item(row, col).text() for col in range(self.treatment_table.columnCount())])
+            for row_values in self.treatment_model.display_rows():
+                row_data = " | ".join(row_values)
                 pdf.drawString(30, y_position, row_data)
                 y_position -= 20
 
@@ -434,8 +363,8 @@ class ReportsWindow(QMainWindow):
             y_position -= 20
             pdf.drawString(30, y_position, "Miesiąc | Liczba Wizyt | Łączna Kwota")
             y_position -= 20
-            for row in range(self.payments_table.rowCount()):
-                row_data = " | ".join([self.payments_table.item(row, col).text() for col in range(self.payments_table.columnCount())])
+            for row_values in self.payments_model.display_rows():
+                row_data = " | ".join(row_values)
                 pdf.drawString(30, y_position, row_data)
                 y_position -= 20
 
@@ -1,10 +1,12 @@
 from PyQt6.QtWidgets import (
     QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton,
-    QCalendarWidget, QTableWidget, QTableWidgetItem, QLabel, QHeaderView
+    QCalendarWidget, QTableView, QLabel, QHeaderView
 )
 from PyQt6.QtCore import QDate
 from PyQt6.QtGui import QIcon, QGuiApplication
 from database.operations import get_visits_for_date
+from gui.query_executor import get_query_executor
+from gui.table_model import ColumnarTableModel
 
 class ScheduleWindow(QMainWindow):
     def __init__(self, parent=None, username=None):
@@ -30,9 +32,9 @@ class ScheduleWindow(QMainWindow):
         self.main_layout.addWidget(self.calendar)
 
         # Tabela wizyt
-        self.visits_table = QTableWidget()
-        self.visits_table.setColumnCount(4)
-        self.visits_table.setHorizontalHeaderLabels(["ID", "Zwierzę", "Godzina wizyty", "Opis"])
+        self.visits_model = ColumnarTableModel(["ID", "Zwierzę", "Godzina wizyty", "Opis"], parent=self)
+        self.visits_table = QTableView()
+        self.visits_table.setModel(self.visits_model)
         self.style_table()
         self.main_layout.addWidget(self.visits_table)
 
@@ -62,16 +64,16 @@ class ScheduleWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.visits_table.setAlternatingRowColors(True)
         self.visits_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -90,7 +92,7 @@ class ScheduleWindow(QMainWindow):
         self.visits_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.visits_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.visits_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.visits_table.verticalHeader().setVisible(False)
@@ -106,10 +108,8 @@ class ScheduleWindow(QMainWindow):
     def load_visits_for_date(self):
         """Ładowanie wizyt zaplanowanych na wybrany dzień."""
         selected_date = self.calendar.selectedDate().toString("yyyy-MM-dd")
-        visits = get_visits_for_date(selected_date)
+        get_query_executor().submit(self, "visits", get_visits_for_date, selected_date, on_result=self.populate_table)
 
-        self.visits_table.setRowCount(0)
-        for row_number, visit in enumerate(visits):
-            self.visits_table.insertRow(row_number)
-            for column_number, data in enumerate(visit):
-                self.visits_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
\ No newline at end of file
+    def populate_table(self, visits):
+        """Wypełnia tabelę wizyt wybranego dnia."""
+        self.visits_model.set_rows(visits)
\ No newline at end of file
@@ -1,11 +1,18 @@
 from PyQt6.QtWidgets import (
     QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLineEdit,
-    QLabel, QTableWidget, QTableWidgetItem, QPushButton, QMessageBox, QHeaderView
+    QLabel, QTableView, QPushButton, QHeaderView
 )
-from database.connection import get_connection
-from PyQt6.QtCore import Qt
+from database.operations import iter_search_history, date_range_bounds
+from gui.query_executor import get_query_executor
+from gui.table_model import ColumnarTableModel
+from gui.attachment_panel import AttachmentPanel
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QIcon, QGuiApplication
 
+SEARCH_DEBOUNCE_MS = 300    # Ile ms po ostatnim znaku uruchomić wyszukiwanie
+SEARCH_RESULT_LIMIT = 200   # Liczba wyników wczytywanych naraz ("Pokaż więcej" dokłada kolejne)
+HISTORY_ID_COLUMN = 7       # Ukryta kolumna z id wpisu historii (poza nagłówkami tabeli)
+
 class SearchHistoryWindow(QMainWindow):
     def __init__(self, parent=None, username=None):
         super().__init__(parent)
@@ -24,6 +31,16 @@ class SearchHistoryWindow(QMainWindow):
         # Layout główny
         self.main_layout = QVBoxLayout(self.central_widget)
 
+        # Wyszukiwanie startuje dopiero po przerwie w pisaniu
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_results)
+
+        self.filters = None
+        self.page_end = 0        # Liczba wierszy, po której kończy się bieżąca porcja wyników
+        self.has_more = False
+
         # Sekcja wyszukiwania
         self.filter_layout = QHBoxLayout()
         self.main_layout.addLayout(self.filter_layout)
@@ -31,43 +48,57 @@ class SearchHistoryWindow(QMainWindow):
         # Pola wyszukiwania
         self.name_input = QLineEdit()
         self.name_input.setPlaceholderText("Imię")
-        self.name_input.textChanged.connect(self.filter_results)
+        self.name_input.textChanged.connect(self.schedule_search)
         self.filter_layout.addWidget(QLabel("Imię:"))
         self.filter_layout.addWidget(self.name_input)
 
         self.breed_input = QLineEdit()
         self.breed_input.setPlaceholderText("Rasa")
-        self.breed_input.textChanged.connect(self.filter_results)
+        self.breed_input.textChanged.connect(self.schedule_search)
         self.filter_layout.addWidget(QLabel("Rasa:"))
         self.filter_layout.addWidget(self.breed_input)
 
         self.owner_input = QLineEdit()
         self.owner_input.setPlaceholderText("Właściciel")
-        self.owner_input.textChanged.connect(self.filter_results)
+        self.owner_input.textChanged.connect(self.schedule_search)
         self.filter_layout.addWidget(QLabel("Właściciel:"))
         self.filter_layout.addWidget(self.owner_input)
 
         self.visit_date_input = QLineEdit()
-        self.visit_date_input.setPlaceholderText("Data wizyty (YYYY-MM-DD)")
-        self.visit_date_input.textChanged.connect(self.filter_results)
+        self.visit_date_input.setPlaceholderText("Data wizyty (YYYY, YYYY-MM lub YYYY-MM-DD)")
+        self.visit_date_input.textChanged.connect(self.schedule_search)
         self.filter_layout.addWidget(QLabel("Data wizyty:"))
         self.filter_layout.addWidget(self.visit_date_input)
 
         self.description_input = QLineEdit()
         self.description_input.setPlaceholderText("Opis wizyty")
-        self.description_input.textChanged.connect(self.filter_results)
+        self.description_input.textChanged.connect(self.schedule_search)
         self.filter_layout.addWidget(QLabel("Opis wizyty:"))
         self.filter_layout.addWidget(self.description_input)
 
         # Tabela wyników
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(7)
-        self.results_table.setHorizontalHeaderLabels([
-            "ID Zwierzęcia", "Imię Zwierzęcia", "Gatunek", "Rasa", 
+        self.results_model = ColumnarTableModel([
+            "ID Zwierzęcia", "Imię Zwierzęcia", "Gatunek", "Rasa",
             "Właściciel", "Data Wizyty", "Opis Wizyty"
-        ])
+        ], parent=self, hidden_columns=1)
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_model)
         self.style_table()
-        self.main_layout.addWidget(self.results_table)
+
+        # Tabela i panel załączników zaznaczonego wpisu obok siebie
+        self.content_layout = QHBoxLayout()
+        self.main_layout.addLayout(self.content_layout)
+        self.content_layout.addWidget(self.results_table, 3)
+        self.attachment_panel = AttachmentPanel(self)
+        self.content_layout.addWidget(self.attachment_panel, 1)
+        self.results_table.selectionModel().selectionChanged.connect(self.show_selected_attachments)
+        self.results_model.modelReset.connect(self.show_selected_attachments)
+
+        # Doładowanie kolejnej porcji wyników
+        self.more_button = QPushButton("Pokaż więcej")
+        self.more_button.setVisible(False)
+        self.more_button.clicked.connect(self.show_more)
+        self.main_layout.addWidget(self.more_button)
 
         # Wczytaj początkowe dane
         self.load_initial_data()
@@ -95,16 +126,16 @@ class SearchHistoryWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.results_table.setAlternatingRowColors(True)
         self.results_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -123,7 +154,7 @@ class SearchHistoryWindow(QMainWindow):
         self.results_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.results_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.results_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.results_table.verticalHeader().setVisible(False)
@@ -138,33 +169,49 @@ class SearchHistoryWindow(QMainWindow):
 
     def load_initial_data(self):
         """Ładowanie wszystkich danych z historii leczenia"""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
-        cursor.execute("""
-            SELECT 
-                a.id, a.name, a.species, a.breed, 
-                a.owner_name, h.visit_date, h.description_reason
-            FROM animals a
-            JOIN history h ON a.id = h.animal_id
-        """)
-        results = cursor.fetchall()
+        self.load_results()
+
+    def load_results(self, filters=None, offset=0):
+        """Strumieniuje porcję wyników do tabeli - pierwsze wiersze są widoczne przed końcem zapytania."""
+        self.filters = filters
+        if offset == 0:
+            self.results_model.clear()
+        self.page_end = offset + SEARCH_RESULT_LIMIT
+        self.has_more = False
+        self.more_button.setVisible(False)
+        # Nowe zapytanie unieważnia poprzednie i przerywa je na serwerze.
+        # Pobieramy jeden wiersz ponad limit, żeby wiedzieć, czy są kolejne wyniki.
+        get_query_executor().submit_stream(
+            self, "results", iter_search_history, filters, SEARCH_RESULT_LIMIT + 1, offset,
+            on_batch=self.populate_table, on_finished=self.finish_results, cancellable=True
+        )
+
+    def show_selected_attachments(self):
+        """Pokazuje załączniki zaznaczonego wpisu (lista wczytywana w tle - zaznaczenie nie czeka na bazę)."""
+        selected_rows = self.results_table.selectionModel().selectedRows()
+        history_id = self.results_model.value(selected_rows[0].row(), HISTORY_ID_COLUMN) if selected_rows else None
+        if history_id != self.attachment_panel.history_id:
+            self.attachment_panel.show_history(history_id)
+
+    def populate_table(self, data):
+        """Dopisuje do tabeli kolejną paczkę wyników"""
+        remaining = self.page_end - self.results_model.rowCount()
+        if len(data) > remaining:
+            self.has_more = True
+            data = data[:remaining]
+        self.results_model.append_rows(data)
 
-        self.populate_table(results)
+    def finish_results(self):
+        """Pokazuje przycisk "Pokaż więcej", gdy są dalsze wyniki."""
+        self.more_button.setVisible(self.has_more)
 
-        cursor.close()
-        connection.close()
+    def show_more(self):
+        """Wczytuje kolejną porcję wyników dla bieżących filtrów."""
+        self.load_results(self.filters, offset=self.results_model.rowCount())
 
-    def populate_table(self, data):
-        """Wypełnia tabelę danymi"""
-        self.results_table.setRowCount(0)
-        for row_number, row_data in enumerate(data):
-            self.results_table.insertRow(row_number)
-            for column_number, value in enumerate(row_data):
-                self.results_table.setItem(row_number, column_number, QTableWidgetItem(str(value)))
+    def schedule_search(self):
+        """Odkłada wyszukiwanie do chwili przerwy w pisaniu."""
+        self.search_timer.start()
 
     def filter_results(self):
         """Filtruje wyniki w tabeli na podstawie wprowadzonych kryteriów"""
@@ -174,32 +221,18 @@ class SearchHistoryWindow(QMainWindow):
         visit_date = self.visit_date_input.text()
         description = self.description_input.text()
 
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
-        query = """
-            SELECT 
-                a.id, a.name, a.species, a.breed, 
-                a.owner_name, h.visit_date, h.description_reason
-            FROM animals a
-            JOIN history h ON a.id = h.animal_id
-            WHERE 
-                a.name ILIKE %s AND 
-                a.breed ILIKE %s AND 
-                a.owner_name ILIKE %s AND 
-                (h.visit_date::text ILIKE %s OR h.visit_date IS NULL) AND 
-                (h.description_reason ILIKE %s OR h.description_reason IS NULL)
-        """
-        cursor.execute(query, (
-            f"%{name}%", f"%{breed}%", f"%{owner}%", 
-            f"%{visit_date}%", f"%{description}%"
-        ))
-        results = cursor.fetchall()
-
-        self.populate_table(results)
-
-        cursor.close()
-        connection.close()
\ No newline at end of file
+        filters = {
+            "name": name,
+            "breed": breed,
+            "owner": owner,
+            "visit_date": visit_date,
+            "description": description
+        }
+
+        # Niepełną datę pomijamy do czasu wpisania całego roku, miesiąca lub dnia
+        if visit_date:
+            try:
+                date_range_bounds(visit_date)
+            except ValueError:
+                return
+        self.load_results(filters)
\ No newline at end of file
@@ -1,13 +1,21 @@
 from PyQt6.QtWidgets import (
-    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QComboBox, QTableWidget, QTableWidgetItem, QPushButton, QLineEdit, QMessageBox, QHeaderView
+    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QComboBox, QTableView, QPushButton, QLineEdit, QMessageBox, QHeaderView, QCheckBox
 )
 from PyQt6.QtCore import Qt
-from database.connection import get_connection
+from database.reference_cache import get_reference_data
+from database.operations import get_financial_summary, get_financial_summary_by_location, date_range_bounds
+from gui.query_executor import get_query_executor
+from gui.table_model import ColumnarTableModel
 from PyQt6.QtGui import QIcon, QGuiApplication
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
 
+def format_amount(value):
+    """Formatuje kwotę do wyświetlenia w tabeli."""
+    return f"{value:.2f} PLN"
+
+
 class FinancialSummaryWindow(QMainWindow):
     def __init__(self, parent=None, username=None):
         super().__init__(parent)
@@ -43,6 +51,10 @@ class FinancialSummaryWindow(QMainWindow):
         self.filter_layout.addWidget(QLabel("Wybierz lokalizację:"))
         self.filter_layout.addWidget(self.location_selector)
 
+        # Podział na lokalizacje (dla "Wszystkie lokalizacje")
+        self.breakdown_checkbox = QCheckBox("Podział na lokalizacje")
+        self.filter_layout.addWidget(self.breakdown_checkbox)
+
         # Przycisk generowania raportu
         self.generate_button = QPushButton("Generuj Zestawienie")
         self.generate_button.clicked.connect(self.generate_summary)
@@ -54,9 +66,11 @@ class FinancialSummaryWindow(QMainWindow):
         self.main_layout.addWidget(self.canvas)
 
         # Tabela podsumowania finansowego
-        self.summary_table = QTableWidget()
-        self.summary_table.setColumnCount(2)
-        self.summary_table.setHorizontalHeaderLabels(["Miesiąc/Rok", "Łączna Kwota"])
+        self.summary_model = ColumnarTableModel(
+            ["Miesiąc/Rok", "Łączna Kwota"], formatters={1: format_amount}, parent=self
+        )
+        self.summary_table = QTableView()
+        self.summary_table.setModel(self.summary_model)
         self.style_table()
         self.main_layout.addWidget(self.summary_table)
 
@@ -88,16 +102,16 @@ class FinancialSummaryWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.summary_table.setAlternatingRowColors(True)
         self.summary_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -116,7 +130,7 @@ class FinancialSummaryWindow(QMainWindow):
         self.summary_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.summary_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.summary_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.summary_table.verticalHeader().setVisible(False)
@@ -130,86 +144,57 @@ class FinancialSummaryWindow(QMainWindow):
         self.move(x, y)
 
     def load_locations(self):
-        """Ładuje lokalizacje do pola wyboru."""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, name FROM locations")
-        locations = cursor.fetchall()
-        for location_id, location_name in locations:
+        """Ładuje lokalizacje do pola wyboru (z pamięci podręcznej danych słownikowych)."""
+        get_query_executor().submit(self, "locations", get_reference_data, "locations", on_result=self.populate_locations)
+
+    def populate_locations(self, locations):
+        """Dodaje lokalizacje do pola wyboru."""
+        for location_id, location_name, *_ in locations:
             self.location_selector.addItem(location_name, location_id)
-        cursor.close()
-        connection.close()
 
     def generate_summary(self):
         """Generuje zestawienie finansowe na podstawie wybranych filtrów."""
         date_filter = self.date_filter.text()
         location_id = self.location_selector.currentData()
 
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
-
-        # Buduj zapytanie SQL
-        query = """
-            SELECT 
-                TO_CHAR(visit_date, 'YYYY-MM') AS period, 
-                SUM(payment) AS total_payment
-            FROM history
-        """
-        conditions = []
-        parameters = []
-
         # Filtr daty
         if date_filter:
-            if len(date_filter) == 4:  # Jeśli podano tylko rok
-                conditions.append("TO_CHAR(visit_date, 'YYYY') = %s")
-            elif len(date_filter) == 7:  # Jeśli podano rok i miesiąc
-                conditions.append("TO_CHAR(visit_date, 'YYYY-MM') = %s")
-            else:
-                QMessageBox.warning(self, "Błąd", "Nieprawidłowy format daty! Użyj formatu YYYY-MM lub YYYY.")
+            try:
+                if len(date_filter) not in (4, 7):
+                    raise ValueError("Nieprawidłowy format daty! Użyj formatu YYYY-MM lub YYYY.")
+                date_range_bounds(date_filter)
+            except ValueError as e:
+                QMessageBox.warning(self, "Błąd", str(e))
                 return
-            parameters.append(date_filter)
-
-        # Filtr lokalizacji
-        if location_id:
-            conditions.append("location_id = %s")
-            parameters.append(location_id)
-
-        # Dodaj warunki do zapytania
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
 
-        query += " GROUP BY period ORDER BY period"
-
-        cursor.execute(query, tuple(parameters))
-        results = cursor.fetchall()
-
-        cursor.close()
-        connection.close()
+        if location_id is None and self.breakdown_checkbox.isChecked():
+            get_query_executor().submit(
+                self, "summary", get_financial_summary_by_location, date_filter, on_result=self.show_breakdown
+            )
+        else:
+            get_query_executor().submit(self, "summary", get_financial_summary, date_filter, location_id, on_result=self.show_summary)
 
-        # Zaktualizuj tabelę i wykres
+    def show_summary(self, results):
+        """Aktualizuje tabelę i wykres wynikami zestawienia."""
         self.update_table(results)
         self.update_chart(results)
 
+    def show_breakdown(self, breakdown):
+        """Aktualizuje tabelę i wykres zestawieniem w podziale na lokalizacje."""
+        locations, rows = breakdown
+        headers = ["Miesiąc/Rok"] + [name for _, name in locations] + ["Łączna Kwota"]
+        self.summary_model.set_headers(headers, formatters={column: format_amount for column in range(1, len(headers))})
+        self.summary_model.set_rows(rows)
+        total = sum(row[-1] for row in rows)
+        self.total_label.setText(f"Suma: {format_amount(total)}")
+        self.update_breakdown_chart(locations, rows)
+
     def update_table(self, results):
         """Aktualizuje tabelę podsumowania finansowego."""
-        self.summary_table.setRowCount(0)
-        total = 0
-
-        for row_number, (period, total_payment) in enumerate(results):
-            self.summary_table.insertRow(row_number)
-            self.summary_table.setItem(row_number, 0, QTableWidgetItem(str(period)))
-            self.summary_table.setItem(row_number, 1, QTableWidgetItem(f"{total_payment:.2f} PLN"))
-            total += total_payment
-
-        self.total_label.setText(f"Suma: {total:.2f} PLN")
+        self.summary_model.set_headers(["Miesiąc/Rok", "Łączna Kwota"], formatters={1: format_amount})
+        self.summary_model.set_rows(results)
+        total = sum(total_payment for _, total_payment in results)
+        self.total_label.setText(f"Suma: {format_amount(total)}")
 
     def update_chart(self, results):
         """Aktualizuje wykres finansowy."""
@@ -227,4 +212,26 @@ class FinancialSummaryWindow(QMainWindow):
             self.ax.set_ylabel("Kwota (PLN)")
             self.ax.tick_params(axis='x', rotation=0)
 
+        self.canvas.draw()
+
+    def update_breakdown_chart(self, locations, rows):
+        """Rysuje wykres skumulowany - jeden segment słupka na lokalizację."""
+        self.ax.clear()
+
+        if not rows:
+            self.ax.text(0.5, 0.5, "Brak danych do wyświetlenia", horizontalalignment='center', verticalalignment='center')
+        else:
+            periods = [row[0] for row in rows]
+            bottom = [0] * len(rows)
+            for column, (_, location_name) in enumerate(locations, start=1):
+                amounts = [float(row[column]) for row in rows]
+                self.ax.bar(periods, amounts, bottom=bottom, label=location_name)
+                bottom = [base + amount for base, amount in zip(bottom, amounts)]
+
+            self.ax.set_title("Zarobki dla wybranego okresu wg lokalizacji")
+            self.ax.set_xlabel("Rok/Miesiąc")
+            self.ax.set_ylabel("Kwota (PLN)")
+            self.ax.tick_params(axis='x', rotation=0)
+            self.ax.legend()
+
         self.canvas.draw()
\ No newline at end of file
@@ -0,0 +1,199 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+def format_value(value):
+    """Domyślne formatowanie wartości komórki."""
+    if value is None:
+        return ""
+    return str(value)
+
+
+class ColumnarTableModel(QAbstractTableModel):
+    """
+    Model tabeli przechowujący wyniki zapytań w tablicach kolumn.
+    Wartości są formatowane dopiero w data(), czyli tylko dla widocznych komórek,
+    a cały zbiór danych podmieniany jest jednym resetem modelu.
+    Wiersze mogą mieć dodatkowe kolumny za tymi z nagłówkami (niewidoczne w tabeli,
+    dostępne przez value()) - ich liczbę podaje się w `hidden_columns`.
+    """
+
+    def __init__(self, headers, formatters=None, parent=None, hidden_columns=0):
+        """
+        :param headers: Nagłówki kolumn.
+        :param formatters: Słownik {numer kolumny: funkcja formatująca wartość}.
+        :param hidden_columns: Liczba ukrytych kolumn na końcu każdego wiersza.
+        """
+        super().__init__(parent)
+        self._headers = list(headers)
+        self._formatters = formatters or {}
+        self._hidden_columns = hidden_columns
+        self._columns = self._empty_columns()
+        self._row_count = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.display_value(index.row(), index.column())
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self._headers[section]
+        return str(section + 1)
+
+    def set_headers(self, headers, formatters=None):
+        """Zmienia zestaw kolumn modelu (usuwa przy tym wszystkie wiersze)."""
+        self.beginResetModel()
+        self._headers = list(headers)
+        self._formatters = formatters or {}
+        self._columns = self._empty_columns()
+        self._row_count = 0
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        """Podmienia wszystkie dane modelu (jeden reset zamiast wstawiania wierszy)."""
+        self.beginResetModel()
+        self._columns = self._to_columns(rows)
+        self._row_count = len(self._columns[0]) if self._columns else 0
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        """Dopisuje wiersze na końcu modelu bez przebudowy istniejących."""
+        if not rows:
+            return
+        self._check_width(rows)
+        first = self._row_count
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        for column, values in zip(self._columns, zip(*rows)):
+            column.extend(values)
+        self._row_count += len(rows)
+        self.endInsertRows()
+
+    def patch_rows(self, keys, rows, insert=True):
+        """
+        Aktualizuje pojedyncze wiersze według klucza w kolumnie 0, bez resetu modelu.
+        Wiersze z `rows` są podmieniane (lub dopisywane, gdy insert=True),
+        a wiersze o kluczach z `keys`, których nie ma w `rows`, są usuwane.
+        """
+        self._check_width(rows)
+        fresh = {row[0]: row for row in rows}
+        positions = {key: row for row, key in enumerate(self._columns[0])} if self._columns else {}
+
+        removed = sorted((positions[key] for key in keys if key not in fresh and key in positions), reverse=True)
+        for position in removed:
+            self.beginRemoveRows(QModelIndex(), position, position)
+            for column in self._columns:
+                del column[position]
+            self._row_count -= 1
+            self.endRemoveRows()
+        if removed:
+            positions = {key: row for row, key in enumerate(self._columns[0])}
+
+        added = []
+        for key, values in fresh.items():
+            position = positions.get(key)
+            if position is None:
+                if insert:
+                    added.append(values)
+                continue
+            for column, value in zip(self._columns, values):
+                column[position] = value
+            self.dataChanged.emit(self.index(position, 0), self.index(position, self.columnCount() - 1))
+        self.append_rows(added)
+
+    def clear(self):
+        """Usuwa wszystkie wiersze."""
+        self.set_rows([])
+
+    def value(self, row, column):
+        """Zwraca surową (niesformatowaną) wartość komórki."""
+        return self._columns[column][row]
+
+    def display_value(self, row, column):
+        """Zwraca sformatowaną wartość komórki."""
+        value = self._columns[column][row]
+        formatter = self._formatters.get(column, format_value)
+        return formatter(value)
+
+    def row_values(self, row):
+        """Zwraca surowe wartości wiersza."""
+        return tuple(column[row] for column in self._columns)
+
+    def display_rows(self):
+        """Zwraca wszystkie wiersze jako listy sformatowanych tekstów (np. do eksportu)."""
+        return [
+            [self.display_value(row, column) for column in range(len(self._headers))]
+            for row in range(self._row_count)
+        ]
+
+    def _empty_columns(self):
+        """Puste listy dla wszystkich kolumn wiersza (z nagłówkami i ukrytych)."""
+        return [[] for _ in range(len(self._headers) + self._hidden_columns)]
+
+    def _check_width(self, rows):
+        """
+        Sprawdza, czy dopisywane wiersze mają tyle kolumn, ile model (z ukrytymi) - inaczej wartości by przepadły.
+        :raises ValueError: Wiersz o innej liczbie kolumn.
+        """
+        for row in rows:
+            if len(row) != len(self._columns):
+                raise ValueError(f"Wiersz ma {len(row)} kolumn, a model {len(self._columns)}.")
+
+    def _to_columns(self, rows):
+        """Transponuje wiersze wyniku zapytania do list kolumn."""
+        columns = [list(column) for column in zip(*rows)]
+        if not columns:
+            return self._empty_columns()
+        return columns
+
+
+class PagedTableModel(ColumnarTableModel):
+    """
+    Model doładowujący kolejne strony wyników, gdy widok dojdzie do końca listy.
+    Pobraniem strony zajmuje się funkcja `request_page(last_row)`, która po
+    otrzymaniu wyników przekazuje je do append_page().
+    """
+
+    def __init__(self, headers, page_size, request_page, formatters=None, parent=None, hidden_columns=0):
+        """
+        :param page_size: Rozmiar strony; krótsza strona oznacza koniec danych.
+        :param request_page: Funkcja wywoływana z ostatnim wierszem modelu (lub None).
+        """
+        super().__init__(headers, formatters, parent, hidden_columns)
+        self.page_size = page_size
+        self._request_page = request_page
+        self._has_more = False
+        self._loading = False
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._loading = True
+        last_row = self.row_values(self._row_count - 1) if self._row_count else None
+        self._request_page(last_row)
+
+    def begin_loading(self):
+        """Oznacza, że trwa pobieranie pierwszej strony (wstrzymuje doładowywanie)."""
+        self._loading = True
+
+    def set_rows(self, rows):
+        """Ustawia pierwszą stronę wyników."""
+        self._loading = False
+        self._has_more = len(rows) >= self.page_size
+        super().set_rows(rows)
+
+    def append_page(self, rows):
+        """Dopisuje kolejną stronę wyników na końcu modelu."""
+        self._loading = False
+        self._has_more = len(rows) >= self.page_size
+        self.append_rows(rows)
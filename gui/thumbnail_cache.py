@@ -0,0 +1,247 @@
+import hashlib
+import itertools
+import os
+from collections import OrderedDict
+from functools import partial
+
+from PyQt6.QtCore import QObject, QRunnable, QSize, QThreadPool, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QImageReader, QPixmap
+from PyQt6.QtWidgets import QApplication
+from database.attachments import fetch_attachment
+
+try:
+    from PyQt6.QtPdf import QPdfDocument
+except ImportError:  # Moduł QtPdf nie jest dostępny w każdej instalacji PyQt6 - PDF-y bez podglądu
+    QPdfDocument = None
+
+THUMBNAIL_SIZE = 300        # Najdłuższy bok miniatury (rozmiar pola zdjęcia w oknie zwierząt)
+MEMORY_CACHE_SIZE = 64      # Liczba miniatur trzymanych w pamięci
+DECODE_THREADS = 2          # Wątki dekodujące - nie zabierają puli wykonawcy zapytań
+PREVIEW_SIZE = 160          # Najdłuższy bok podglądu załącznika
+THUMBNAIL_DIR = os.path.join(os.path.expanduser("~"), ".vetbase", "thumbnails")
+
+
+def _file_version(path):
+    """Wersja pliku (czas modyfikacji i rozmiar); None, jeśli pliku nie ma."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _disk_path(path, version, size):
+    """Plik miniatury na dysku - klucz obejmuje ścieżkę i wersję, więc podmiana zdjęcia go unieważnia."""
+    key = f"{os.path.abspath(path)}|{version[0]}|{version[1]}|{size}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(THUMBNAIL_DIR, digest[:2], digest + ".jpg")
+
+
+def load_thumbnail(path, version, size=THUMBNAIL_SIZE):
+    """
+    Zwraca miniaturę jako QImage (bezpieczne poza wątkiem GUI) lub None, jeśli obrazu nie da się odczytać.
+    Najpierw sprawdza pamięć dyskową; przy braku dekoduje oryginał od razu w zmniejszonym
+    rozmiarze (dekoder JPEG pomija wtedy większość pracy) i zapisuje wynik na dysk.
+    """
+    cached = _disk_path(path, version, size)
+    if os.path.exists(cached):
+        image = QImage(cached)
+        if not image.isNull():
+            return image
+
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)  # Zdjęcia z telefonu - obrót według EXIF
+    original = reader.size()
+    if original.isValid() and (original.width() > size or original.height() > size):
+        reader.setScaledSize(original.scaled(QSize(size, size), Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return None
+    if image.width() > size or image.height() > size:
+        image = image.scaled(
+            size, size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+        )
+
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        temporary = f"{cached}.{os.getpid()}.part"
+        if image.save(temporary, "JPG", 90):
+            os.replace(temporary, cached)
+    except OSError as e:
+        print(f"Nie udało się zapisać miniatury {path}: {e}")
+    return image
+
+
+def load_rendition(sha256):
+    """
+    Zwraca zapisaną wersję zdjęcia (już we właściwym rozmiarze) jako QImage lub None.
+    Treść pobierana jest z bazy tylko przy pierwszym użyciu na tym stanowisku.
+    """
+    image = QImage(fetch_attachment(sha256))
+    return None if image.isNull() else image
+
+
+def _render_pdf_page(path, size):
+    """Renderuje pierwszą stronę PDF-a w zadanym rozmiarze; None bez QtPdf lub dla błędnego pliku."""
+    if QPdfDocument is None:
+        return None
+    document = QPdfDocument()
+    try:
+        document.load(path)
+        if document.status() != QPdfDocument.Status.Ready or document.pageCount() == 0:
+            return None
+        page_size = document.pagePointSize(0).toSize()
+        if page_size.isEmpty():
+            return None
+        image = document.render(0, page_size.scaled(QSize(size, size), Qt.AspectRatioMode.KeepAspectRatio))
+        return None if image.isNull() else image
+    finally:
+        document.close()
+
+
+def load_attachment_preview(sha256, content_type, size=PREVIEW_SIZE):
+    """
+    Zwraca podgląd załącznika (obraz lub pierwsza strona PDF-a) jako QImage albo None (inny typ pliku).
+    Podgląd zależy tylko od treści, więc plik na dysku jest kluczowany skrótem i nigdy nie wygasa.
+    """
+    if not content_type or not (content_type.startswith("image/") or content_type == "application/pdf"):
+        return None
+    cached = os.path.join(THUMBNAIL_DIR, "attachments", sha256[:2], f"{sha256}_{size}.jpg")
+    if os.path.exists(cached):
+        image = QImage(cached)
+        if not image.isNull():
+            return image
+
+    path = fetch_attachment(sha256)
+    if content_type == "application/pdf":
+        image = _render_pdf_page(path, size)
+    else:
+        reader = QImageReader(path)  # Format rozpoznawany po treści - plik w magazynie nie ma rozszerzenia
+        reader.setAutoTransform(True)
+        original = reader.size()
+        if original.isValid() and (original.width() > size or original.height() > size):
+            # Duże skany dekodowane od razu w zmniejszonym rozmiarze
+            reader.setScaledSize(original.scaled(QSize(size, size), Qt.AspectRatioMode.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            image = None
+    if image is None:
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        temporary = f"{cached}.{os.getpid()}.part"
+        if image.save(temporary, "JPG", 90):
+            os.replace(temporary, cached)
+    except OSError as e:
+        print(f"Nie udało się zapisać podglądu załącznika {sha256}: {e}")
+    return image
+
+
+class _ThumbnailSignals(QObject):
+    finished = pyqtSignal(object, object)  # klucz (źródło, wersja), QImage lub None
+
+
+class _ThumbnailTask(QRunnable):
+    def __init__(self, key, load):
+        super().__init__()
+        self.key = key
+        self.load = load
+        self.signals = _ThumbnailSignals()
+
+    def run(self):
+        try:
+            image = self.load()
+        except Exception as e:
+            print(f"Nie udało się wczytać miniatury {self.key[0]}: {e}")
+            image = None
+        self.signals.finished.emit(self.key, image)
+
+
+class ThumbnailCache(QObject):
+    """
+    Dwupoziomowa pamięć miniatur zdjęć: ostatnio oglądane jako QPixmap w pamięci,
+    pozostałe jako pliki JPEG na dysku (klucz: ścieżka i czas modyfikacji oryginału).
+    Zdjęcia zapisane w bazie mają gotowe wersje we właściwym rozmiarze - te są
+    tylko wczytywane z magazynu załączników (klucz: skrót treści), podobnie jak
+    podglądy załączników historii leczenia.
+    Dekodowanie odbywa się w tle; gotowa miniatura jest ogłaszana sygnałem `ready`.
+    """
+    ready = pyqtSignal(str, object)  # ścieżka lub skrót, QPixmap lub None (brak zdjęcia)
+
+    def __init__(self, size=THUMBNAIL_SIZE, capacity=MEMORY_CACHE_SIZE, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.capacity = capacity
+        self._pixmaps = OrderedDict()  # (ścieżka lub skrót, wersja) -> QPixmap lub None
+        self._loading = set()
+        self._priorities = itertools.count(1)
+        self._thread_pool = QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(DECODE_THREADS)
+
+    def get(self, path):
+        """
+        Zwraca miniaturę z pamięci albo zleca jej wczytanie i zwraca False (wynik przyjdzie sygnałem `ready`).
+        :return: QPixmap, None (brak zdjęcia) lub False (trwa wczytywanie).
+        """
+        version = _file_version(path)
+        if version is None:
+            return None
+        return self._get((path, version), partial(load_thumbnail, path, version, self.size))
+
+    def get_rendition(self, sha256):
+        """Jak get(), dla wersji zdjęcia zapisanej w magazynie załączników (treść o tym skrócie się nie zmienia)."""
+        return self._get((sha256, None), partial(load_rendition, sha256))
+
+    def get_preview(self, sha256, content_type):
+        """Jak get(), dla podglądu załącznika z magazynu (obraz lub pierwsza strona PDF-a)."""
+        return self._get((sha256, "preview"), partial(load_attachment_preview, sha256, content_type))
+
+    def prefetch(self, paths):
+        """Wczytuje w tle miniatury, które zapewne będą zaraz potrzebne (np. sąsiednie wiersze)."""
+        for path in paths:
+            version = _file_version(path)
+            if version is not None and (path, version) not in self._pixmaps:
+                self._load((path, version), partial(load_thumbnail, path, version, self.size), priority=0)
+
+    def prefetch_renditions(self, hashes):
+        """Jak prefetch(), dla wersji zdjęć zapisanych w magazynie załączników."""
+        for sha256 in hashes:
+            if (sha256, None) not in self._pixmaps:
+                self._load((sha256, None), partial(load_rendition, sha256), priority=0)
+
+    def _get(self, key, load):
+        if key in self._pixmaps:
+            self._pixmaps.move_to_end(key)
+            return self._pixmaps[key]
+        self._load(key, load)
+        return False
+
+    def _load(self, key, load, priority=None):
+        if key in self._loading:
+            return
+        self._loading.add(key)
+        task = _ThumbnailTask(key, load)
+        task.signals.finished.connect(self._on_finished)
+        # Ostatnio zaznaczony wiersz jest dekodowany przed wcześniej zleconymi
+        self._thread_pool.start(task, next(self._priorities) if priority is None else priority)
+
+    def _on_finished(self, key, image):
+        self._loading.discard(key)
+        pixmap = QPixmap.fromImage(image) if image is not None else None
+        self._pixmaps[key] = pixmap
+        self._pixmaps.move_to_end(key)
+        while len(self._pixmaps) > self.capacity:
+            self._pixmaps.popitem(last=False)
+        self.ready.emit(key[0], pixmap)
+
+
+_cache = None
+
+
+def get_thumbnail_cache():
+    """Zwraca współdzieloną pamięć miniatur (tworzoną w wątku GUI)."""
+    global _cache
+    if _cache is None:
+        _cache = ThumbnailCache(parent=QApplication.instance())
+    return _cache
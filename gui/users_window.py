@@ -1,10 +1,14 @@
 from PyQt6.QtWidgets import (
     QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton,
-    QTableWidget, QTableWidgetItem, QDialog, QLabel, QLineEdit, QMessageBox, QComboBox, QHeaderView
+    QTableView, QDialog, QLabel, QLineEdit, QMessageBox, QComboBox, QHeaderView
 )
 from PyQt6.QtGui import QIcon, QGuiApplication
 from database.operations import create_user, delete_user, get_all_users
+from database.reference_cache import get_reference_cache, get_reference_data
 from PyQt6.QtCore import Qt
+from gui.query_executor import get_query_executor
+from gui.table_model import ColumnarTableModel
+from gui.change_notifier import LiveTableUpdater
 from passlib.hash import bcrypt
 
 class UsersWindow(QMainWindow):
@@ -39,18 +43,22 @@ class UsersWindow(QMainWindow):
         self.nav_layout.addWidget(self.delete_user_button)
 
         # Users Table
-        self.users_table = QTableWidget()
-        self.users_table.setColumnCount(4)
-        self.users_table.setHorizontalHeaderLabels(["ID", "Nazwa użytkownika", "Rola", "Data utworzenia"])
+        self.users_model = ColumnarTableModel(["ID", "Nazwa użytkownika", "Rola", "Data utworzenia"], parent=self)
+        self.users_table = QTableView()
+        self.users_table.setModel(self.users_model)
         self.style_table()
-        self.users_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)  # Enable row selection
-        self.users_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)  # Only one row selectable
-        self.users_table.cellClicked.connect(self.toggle_delete_button)
+        self.users_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)  # Enable row selection
+        self.users_table.setSelectionMode(QTableView.SelectionMode.SingleSelection)  # Only one row selectable
+        self.users_table.clicked.connect(self.toggle_delete_button)
         self.main_layout.addWidget(self.users_table)
 
         # Load Users
         self.load_users()
 
+        # Changes from other terminals patch only the affected rows
+        self.live_updater = LiveTableUpdater(self, self.users_model, self.load_users)
+        self.live_updater.watch("users", get_all_users)
+
     def style_table(self):
         """Stylizuje tabelę i dodaje funkcjonalność zaznaczania całych wierszy."""
         # Rozciąganie kolumn na całą szerokość tabeli
@@ -74,16 +82,16 @@ class UsersWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.users_table.setAlternatingRowColors(True)
         self.users_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -102,7 +110,7 @@ class UsersWindow(QMainWindow):
         self.users_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.users_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.users_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Ukrycie pionowych linii nagłówków
         self.users_table.verticalHeader().setVisible(False)
@@ -116,13 +124,12 @@ class UsersWindow(QMainWindow):
         self.move(x, y)
 
     def load_users(self):
-        """Load all users into the table."""
-        users = get_all_users()
-        self.users_table.setRowCount(0)
-        for row_number, user in enumerate(users):
-            self.users_table.insertRow(row_number)
-            for column_number, data in enumerate(user):
-                self.users_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
+        """Load all users into the table (in the background)."""
+        get_query_executor().submit(self, "users", get_reference_data, "users", on_result=self.populate_table)
+
+    def populate_table(self, users):
+        """Fill the users table."""
+        self.users_model.set_rows(users)
 
     def toggle_delete_button(self):
         """Enable/disable delete button based on selection."""
@@ -133,7 +140,8 @@ class UsersWindow(QMainWindow):
         """Open dialog to add a new user."""
         dialog = AddUserDialog(self)
         dialog.exec()
-        self.load_users()
+        get_reference_cache().invalidate("users")
+        self.live_updater.refresh()
 
     def delete_user(self):
         """Deletes the selected user from the database."""
@@ -143,8 +151,8 @@ class UsersWindow(QMainWindow):
             return
 
         selected_row = selected_rows[0]
-        user_id = self.users_table.item(selected_row.row(), 0).text()
-        user_name = self.users_table.item(selected_row.row(), 1).text()
+        user_id = self.users_model.value(selected_row.row(), 0)
+        user_name = self.users_model.display_value(selected_row.row(), 1)
 
         confirm = QMessageBox.question(
             self,
@@ -157,7 +165,8 @@ class UsersWindow(QMainWindow):
             try:
                 if delete_user(user_id):
                     QMessageBox.information(self, "Sukces", "Użytkownik został usunięty!")
-                    self.load_users()  # Refresh user table after deletion
+                    get_reference_cache().invalidate("users")
+                    self.live_updater.refresh()  # Refresh user table after deletion
                 else:
                     QMessageBox.critical(self, "Błąd", "Wystąpił błąd podczas usuwania użytkownika.")
             except Exception as e:
@@ -1,12 +1,29 @@
 from PyQt6.QtWidgets import (
-    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QTableWidget, QTableWidgetItem,
-    QDialog, QLabel, QLineEdit, QDateTimeEdit, QMessageBox, QComboBox, QHeaderView
+    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QTableView,
+    QDialog, QLabel, QLineEdit, QDateTimeEdit, QMessageBox, QComboBox, QHeaderView, QCompleter
 )
-from database.connection import get_connection
-from PyQt6.QtCore import Qt, QDateTime
+from database.connection import pooled_connection, DatabaseUnavailableError
+from database.operations import get_all_visits, get_visit, find_animals, get_edit_visit_dialog_data
+from database.identity_map import get_identity_map
+from database.query_cache import get_query_cache
+from database.reference_cache import get_reference_data
+from database.search_index import get_animal_search_index, refresh_animal_search_index
+from gui.query_executor import get_query_executor
+from gui.table_model import ColumnarTableModel
+from gui.change_notifier import LiveTableUpdater
+from PyQt6.QtCore import Qt, QDateTime, QStringListModel
 from PyQt6.QtGui import QIcon, QGuiApplication
 from gui.history_dialog import AddHistoryDialog
 
+COMPLETION_LIMIT = 10  # Liczba podpowiedzi w polu szybkiego wyszukiwania zwierzęcia
+
+# Wiersz tabeli wizyt zbudowany z wyniku RETURNING (CTE "v") - układ kolumn get_all_visits
+VISIT_ROW_SELECT = """
+    SELECT v.id, a.name, v.reservation_date, v.visit_date, v.registered_by, v.description
+    FROM v
+    JOIN animals a ON a.id = v.animal_id
+"""
+
 class VisitsWindow(QMainWindow):
     def __init__(self, parent=None, username=None):
         super().__init__(parent)
@@ -49,12 +66,12 @@ class VisitsWindow(QMainWindow):
         self.nav_layout.addWidget(self.complete_visit_button)
 
         # Tabela wizyt
-        self.visits_table = QTableWidget()
-        self.visits_table.setColumnCount(6)
-        self.visits_table.setHorizontalHeaderLabels([
+        self.visits_model = ColumnarTableModel([
             "ID", "Zwierzę", "Data rezerwacji", "Data wizyty", "Rejestrujący", "Opis"
-        ])
-        self.visits_table.cellClicked.connect(self.toggle_action_buttons)
+        ], parent=self)
+        self.visits_table = QTableView()
+        self.visits_table.setModel(self.visits_model)
+        self.visits_table.clicked.connect(self.toggle_action_buttons)
         self.visits_table.selectionModel().selectionChanged.connect(self.toggle_action_buttons)
         self.main_layout.addWidget(self.visits_table)
 
@@ -64,6 +81,12 @@ class VisitsWindow(QMainWindow):
         # Wczytaj wizyty
         self.load_visits()
 
+        # Zmiany z innych stanowisk podmieniają tylko dotknięte wiersze tabeli
+        self.live_updater = LiveTableUpdater(self, self.visits_model, self.load_visits)
+        self.live_updater.watch("visits", get_all_visits)
+        # Zmiana imienia zwierzęcia odświeża jego wizyty
+        self.live_updater.watch("animals", lambda ids: get_all_visits(animal_ids=ids), keyed=False)
+
     def style_table(self):
         """Stylizuje tabelę, aby była bardziej przejrzysta, i dodaje możliwość zaznaczania całych rekordów."""
         # Rozciąganie kolumn na całą szerokość tabeli
@@ -87,16 +110,16 @@ class VisitsWindow(QMainWindow):
         # Naprzemienne kolory wierszy
         self.visits_table.setAlternatingRowColors(True)
         self.visits_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f9f9f9;
                 gridline-color: #dcdcdc;
                 font-size: 13px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #b3d9ff;
                 color: #000000;
             }
@@ -115,21 +138,21 @@ class VisitsWindow(QMainWindow):
         self.visits_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
 
         # Zaznaczenie całych wierszy
-        self.visits_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.visits_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
 
         # Naprzemienne kolory wierszy
         self.visits_table.setAlternatingRowColors(True)
         self.visits_table.setStyleSheet("""
-                QTableWidget {
+                QTableView {
                     background-color: #ffffff;
                     alternate-background-color: #f9f9f9;
                     gridline-color: #dcdcdc;
                     font-size: 13px;
                 }
-                QTableWidget::item {
+                QTableView::item {
                     padding: 5px;
                 }
-                QTableWidget::item:selected {
+                QTableView::item:selected {
                     background-color: #b3d9ff;
                     color: #000000;
                 }
@@ -147,28 +170,12 @@ class VisitsWindow(QMainWindow):
         self.move(x, y)
 
     def load_visits(self):
-        """Ładuje wizyty z bazy danych do tabeli"""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
-        cursor.execute("""
-            SELECT v.id, a.name, v.reservation_date, v.visit_date, v.registered_by, v.description
-            FROM visits v
-            JOIN animals a ON v.animal_id = a.id
-        """)
-        results = cursor.fetchall()
-
-        self.visits_table.setRowCount(0)
-        for row_number, row_data in enumerate(results):
-            self.visits_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.visits_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
+        """Ładuje wizyty z bazy danych do tabeli (w tle)"""
+        get_query_executor().submit(self, "visits", get_all_visits, on_result=self.populate_table)
 
-        cursor.close()
-        connection.close()
+    def populate_table(self, results):
+        """Wypełnia tabelę wizyt"""
+        self.visits_model.set_rows(results)
 
     def toggle_action_buttons(self):
         """Aktywuje przyciski akcji (usuń/edytuj/odbyto wizytę) po zaznaczeniu wiersza"""
@@ -185,8 +192,10 @@ class VisitsWindow(QMainWindow):
     def open_add_visit_dialog(self):
         """Otwiera okno dialogowe do dodania wizyty"""
         dialog = AddVisitDialog(self, username=self.username)
-        dialog.exec()
-        self.load_visits()
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            # Dialog zwraca zapisany wiersz - dopisujemy go bez przeładowania tabeli
+            self.visits_model.patch_rows((), [dialog.saved_row])
+            get_query_cache().invalidate("visits")
 
     def delete_visit(self):
         """Usuwa wybraną wizytę"""
@@ -196,7 +205,7 @@ class VisitsWindow(QMainWindow):
             return
 
         selected_row = selected_rows[0]
-        visit_id = self.visits_table.item(selected_row.row(), 0).text()
+        visit_id = self.visits_model.value(selected_row.row(), 0)
 
         confirm = QMessageBox.question(
             self,
@@ -206,19 +215,23 @@ class VisitsWindow(QMainWindow):
         )
 
         if confirm == QMessageBox.StandardButton.Yes:
-            connection = get_connection()
-            if not connection:
+            try:
+                with pooled_connection() as connection:
+                    with connection.cursor() as cursor:
+                        cursor.execute("DELETE FROM visits WHERE id = %s RETURNING id", (visit_id,))
+                        deleted = cursor.fetchone()
+                    connection.commit()
+            except DatabaseUnavailableError:
                 QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
                 return
 
-            cursor = connection.cursor()
-            cursor.execute("DELETE FROM visits WHERE id = %s", (visit_id,))
-            connection.commit()
-            cursor.close()
-            connection.close()
-
-            QMessageBox.information(self, "Sukces", "Wizyta została usunięta!")
-            self.load_visits()
+            if deleted:
+                QMessageBox.information(self, "Sukces", "Wizyta została usunięta!")
+            else:
+                QMessageBox.information(self, "Informacja", "Wizyta została już wcześniej usunięta.")
+            self.visits_model.patch_rows([visit_id], [])
+            get_identity_map().invalidate("visits", [visit_id])
+            get_query_cache().invalidate("visits")
 
     def edit_visit(self):
         """Otwiera okno dialogowe do edycji wybranej wizyty"""
@@ -228,12 +241,15 @@ class VisitsWindow(QMainWindow):
             return
 
         selected_row = selected_rows[0]
-        visit_id = self.visits_table.item(selected_row.row(), 0).text()
+        visit_id = self.visits_model.value(selected_row.row(), 0)
 
         # Otwieramy dialog edycji
         dialog = EditVisitDialog(self, visit_id)
-        dialog.exec()
-        self.load_visits()
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            # Brak zwróconego wiersza oznacza, że wizytę usunięto na innym stanowisku
+            self.visits_model.patch_rows([visit_id], [dialog.saved_row] if dialog.saved_row else [])
+            get_identity_map().invalidate("visits", [visit_id])
+            get_query_cache().invalidate("visits")
 
     def complete_visit(self):
         """Przenosi wizytę do historii leczenia z możliwością dodania płatności."""
@@ -243,20 +259,21 @@ class VisitsWindow(QMainWindow):
             return
 
         selected_row = selected_rows[0]
-        visit_id = self.visits_table.item(selected_row.row(), 0).text()
-        animal_name = self.visits_table.item(selected_row.row(), 1).text()
-        visit_date = self.visits_table.item(selected_row.row(), 3).text()
-        description_reason = self.visits_table.item(selected_row.row(), 5).text()
+        visit_id = self.visits_model.value(selected_row.row(), 0)
+        animal_name = self.visits_model.display_value(selected_row.row(), 1)
+        visit_date = self.visits_model.display_value(selected_row.row(), 3)
+        description_reason = self.visits_model.display_value(selected_row.row(), 5)
 
         try:
-            # Pobierz `animal_id`
-            connection = get_connection()
-            cursor = connection.cursor()
-            cursor.execute("SELECT animal_id FROM visits WHERE id = %s", (visit_id,))
-            result = cursor.fetchone()
-            animal_id = result[0]
-
-            # Otwórz formularz dodawania historii
+            # Pobierz `animal_id` (rekord wczytany przez tabelę wizyt jest już w pamięci)
+            visit = get_visit(visit_id)
+            if visit is None:
+                QMessageBox.information(self, "Informacja", "Wizyta została już wcześniej usunięta.")
+                self.visits_model.patch_rows([visit_id], [])
+                return
+            animal_id = visit["animal_id"]
+
+            # Otwórz formularz dodawania historii (bez trzymania połączenia na czas okna modalnego)
             dialog = AddHistoryDialog(
                 self,
                 animal_id=animal_id,
@@ -267,13 +284,14 @@ class VisitsWindow(QMainWindow):
             dialog.exec()
 
             if dialog.result() == QDialog.DialogCode.Accepted:
-                cursor.execute("DELETE FROM visits WHERE id = %s", (visit_id,))
-                connection.commit()
+                with pooled_connection() as connection:
+                    with connection.cursor() as cursor:
+                        cursor.execute("DELETE FROM visits WHERE id = %s", (visit_id,))
+                    connection.commit()
                 QMessageBox.information(self, "Sukces", "Wizyta została zakończona i przeniesiona do historii!")
-                self.load_visits()
-
-            cursor.close()
-            connection.close()
+                self.visits_model.patch_rows([visit_id], [])
+                get_identity_map().invalidate("visits", [visit_id])
+                get_query_cache().invalidate("visits")
         except Exception as e:
             QMessageBox.critical(self, "Błąd", f"Wystąpił błąd: {e}")
 
@@ -291,7 +309,6 @@ class EditVisitDialog(QDialog):
 
         # Pola formularza
         self.animal_selector = QComboBox()
-        self.load_animals()
         layout.addWidget(QLabel("Zwierzę:"))
         layout.addWidget(self.animal_selector)
 
@@ -317,39 +334,24 @@ class EditVisitDialog(QDialog):
         self.save_button.clicked.connect(self.save_changes)
         layout.addWidget(self.save_button)
 
-        # Załaduj dane wizyty
+        # Załaduj listę zwierząt i dane wizyty w jednym zapytaniu
+        self.saved_row = None  # Zapisany wiersz lub None, jeśli wizyty już nie ma
         self.load_visit_data()
 
-    def load_animals(self):
+    def load_animals(self, animals):
         """Ładuje listę zwierząt do pola wyboru."""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, name FROM animals")
-        animals = cursor.fetchall()
         for animal_id, name in animals:
             self.animal_selector.addItem(name, animal_id)
 
-        cursor.close()
-        connection.close()
-
     def load_visit_data(self):
-        """Ładuje dane wizyty."""
-        connection = get_connection()
-        if not connection:
+        """Ładuje listę zwierząt oraz dane wizyty."""
+        try:
+            animals, visit = get_edit_visit_dialog_data(self.visit_id)
+        except DatabaseUnavailableError:
             QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
             return
 
-        cursor = connection.cursor()
-        cursor.execute("""
-            SELECT animal_id, reservation_date, visit_date, description
-            FROM visits
-            WHERE id = %s
-        """, (self.visit_id,))
-        visit = cursor.fetchone()
+        self.load_animals(animals)
 
         if visit:
             animal_id, reservation_date, visit_date, description = visit
@@ -359,9 +361,6 @@ class EditVisitDialog(QDialog):
             self.visit_date_input.setDateTime(visit_date)
             self.description_input.setText(description)
 
-        cursor.close()
-        connection.close()
-
     def save_changes(self):
         """Zapisuje zmiany w wizytach."""
         animal_id = self.animal_selector.currentData()
@@ -369,31 +368,31 @@ class EditVisitDialog(QDialog):
         visit_date = self.visit_date_input.dateTime().toString("yyyy-MM-dd HH:mm:ss")
         description = self.description_input.text()
 
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
         try:
-            cursor = connection.cursor()
-            cursor.execute("""
-                UPDATE visits
-                SET animal_id = %s, reservation_date = %s, visit_date = %s, description = %s
-                WHERE id = %s
-            """, (animal_id, reservation_date, visit_date, description, self.visit_id))
-            connection.commit()
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        WITH v AS (
+                            UPDATE visits
+                            SET animal_id = %s, reservation_date = %s, visit_date = %s, description = %s
+                            WHERE id = %s
+                            RETURNING id, animal_id, reservation_date, visit_date, registered_by, description
+                        )
+                    """ + VISIT_ROW_SELECT, (animal_id, reservation_date, visit_date, description, self.visit_id))
+                    self.saved_row = cursor.fetchone()
+                connection.commit()
             QMessageBox.information(self, "Sukces", "Zmiany zostały zapisane!")
             self.accept()
+        except DatabaseUnavailableError:
+            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
         except Exception as e:
             QMessageBox.critical(self, "Błąd", f"Wystąpił błąd: {e}")
-        finally:
-            connection.close()
 
 class AddVisitDialog(QDialog):
     def __init__(self, parent=None, username=None):
         super().__init__(parent)
         self.setWindowTitle("Dodaj wizytę")
-        self.setFixedSize(400, 450)
+        self.setFixedSize(400, 490)
         self.setWindowIcon(QIcon("images/background/icon.png"))  # Ustawienie ikony
         self.username = username  # Przechowujemy nazwę zalogowanego użytkownika
 
@@ -405,6 +404,19 @@ class AddVisitDialog(QDialog):
         self.animal_search_button.clicked.connect(self.open_animal_search_dialog)
         layout.addWidget(self.animal_search_button)
 
+        # Szybki wybór zwierzęcia z podpowiedziami z indeksu wyszukiwania
+        self.completion_animals = {}  # Tekst podpowiedzi -> (id, imię)
+        self.completion_model = QStringListModel(self)
+        self.completer = QCompleter(self.completion_model, self)
+        # Podpowiedzi są już dopasowane i uszeregowane przez indeks - bez filtrowania po prefiksie
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.completer.activated.connect(self.select_completion)
+        self.quick_search_input = QLineEdit()
+        self.quick_search_input.setPlaceholderText("Szybkie wyszukiwanie: imię, właściciel, rasa lub telefon")
+        self.quick_search_input.setCompleter(self.completer)
+        self.quick_search_input.textEdited.connect(self.update_completions)
+        layout.addWidget(self.quick_search_input)
+
         # Pole wyświetlające wybrane zwierzę
         self.selected_animal_label = QLabel("Wybrane zwierzę: Brak")
         layout.addWidget(self.selected_animal_label)
@@ -433,8 +445,9 @@ class AddVisitDialog(QDialog):
         layout.addWidget(QLabel("Rejestrujący:"))
         layout.addWidget(self.registered_by_input)
 
+        # Lokalizacje
         self.location_selector = QComboBox()
-        self.load_locations()
+        self.load_initial_data()
         layout.addWidget(QLabel("Lokalizacja:"))
         layout.addWidget(self.location_selector)
 
@@ -445,6 +458,47 @@ class AddVisitDialog(QDialog):
 
         # ID wybranego zwierzęcia (domyślnie None)
         self.selected_animal_id = None
+        self.saved_row = None  # Dodany wiersz (układ kolumn tabeli wizyt)
+
+        # Indeks budowany raz na sesję; kolejne otwarcia okna dociągają tylko zmiany
+        get_query_executor().submit(
+            self, "index", refresh_animal_search_index,
+            on_result=self.index_ready, on_error=self.index_unavailable
+        )
+
+    def index_ready(self, index):
+        """Odświeża podpowiedzi dla tekstu wpisanego przed załadowaniem indeksu."""
+        if self.quick_search_input.text():
+            self.update_completions(self.quick_search_input.text())
+
+    def index_unavailable(self, error):
+        """Bez indeksu pozostaje wyszukiwanie przyciskiem."""
+        print(f"Nie udało się załadować indeksu wyszukiwania: {error}")
+
+    def update_completions(self, text):
+        """Podpowiada zwierzęta pasujące do wpisanego tekstu."""
+        index = get_animal_search_index()
+        if not index.loaded or not text.strip():
+            self.completion_model.setStringList([])
+            return
+        self.completion_animals = {}
+        for animal_id, name, owner_name, breed in index.search(text, limit=COMPLETION_LIMIT):
+            label = f"{name} – {owner_name or 'brak właściciela'}"
+            if breed:
+                label += f" ({breed})"
+            if label in self.completion_animals:
+                label += f" [ID {animal_id}]"
+            self.completion_animals[label] = (animal_id, name)
+        self.completion_model.setStringList(list(self.completion_animals))
+        self.completer.complete()
+
+    def select_completion(self, text):
+        """Ustawia zwierzę wybrane z podpowiedzi."""
+        animal = self.completion_animals.get(text)
+        if animal is None:
+            return
+        self.selected_animal_id, animal_info = animal
+        self.selected_animal_label.setText(f"Wybrane zwierzę: {animal_info}")
 
     def open_animal_search_dialog(self):
         """Otwiera okno wyszukiwania zwierząt."""
@@ -454,21 +508,20 @@ class AddVisitDialog(QDialog):
             self.selected_animal_id, animal_info = dialog.get_selected_animal()
             self.selected_animal_label.setText(f"Wybrane zwierzę: {animal_info}")
 
-    def load_locations(self):
-        """Ładuje lokalizacje do selektora."""
-        connection = get_connection()
-        if not connection:
+    def load_initial_data(self):
+        """Pobiera lokalizacje (z pamięci podręcznej danych słownikowych)."""
+        try:
+            locations = get_reference_data("locations")
+        except DatabaseUnavailableError:
             QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
             return
 
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, name FROM locations")
-        locations = cursor.fetchall()
-        for location_id, name in locations:
-            self.location_selector.addItem(name, location_id)
+        self.load_locations(locations)
 
-        cursor.close()
-        connection.close()
+    def load_locations(self, locations):
+        """Ładuje lokalizacje do selektora."""
+        for location_id, name, *_ in locations:
+            self.location_selector.addItem(name, location_id)
 
     def add_visit(self):
         """Dodaje wizytę do bazy danych."""
@@ -487,22 +540,22 @@ class AddVisitDialog(QDialog):
             return
 
         try:
-            connection = get_connection()
-            if not connection:
-                QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-                return
-
-            cursor = connection.cursor()
-            cursor.execute("""
-                INSERT INTO visits (animal_id, reservation_date, visit_date, registered_by, description, location_id)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (self.selected_animal_id, reservation_date, visit_date, registered_by, description, location_id))
-            connection.commit()
-            cursor.close()
-            connection.close()
+            with pooled_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        WITH v AS (
+                            INSERT INTO visits (animal_id, reservation_date, visit_date, registered_by, description, location_id)
+                            VALUES (%s, %s, %s, %s, %s, %s)
+                            RETURNING id, animal_id, reservation_date, visit_date, registered_by, description
+                        )
+                    """ + VISIT_ROW_SELECT, (self.selected_animal_id, reservation_date, visit_date, registered_by, description, location_id))
+                    self.saved_row = cursor.fetchone()
+                connection.commit()
 
             QMessageBox.information(self, "Sukces", "Wizyta została dodana!")
             self.accept()
+        except DatabaseUnavailableError:
+            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
         except Exception as e:
             QMessageBox.critical(self, "Błąd", f"Wystąpił błąd podczas dodawania wizyty: {e}")
 
@@ -517,14 +570,15 @@ class AnimalSearchDialog(QDialog):
 
         # Pole wyszukiwania
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Wyszukaj po imieniu, właścicielu lub rasie")
+        self.search_input.setPlaceholderText("Wyszukaj po imieniu, właścicielu, rasie lub telefonie")
         self.search_input.textChanged.connect(self.search_animals)
         layout.addWidget(self.search_input)
 
         # Tabela wyników
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(4)
-        self.results_table.setHorizontalHeaderLabels(["ID", "Imię", "Właściciel", "Rasa"])
+        self.results_model = ColumnarTableModel(["ID", "Imię", "Właściciel", "Rasa"], parent=self)
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_model)
+        self.results_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
         layout.addWidget(self.results_table)
 
         # Przyciski
@@ -533,68 +587,43 @@ class AnimalSearchDialog(QDialog):
         self.select_button.clicked.connect(self.accept)
         layout.addWidget(self.select_button)
 
-        # Załaduj wszystkie zwierzęta
-        self.load_all_animals()
+        # Załaduj wszystkie zwierzęta (z indeksu wyszukiwania, jeśli jest już zbudowany)
+        if get_animal_search_index().loaded:
+            self.populate_table(get_animal_search_index().all_rows())
+        else:
+            self.load_all_animals()
 
         # Wybór w tabeli
-        self.results_table.cellClicked.connect(self.enable_select_button)
+        self.results_table.clicked.connect(self.enable_select_button)
 
         self.selected_animal = None
 
     def load_all_animals(self):
         """Ładuje wszystkie zwierzęta do tabeli."""
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
-            return
-
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, name, owner_name, breed FROM animals")
-        animals = cursor.fetchall()
-
-        self.results_table.setRowCount(0)
-        for row_number, row_data in enumerate(animals):
-            self.results_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.results_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
-
-        cursor.close()
-        connection.close()
+        get_query_executor().submit(self, "search", find_animals, on_result=self.populate_table)
 
     def search_animals(self):
         """Wyszukuje zwierzęta na podstawie wpisanego tekstu, ignorując wielkość liter."""
         search_text = self.search_input.text()
-
-        connection = get_connection()
-        if not connection:
-            QMessageBox.critical(self, "Błąd", "Brak połączenia z bazą danych.")
+        index = get_animal_search_index()
+        if index.loaded:
+            # Indeks w pamięci: wyniki od najlepszego dopasowania, z tolerancją literówek i polskich znaków
+            self.populate_table(index.search(search_text) if search_text.strip() else index.all_rows())
             return
+        # Nowe wyszukiwanie unieważnia wyniki poprzedniego
+        get_query_executor().submit(self, "search", find_animals, search_text, on_result=self.populate_table)
+
+    def populate_table(self, animals):
+        """Wypełnia tabelę wyników wyszukiwania."""
+        self.results_model.set_rows(animals)
+        self.select_button.setEnabled(False)
+        self.selected_animal = None
 
-        cursor = connection.cursor()
-        query = """
-            SELECT id, name, owner_name, breed
-            FROM animals
-            WHERE name ILIKE %s
-               OR owner_name ILIKE %s
-               OR breed ILIKE %s
-        """
-        cursor.execute(query, (f"%{search_text}%", f"%{search_text}%", f"%{search_text}%"))
-        animals = cursor.fetchall()
-
-        self.results_table.setRowCount(0)
-        for row_number, row_data in enumerate(animals):
-            self.results_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.results_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
-
-        cursor.close()
-        connection.close()
-
-    def enable_select_button(self, row, column):
+    def enable_select_button(self, index):
         """Aktywuje przycisk wyboru."""
         self.select_button.setEnabled(True)
-        animal_id = self.results_table.item(row, 0).text()
-        animal_info = self.results_table.item(row, 1).text()
+        animal_id = self.results_model.value(index.row(), 0)
+        animal_info = self.results_model.display_value(index.row(), 1)
         self.selected_animal = (animal_id, animal_info)
 
     def get_selected_animal(self):
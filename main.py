@@ -1,9 +1,15 @@
 import sys
 from PyQt6.QtWidgets import QApplication
 from gui.login_window import LoginWindow  # Importujemy okno logowania
+from database.connection import close_pool
+from gui.change_notifier import stop_change_notifier
+from database.photos import shutdown_photo_pool
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(close_pool)  # Zamknij pulę połączeń przy wyjściu
+    app.aboutToQuit.connect(stop_change_notifier)  # Zakończ nasłuch zmian w bazie
+    app.aboutToQuit.connect(shutdown_photo_pool)  # Zamknij procesy generujące wersje zdjęć
 
     # Tworzymy okno logowania
     login_window = LoginWindow()
@@ -1,9 +1,12 @@
-from database.connection import get_connection
+from database.connection import pooled_connection, close_pool, DatabaseUnavailableError
 
 if __name__ == "__main__":
-    connection = get_connection()
-    if connection:
+    try:
+        with pooled_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
         print("Connection test successful!")
-        connection.close()
-    else:
-        print("Connection test failed.")
\ No newline at end of file
+    except DatabaseUnavailableError:
+        print("Connection test failed.")
+    finally:
+        close_pool()
\ No newline at end of file